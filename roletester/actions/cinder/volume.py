@@ -1,6 +1,6 @@
-import time
+from roletester import exc
 from roletester import utils
-from roletester.exc import CinderNotFound
+from roletester import waiter
 from roletester.log import logging
 
 logger = logging.getLogger('roletester.actions.cinder.volume')
@@ -197,7 +197,7 @@ def wait_for_status(admin_clients,
     :type context: Dict
     :param timeout: Timeout in seconds.
     :type timeout: Integer
-    :param interval: Time in seconds to wait between polls.
+    :param interval: Maximum time in seconds to wait between polls.
     :type timeout: Integer
     :param initial_wait: Time in seconds to wait before beginning to poll.
         Useful for expecting a volume that is ACTIVE to go to DELETED
@@ -208,24 +208,9 @@ def wait_for_status(admin_clients,
     """
     logger.debug("Taking action wait for volume")
 
-    if initial_wait:
-        time.sleep(initial_wait)
-
-    start = time.time()
-    try:
-        while (time.time() - start < timeout):
-            show(admin_clients, context)
-            status = context['volume_status']
-            logger.debug("Found status {}".format(status))
-            if status == target_status:
-                context.pop('volume_status')
-                break
-            if status in _DONE_STATUS:
-                raise Exception(
-                    "Was looking for status {} but found {}"
-                    .format(target_status, status)
-                )
-            time.sleep(interval)
-    except CinderNotFound:
-        if target_status != 'deleting':
-            raise
+    waiter.wait_for_status(
+        admin_clients, context, 'cinder', context['volume_id'],
+        'volume_status', target_status, _DONE_STATUS, exc.CinderNotFound,
+        'deleting', timeout=timeout, interval=interval,
+        initial_wait=initial_wait
+    )
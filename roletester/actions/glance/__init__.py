@@ -5,6 +5,7 @@ from image import show as image_show
 from image import update as image_update
 from image import wait_for_status as image_wait_for_status
 from image import download as image_download
+from image import download_many as image_download_many
 
 __all__ = [
     'image_create',
@@ -13,5 +14,6 @@ __all__ = [
     'image_show',
     'image_update',
     'image_wait_for_status',
-    'image_download'
+    'image_download',
+    'image_download_many'
 ]
@@ -1,6 +1,9 @@
-import time
 import os
-from roletester.exc import GlanceNotFound
+from roletester import cache
+from roletester import downloads
+from roletester import exc
+from roletester import streaming
+from roletester import waiter
 from roletester.log import logging
 
 logger = logging.getLogger('roletester.actions.glance.image')
@@ -42,13 +45,45 @@ def create(clients,
     }
     glance = clients.get_glance()
     image = glance.images.create(**kwargs)
+    cache.invalidate('images')
     context.update(image_id=image.id)
     context.setdefault('stack', []).append({'image_id': image.id})
 
-    glance.images.upload(image.id, open(image_file, 'rb'))
+    with streaming.HashingReader(image_file) as data:
+        glance.images.upload(image.id, data)
+    result = data.result()
+    logger.debug("Uploaded {} bytes at {:.0f} B/s".format(
+        result['bytes'], result['bytes_per_second']))
+    _verify_upload(glance, image.id, data.hexdigests())
     logger.debug("Created image {0}".format(image.name))
 
 
+def _verify_upload(glance, image_id, digests):
+    """Compares the hashes of an upload with the ones glance reports.
+
+    Hashes glance does not report (yet, e.g. while an image is still being
+    imported) are not compared.
+
+    :param glance: Glance client
+    :type glance: glanceclient.Client
+    :param image_id: Image id
+    :type image_id: String
+    :param digests: Algorithm to hex digest of the uploaded data
+    :type digests: Dict
+    """
+    image = glance.images.get(image_id)
+    reported = {'md5': getattr(image, 'checksum', None)}
+    algorithm = getattr(image, 'os_hash_algo', None)
+    if algorithm:
+        reported[algorithm] = getattr(image, 'os_hash_value', None)
+    for algorithm, value in reported.items():
+        if value and algorithm in digests and digests[algorithm] != value:
+            raise ValueError(
+                "Image {} has {} {} but {} was uploaded"
+                .format(image_id, algorithm, value, digests[algorithm])
+            )
+
+
 def delete(clients, context, image_key=None):
     """Deletes an image from Glance.
 
@@ -77,6 +112,7 @@ def delete(clients, context, image_key=None):
         image = glance.images.get(id)
         logger.debug("Deleting image %s" % image.id)
         glance.images.delete(image.id)
+        cache.invalidate('images')
         logger.debug("Deleted image %s" % image.id)
     if image_key is None:
         image_id = context['image_id']
@@ -112,7 +148,8 @@ def show(clients, context, image_key='image_id', context_key='image_status'):
     context[context_key] = image.status.lower()
 
 
-def download(clients, context, image_key='image_id', context_key='image_status'):
+def download(clients, context, image_key='image_id', context_key='image_status',
+             directory=None):
     """downloads a glance image.
 
     Uses context['image_id'] or other specified with image_key
@@ -126,29 +163,49 @@ def download(clients, context, image_key='image_id', context_key='image_status')
     :type image_key: String
     :param context_key: Context key to set. Useful for volume, server images
     :type context_key: String
+    :param directory: Directory to save the image in. The image is only
+        verified, not saved, when None.
+    :type directory: String
     """
 
     image_id = context[image_key]
-    logger.debug("Showing image %s" % image_id)
-    image = clients.get_glance().images.data(image_id)
     logger.debug(
         'Downloading image "%s"' % image_id
     )
-    save_image(image, image_id)
+    result = downloads.download(clients, image_id, directory)
+    logger.debug("Downloaded {} bytes at {:.0f} B/s".format(
+        result['bytes'], result['bytes_per_second']))
+
+
+def download_many(clients, context, image_key='image_id', copies=4,
+                  workers=None):
+    """Downloads a glance image several times at once.
 
+    Measures the download throughput of a role. The copies are verified,
+    not saved.
+
+    Uses context['image_id'] or other specified with image_key
 
-def save_image(data, path):
-    """Save an image to the specified path.
-    :param data: binary data of the image
-    :param path: path to save the image to
+    :param clients: Client manager
+    :type clients: roletester.clients.ClientManager
+    :param context: Pass by reference context object.
+    :type context: Dict
+    :param image_key: Explicit image id to download
+    :type image_key: String
+    :param copies: Number of times to download the image
+    :type copies: Integer
+    :param workers: Maximum number of downloads to run at once. Defaults
+        to $ROLETESTER_DOWNLOAD_WORKERS or 4.
+    :type workers: Integer
     """
-    image = open(path, 'wb')
-    try:
-        for chunk in data:
-            image.write(chunk)
-    finally:
-        if path is not None:
-            image.close()
+    image_id = context[image_key]
+    logger.debug(
+        'Downloading image "%s" %s times' % (image_id, copies)
+    )
+    result = downloads.download_many(clients, [image_id] * copies,
+                                     workers=workers)
+    logger.info("Downloaded {} bytes at {:.0f} B/s".format(
+        result['bytes'], result['bytes_per_second']))
 
 
 def list(clients, context):
@@ -207,7 +264,7 @@ def wait_for_status(admin_clients,
     :type image_key: String
     :param timeout: Timeout in seconds.
     :type timeout: Integer
-    :param interval: Time in seconds to wait between polls.
+    :param interval: Maximum time in seconds to wait between polls.
     :type timeout: Integer
     :param initial_wait: Time in seconds to wait before beginning to poll.
         Useful for expecting a server that is ACTIVE to go to DELETED
@@ -218,32 +275,14 @@ def wait_for_status(admin_clients,
     """
     logger.debug("Taking action wait for image")
 
-    if initial_wait:
-        time.sleep(initial_wait)
-
-    start = time.time()
-    kwargs = {}
     image_status = 'image_status'
     if image_key is not None:
         image_status = '_'.join([image_key, 'status'])
-        kwargs = {
-            'image_key': image_key,
-            'context_key': image_status
-        }
-    try:
-        while (time.time() - start < timeout):
-            show(admin_clients, context, **kwargs)
-            status = context[image_status]
-            logger.debug("Found status {}".format(status))
-            if status == target_status:
-                context.pop(image_status)
-                break
-            if status in _DONE_STATUS:
-                raise Exception(
-                    "Was looking for status {} but found {}"
-                    .format(target_status, status)
-                )
-            time.sleep(interval)
-    except GlanceNotFound:
-        if target_status != 'deleted':
-            raise
+    else:
+        image_key = 'image_id'
+    waiter.wait_for_status(
+        admin_clients, context, 'glance', context[image_key],
+        image_status, target_status, _DONE_STATUS, exc.GlanceNotFound,
+        'deleted', timeout=timeout, interval=interval,
+        initial_wait=initial_wait
+    )
@@ -1,5 +1,20 @@
-"""This is just a playing around module. Please ignore it"""
+"""Image usage reports from the glance /v2/usages extension.
+
+Usage is requested a page of tenants at a time and every page is parsed as
+it streams in, so only the usage of the tenant being aggregated is held in
+memory, however many tenants and images the cloud has. The image usages of
+a tenant are loaded into array-backed columns and summed into GB-hours per
+status and visibility. Each tenant's rows are written out as CSV or JSON
+Lines before the next tenant is read.
+
+Pages follow the response's next link when there is one and otherwise use
+the last project id of a full page as the marker of the next.
+"""
+import array
+import csv
 import json
+import re
+import sys
 import six
 
 from roletester.log import logging
@@ -7,18 +22,113 @@ from six.moves.urllib import parse
 
 logger = logging.getLogger('roletester.actions.glance.usage')
 
+PAGE_SIZE = 100
+CHUNK_SIZE = 256 * 1024
+
+FORMATS = ('csv', 'jsonl')
+
+COLUMNS = ['project_id', 'status', 'visibility', 'images', 'size_gb',
+           'gb_hours']
+
+_NEXT = re.compile(r'"next"\s*:\s*"([^"]*)"')
+
+
+class _ArrayStream(object):
+    """Decodes the items of one array of a JSON document as it arrives."""
+
+    def __init__(self, key):
+        """Init the stream.
+
+        :param key: Key of the array in the top level object
+        :type key: String
+        """
+        self._opening = re.compile(r'"{}"\s*:\s*\['.format(re.escape(key)))
+        self._decoder = json.JSONDecoder()
+        # What follows the array, e.g. the next link.
+        self.rest = ''
+
+    def parse(self, chunks):
+        """Iterate over the items of the array.
+
+        :param chunks: Iterable of strings making up the document
+        :type chunks: Iterable
+        :returns: Generator of decoded items
+        """
+        chunks = iter(chunks)
+        buf = ''
+        while True:
+            match = self._opening.search(buf)
+            if match:
+                buf = buf[match.end():]
+                break
+            chunk = next(chunks, None)
+            if chunk is None:
+                self.rest = buf
+                return
+            buf += chunk
+        while True:
+            buf = buf.lstrip(' \t\r\n,')
+            if buf.startswith(']'):
+                self.rest = buf[1:] + ''.join(chunks)
+                return
+            try:
+                item, end = self._decoder.raw_decode(buf)
+            except ValueError:
+                # Incomplete item. Read until the buffer has doubled so a
+                # big item is not decoded again for every chunk.
+                had = len(buf)
+                while len(buf) < max(had * 2, 1):
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    buf += chunk
+                if len(buf) == had:
+                    raise ValueError("Usage response ended early.")
+                continue
+            yield item
+            buf = buf[end:]
+
 
 class Controller(object):
-    def __init__(self, http_client):
-        self.http_client = http_client
+    def __init__(self, session, interface='public', chunk_size=CHUNK_SIZE):
+        """Init the controller.
+
+        :param session: Keystone session with access to glance
+        :type session: keystoneauth1.session.Session
+        :param interface: Catalog interface of the glance endpoint
+        :type interface: String
+        :param chunk_size: Bytes of the response parsed at a time
+        :type chunk_size: Integer
+        """
+        self.session = session
+        self.interface = interface
+        self.chunk_size = chunk_size
+
+    def _get(self, url):
+        """GET a usage url, streaming the response.
 
-    def list(self, start, end, detailed=False, metadata=None):
+        :returns: requests.Response
+        """
+        return self.session.get(
+            url, stream=True,
+            endpoint_filter={'service_type': 'image',
+                             'interface': self.interface}
+        )
+
+    def list(self, start, end, detailed=False, metadata=None, limit=None,
+             marker=None):
+        """Request one page of usage.
+
+        :returns: requests.Response, not read yet
+        """
         if metadata is None:
             metadata = {}
         opts = {
             'start': start.isoformat(),
             'end': end.isoformat(),
-            'detailed': int(bool(detailed))
+            'detailed': int(bool(detailed)),
+            'limit': limit,
+            'marker': marker
         }
 
         if isinstance(metadata, dict):
@@ -36,7 +146,64 @@ class Controller(object):
 
         query_string = '?%s' % parse.urlencode(qparams)
         url = '/v2/usages%s' % query_string
-        return self.http_client.get(url)
+        return self._get(url)
+
+    def tenants(self, start, end, detailed=False, metadata=None,
+                page_size=PAGE_SIZE):
+        """Iterate over the usage of every tenant, page by page.
+
+        /v2/usages is an extension that may ignore limit and marker, so a
+        tenant is only yielded once and paging stops at a page with
+        nothing new or a marker that does not advance.
+
+        :returns: Generator of tenant usage dicts
+        """
+        resp = self.list(start, end, detailed, metadata, limit=page_size)
+        seen = set()
+        marker = None
+        while True:
+            stream = _ArrayStream('tenant_usages')
+            count = 0
+            new = 0
+            last = None
+            try:
+                for tenant in stream.parse(
+                        resp.iter_content(self.chunk_size)):
+                    count += 1
+                    last = tenant.get('project_id')
+                    if last is not None:
+                        if last in seen:
+                            continue
+                        seen.add(last)
+                    new += 1
+                    yield tenant
+            finally:
+                resp.close()
+            if not new:
+                return
+            link = _NEXT.search(stream.rest)
+            if link:
+                resp = self._get(link.group(1))
+            elif count == page_size and last and last != marker:
+                marker = last
+                resp = self.list(start, end, detailed, metadata,
+                                 limit=page_size, marker=marker)
+            else:
+                return
+
+
+class _Codes(object):
+    """Small integer codes for the values of a column."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        if value not in self._codes:
+            self._codes[value] = len(self.values)
+            self.values.append(value)
+        return self._codes[value]
 
 
 def bytes_to_GB(size_in_B):
@@ -50,25 +217,149 @@ def bytes_to_GB(size_in_B):
     return float(size_in_B) / 1024 / 1024 / 1024
 
 
-def usage(clients, conf, start=None, end=None, metadata=None):
+def aggregate(tenant, hours, statuses, visibilities):
+    """Sum a tenant's image usage by status and visibility.
+
+    Images without a gb_hours of their own are counted for the whole
+    period.
+
+    :param tenant: Tenant usage from the usages API
+    :type tenant: Dict
+    :param hours: Hours in the reported period
+    :type hours: Float
+    :param statuses: Codes of image statuses
+    :type statuses: _Codes
+    :param visibilities: Codes of image visibilities
+    :type visibilities: _Codes
+    :returns: List of row dicts with the keys in COLUMNS
+    """
+    status = array.array('H')
+    visibility = array.array('H')
+    size = array.array('d')
+    gb_hours = array.array('d')
+    for image in tenant.get('image_usages', []):
+        status.append(statuses.code(image.get('status')))
+        visibility.append(visibilities.code(image.get('visibility')))
+        size_gb = bytes_to_GB(image.get('size'))
+        size.append(size_gb)
+        gb_hours.append(image.get('gb_hours', size_gb * hours))
+
+    project_id = tenant.get('project_id')
+    if not size:
+        return [{'project_id': project_id, 'status': None,
+                 'visibility': None, 'images': 0, 'size_gb': 0.0,
+                 'gb_hours': float(tenant.get('total_gb_hours') or 0)}]
+
+    width = len(visibilities.values)
+    groups = [s * width + v for s, v in zip(status, visibility)]
+    count = {}
+    size_sums = {}
+    hour_sums = {}
+    for group, size_gb, hours_gb in zip(groups, size, gb_hours):
+        count[group] = count.get(group, 0) + 1
+        size_sums[group] = size_sums.get(group, 0.0) + size_gb
+        hour_sums[group] = hour_sums.get(group, 0.0) + hours_gb
+    return [{'project_id': project_id,
+             'status': statuses.values[group // width],
+             'visibility': visibilities.values[group % width],
+             'images': count[group],
+             'size_gb': size_sums[group],
+             'gb_hours': hour_sums[group]}
+            for group in sorted(count)]
+
+
+class _JsonLinesWriter(object):
+
+    def __init__(self, out):
+        self.out = out
+
+    def writerow(self, row):
+        self.out.write(json.dumps(row, sort_keys=True) + '\n')
+
+
+def _writer(out, fmt):
+    """Build a row writer for a format.
+
+    :param out: File-like object to write to
+    :type out: File
+    :param fmt: csv or jsonl
+    :type fmt: String
+    :returns: Object with writerow(row)
+    """
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, COLUMNS)
+        writer.writeheader()
+        return writer
+    if fmt == 'jsonl':
+        return _JsonLinesWriter(out)
+    raise ValueError("fmt must be one of {}".format(', '.join(FORMATS)))
+
+
+def report(clients, start, end, out, fmt='csv', metadata=None,
+           page_size=PAGE_SIZE):
+    """Write image usage rows per tenant, status and visibility.
+
+    :param clients: Client manager
+    :type clients: roletester.clients.ClientManager
+    :param start: Start of the period
+    :type start: datetime.datetime
+    :param end: End of the period
+    :type end: datetime.datetime
+    :param out: File-like object to write to
+    :type out: File
+    :param fmt: csv or jsonl
+    :type fmt: String
+    :param metadata: Image metadata to filter on
+    :type metadata: Dict
+    :param page_size: Tenants requested per page
+    :type page_size: Integer
+    :returns: Dict with the tenants, rows and gb_hours written
+    """
+    writer = _writer(out, fmt)
+    hours = (end - start).total_seconds() / 3600
+    statuses = _Codes()
+    visibilities = _Codes()
+    controller = Controller(clients.get_session())
+    totals = {'tenants': 0, 'rows': 0, 'gb_hours': 0.0}
+    for tenant in controller.tenants(start, end, detailed=True,
+                                     metadata=metadata,
+                                     page_size=page_size):
+        rows = aggregate(tenant, hours, statuses, visibilities)
+        for row in rows:
+            writer.writerow(row)
+            totals['gb_hours'] += row['gb_hours']
+        totals['tenants'] += 1
+        totals['rows'] += len(rows)
+    return totals
+
+
+def usage(clients, conf, start=None, end=None, metadata=None, output=None,
+          fmt='csv'):
+    """Report image usage.
+
+    :param clients: Client manager
+    :type clients: roletester.clients.ClientManager
+    :param conf: Configuration
+    :type conf: Dict
+    :param start: Start of the period
+    :type start: datetime.datetime
+    :param end: End of the period
+    :type end: datetime.datetime
+    :param metadata: Image metadata to filter on
+    :type metadata: Dict
+    :param output: File to write the report to. Standard output when None.
+    :type output: String
+    :param fmt: csv or jsonl
+    :type fmt: String
+    """
     logger.info("Start: {0}".format(start))
     logger.info("End: {0}".format(end))
     logger.info("Metadata: {0}".format(metadata))
 
-    glance = clients.get_glance()
-    controller = Controller(glance.http_client)
-
-    resp, _ = controller.list(start, end, detailed=True, metadata=metadata)
-    for tenant_usage in resp.json().get('tenant_usages', []):
-        logger.info("Tenant id: {0}".format(tenant_usage.get('project_id')))
-        logger.info("Total GB Hours: {0}".format(
-            tenant_usage.get('total_gb_hours')
-        ))
-        for usage in tenant_usage.get('image_usages', []):
-            logger.info(
-                "Name: {0} - Size: {1} GB - Status: {2}".format(
-                    usage['name'],
-                    bytes_to_GB(usage['size']),
-                    usage['status']
-                )
-            )
+    if output is None:
+        totals = report(clients, start, end, sys.stdout, fmt, metadata)
+    else:
+        with open(output, 'wb') as out:
+            totals = report(clients, start, end, out, fmt, metadata)
+    logger.info("Tenants: {0}".format(totals['tenants']))
+    logger.info("Total GB Hours: {0}".format(totals['gb_hours']))
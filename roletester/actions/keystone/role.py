@@ -4,10 +4,13 @@ from roletester.log import logging
 logger = logging.getLogger('roletester.actions.keystone.role')
 
 
-def _get_role_uuid_by_name(keystone, name):
+def _get_role_uuid_by_name(clients, name):
     """Gets a role UUID when provided a role name.
 
-    :param keystone: keystone client
+    The role list is cached by the client manager and reloaded once if
+    the role is not in it.
+
+    :param clients: Client Manager
     :type clients: roletester.clients.ClientManager
     :param name: The name of the role whos UUID should be returned
     :type name: String
@@ -17,11 +20,17 @@ def _get_role_uuid_by_name(keystone, name):
     """
 
     role_UUID = None
-    roles_list = keystone.roles.list()
-
-    for role in roles_list:
-        if role.name == name:
-            role_UUID = role.id
+    keystone = clients.get_keystone()
+    for attempt in range(2):
+        if attempt:
+            clients.cache.invalidate('roles')
+        roles_list = clients.cache.get('roles', None, keystone.roles.list)
+
+        for role in roles_list:
+            if role.name == name:
+                role_UUID = role.id
+                break
+        if role_UUID is not None:
             break
 
     if role_UUID is None:
@@ -50,7 +59,7 @@ def grant_user_project(clients, context, role="_member_"):
 
     logger.debug("Taking action role.grant_user_project {}.".format(user.name))
     keystone = clients.get_keystone()
-    role_uuid = _get_role_uuid_by_name(keystone, role)
+    role_uuid = _get_role_uuid_by_name(clients, role)
     keystone.roles.grant(role_uuid, user=user, project=project)
     context.update({'role': role_uuid})
 
@@ -76,7 +85,7 @@ def grant_user_domain(clients, context, role="_member_", domain="Default"):
     user = context['user_obj']
     logger.debug("Taking action role.grant_user_project {}.".format(user.name))
     keystone = clients.get_keystone()
-    role_uuid = _get_role_uuid_by_name(keystone, role)
+    role_uuid = _get_role_uuid_by_name(clients, role)
     keystone.roles.grant(role_uuid, user=user, domain=domain)
     context.update({'role': role_uuid})
 
@@ -1,6 +1,6 @@
 """Module containing actions to manage keystone users."""
 from roletester.log import logging
-from roletester.exc import KeystoneNotFound
+from roletester import exc
 
 logger = logging.getLogger('roletester.actions.keystone.user')
 
@@ -46,7 +46,7 @@ def delete(clients, context):
     keystone = clients.get_keystone()
     try:
         keystone.users.delete(user)
-    except KeystoneNotFound:
+    except exc.KeystoneNotFound:
         pass
 
 
@@ -3,6 +3,7 @@ from interface import detach as interface_detach
 
 from server import create as server_create
 from server import delete as server_delete
+from server import lease as server_lease
 from server import list as server_list
 from server import update as server_update
 from server import show as server_show
@@ -14,6 +15,7 @@ __all__ = [
     'interface_detach',
     'server_create',
     'server_delete',
+    'server_lease',
     'server_list',
     'server_show',
     'server_update',
@@ -1,5 +1,6 @@
-import time
-from roletester.exc import NovaNotFound
+from roletester import cache
+from roletester import exc
+from roletester import waiter
 from roletester.log import logging
 
 logger = logging.getLogger('roletester.actions.nova.server')
@@ -27,13 +28,20 @@ def create(clients,
     """
     nova = clients.get_nova()
     if flavor is None:
-        flavor = nova.flavors.list()[0].id
+        flavor = clients.cache.get(
+            'flavors', None, lambda: nova.flavors.list()[0].id
+        )
     else:
-        flavor = nova.flavors.get(flavor)
+        flavor_id = flavor
+        flavor = clients.cache.get(
+            'flavors', flavor_id, lambda: nova.flavors.get(flavor_id)
+        )
     if image is None:
-        image = nova.images.get(context['image_id'])
-    else:
-        image = nova.images.get(image)
+        image = context['image_id']
+    image_id = image
+    image = clients.cache.get(
+        'images', image_id, lambda: nova.images.get(image_id)
+    )
     logger.info(": %s" % image.id)
     logger.info("Taking action create")
     meta = {"test-key": "test-value"}
@@ -46,6 +54,52 @@ def create(clients,
     logger.info("Created server {}".format(name))
 
 
+def lease(clients, context, flavor=None, image=None, size=None, timeout=None,
+          owner=None):
+    """Takes an ACTIVE server from a warm pool instead of booting one.
+
+    There is one pool per project, network, flavor and image. It boots a
+    replacement in the background. The leased server is the caller's and
+    is deleted like any created one.
+
+    Uses context['network_id']
+    Uses context['image_id']
+    Sets context['server_id']
+
+    :param clients: Client manager
+    :type clients: roletester.clients.ClientManager
+    :param context: Pass by reference object
+    :type context: Dict
+    :param flavor: Flavor id
+    :type flavor: Integer
+    :param image: Image id
+    :type image: String
+    :param size: Servers the pool keeps ready
+    :type size: Integer
+    :param timeout: Seconds to wait for a server when none is ready
+    :type timeout: Integer
+    :param owner: Client manager a new pool boots its servers with, e.g.
+        an admin of the project that outlives the caller. Defaults to
+        clients.
+    :type owner: roletester.clients.ClientManager
+    """
+    # server_pool boots its servers with these actions, so import it late.
+    from roletester import server_pool
+    logger.info("Taking action lease")
+    network_id = context['network_id']
+    if image is None:
+        image = context['image_id']
+    pool = server_pool.get_pool(clients, network_id, flavor, image,
+                                size=size, owner=owner)
+    if timeout is None:
+        server_id = pool.lease()
+    else:
+        server_id = pool.lease(timeout=timeout)
+    context.update({'server_id': server_id})
+    context.setdefault('stack', []).append({'server_id': server_id})
+    logger.info("Leased server {}".format(server_id))
+
+
 def delete(clients, context):
     """Deletes a server.
 
@@ -130,6 +184,7 @@ def create_image(clients, context, name='nova test image'):
     meta = server.metadata
     logger.info("Creating image of instance %s" % server_id)
     image_id = server.create_image(name, meta)
+    cache.invalidate('images')
     context.update(server_image_id=image_id)
     context.setdefault('stack', []).append({'image_id': image_id})
     logger.info("Created server image %s" % image_id)
@@ -156,7 +211,7 @@ def wait_for_status(admin_clients,
     :type context: Dict
     :param timeout: Timeout in seconds.
     :type timeout: Integer
-    :param interval: Time in seconds to wait between polls.
+    :param interval: Maximum time in seconds to wait between polls.
     :type timeout: Integer
     :param initial_wait: Time in seconds to wait before beginning to poll.
         Useful for expecting a server that is ACTIVE to go to DELETED
@@ -167,24 +222,8 @@ def wait_for_status(admin_clients,
     """
     logger.info("Taking action wait for server")
 
-    if initial_wait:
-        time.sleep(initial_wait)
-
-    start = time.time()
-    try:
-        while (time.time() - start < timeout):
-            show(admin_clients, context)
-            status = context['server_status']
-            logger.debug("Found status {}".format(status))
-            if status == target_status:
-                context.pop('server_status')
-                break
-            if status in _DONE_STATUS:
-                raise Exception(
-                    "Was looking for status {} but found {}"
-                    .format(target_status, status)
-                )
-            time.sleep(interval)
-    except NovaNotFound:
-        if target_status != 'DELETED':
-            raise
+    waiter.wait_for_status(
+        admin_clients, context, 'nova', context['server_id'], 'server_status',
+        target_status, _DONE_STATUS, exc.NovaNotFound, 'DELETED',
+        timeout=timeout, interval=interval, initial_wait=initial_wait
+    )
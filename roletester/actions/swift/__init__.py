@@ -1,12 +1,18 @@
 from swift_container import create as swift_container_create
 from swift_container import delete as swift_container_delete
+from swift_container import empty as swift_container_empty
 from swift_container import get as swift_container_get
 from swift_container import add_metadata as swift_container_add_metadata
 from swift_container import delete_metadata as swift_container_delete_metadata
 
 from swift_object import put as swift_object_put
+from swift_object import put_many as swift_object_put_many
+from swift_object import put_large as swift_object_put_large
 from swift_object import delete as swift_object_delete
+from swift_object import delete_large as swift_object_delete_large
+from swift_object import delete_many as swift_object_delete_many
 from swift_object import get as swift_object_get
+from swift_object import download as swift_object_download
 from swift_object import replace_metadata as swift_object_replace_metadata
 from swift_object import add_metadata as swift_object_add_metadata
 from swift_object import delete_metadata as swift_object_delete_metadata
@@ -14,13 +20,19 @@ from swift_object import delete_metadata as swift_object_delete_metadata
 __all__ = [
     'swift_container_create',
     'swift_container_delete',
+    'swift_container_empty',
     'swift_container_get',
     'swift_container_add_metadata',
     'swift_container_delete_metadata',
 
     'swift_object_put',
+    'swift_object_put_many',
+    'swift_object_put_large',
     'swift_object_delete',
+    'swift_object_delete_large',
+    'swift_object_delete_many',
     'swift_object_get',
+    'swift_object_download',
     'swift_object_replace_metadata',
     'swift_object_add_metadata',
     'swift_object_delete_metadata'
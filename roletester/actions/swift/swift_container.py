@@ -1,4 +1,5 @@
 """Module containing actions to manage swift containers."""
+from roletester import swift_bulk
 from roletester.log import logging
 from roletester.swift_error_decorator import swift_error
 import copy
@@ -43,6 +44,25 @@ def delete(clients, context):
     swift.delete_container(name)
 
 
+@swift_error
+def empty(clients, context, workers=None):
+    """Deletes every object in a container.
+
+    Uses context['container_name']
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param context: Pass by reference object
+    :type context: Dict
+    :param workers: Maximum number of deletes to run at once without bulk
+        delete.
+    :type workers: Integer
+    """
+    name = context['container_name']
+    logger.info("Taking action container.empty {}.".format(name))
+    swift_bulk.empty(clients, name, workers)
+
+
 @swift_error
 def get(clients, context):
     """Retrieves stats and lists objects in a container.
@@ -1,4 +1,6 @@
 """Module containing actions to manage swift objects."""
+from roletester import streaming
+from roletester import swift_bulk
 from roletester.log import logging
 from roletester.swift_error_decorator import swift_error
 import copy
@@ -35,6 +37,165 @@ def put(clients, context, obj_name="test_object", obj_contents=""):
     })
 
 
+@swift_error
+def put_many(clients, context, obj_prefix="test_object", count=10,
+             obj_contents="", workers=None):
+    """Create objects in a container concurrently.
+
+    Uses context['container_name']
+    Sets context['object_names']
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param context: Pass by reference object
+    :type context: Dict
+    :param obj_prefix: Prefix of the names of the objects to create.
+    :type obj_prefix: String
+    :param count: Number of objects to create.
+    :type count: Integer
+    :param obj_contents: Contents of each object.
+    :type obj_contents: String
+    :param workers: Maximum number of uploads to run at once.
+    :type workers: Integer
+    """
+    container = context['container_name']
+    names = ['{}_{}'.format(obj_prefix, i) for i in range(count)]
+
+    logger.info("Taking action object.put_many {} x{}."
+                .format(obj_prefix, count))
+
+    stack = context.setdefault('stack', [])
+    try:
+        swift_bulk.put_many(clients, container,
+                            [(name, obj_contents) for name in names],
+                            workers)
+    finally:
+        # Some uploads may have succeeded even if one failed.
+        for name in names:
+            stack.append({'container_name': container, 'object_name': name})
+    context.update({"object_names": names})
+
+
+@swift_error
+def put_large(clients, context, obj_name="test_large_object",
+              size=128 * 1024 * 1024, source=None,
+              segment_size=streaming.SEGMENT_SIZE, manifest='slo',
+              workers=None):
+    """Create a segmented large object in a container.
+
+    Uses context['container_name']
+    Sets context['object_name']
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param context: Pass by reference object
+    :type context: Dict
+    :param obj_name: Name of the object to create.
+    :type obj_name: String
+    :param size: Bytes of generated data to upload when there is no source.
+    :type size: Integer
+    :param source: Path, file-like object or iterable of strings to upload.
+    :type source: Object
+    :param segment_size: Bytes per segment.
+    :type segment_size: Integer
+    :param manifest: slo or dlo.
+    :type manifest: String
+    :param workers: Maximum number of segments to upload at once.
+    :type workers: Integer
+    """
+    container = context['container_name']
+
+    logger.info("Taking action object.put_large {}.".format(obj_name))
+
+    segments = streaming.segments_container(container)
+    stack = context.setdefault('stack', [])
+    stack.append({'container_name': segments})
+    stack.append({'container_name': container, 'object_name': obj_name})
+    result = streaming.put_large(
+        clients, container, obj_name,
+        source if source is not None else streaming.payload(size),
+        segment_size=segment_size, manifest=manifest, workers=workers
+    )
+    logger.info("Uploaded {} bytes at {:.0f} B/s."
+                .format(result['bytes'], result['bytes_per_second']))
+    context.update({"object_name": obj_name})
+
+
+@swift_error
+def download(clients, context, chunk_size=streaming.CHUNK_SIZE):
+    """Streams an object, checking its checksum without keeping it.
+
+    Uses context['container_name']
+    Uses context['object_name']
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param context: Pass by reference object
+    :type context: Dict
+    :param chunk_size: Bytes read at a time.
+    :type chunk_size: Integer
+    """
+    container = context['container_name']
+    obj_name = context['object_name']
+
+    logger.info("Taking action object.download {}.".format(obj_name))
+
+    result = streaming.get_hashed(clients, container, obj_name, chunk_size)
+    logger.info("Downloaded {} bytes at {:.0f} B/s, md5 {}."
+                .format(result['bytes'], result['bytes_per_second'],
+                        result['md5']))
+
+
+@swift_error
+def delete_many(clients, context, workers=None, missing_ok=False):
+    """Deletes objects from a container, in bulk where swift supports it.
+
+    Uses context['container_name']
+    Uses context['object_names']
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param context: Pass by reference object
+    :type context: Dict
+    :param workers: Maximum number of deletes to run at once without bulk
+        delete.
+    :type workers: Integer
+    :param missing_ok: Ignore objects that are already gone. For cleanup
+        only, a 404 may be all a user of another domain gets.
+    :type missing_ok: Boolean
+    """
+    container = context['container_name']
+    names = context['object_names']
+
+    logger.info("Taking action object.delete_many {} objects."
+                .format(len(names)))
+
+    swift_bulk.delete_many(clients, container, names, workers, missing_ok)
+
+
+@swift_error
+def delete_large(clients, context, workers=None):
+    """Deletes a large object together with its segments.
+
+    Uses context['container_name']
+    Uses context['object_name']
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param context: Pass by reference object
+    :type context: Dict
+    :param workers: Maximum number of segments to delete at once without
+        bulk delete.
+    :type workers: Integer
+    """
+    container = context['container_name']
+    obj_name = context['object_name']
+
+    logger.info("Taking action object.delete_large {}.".format(obj_name))
+
+    streaming.delete_large(clients, container, obj_name, workers)
+
+
 @swift_error
 def delete(clients, context):
     """Deletes an object from a container
@@ -0,0 +1,115 @@
+"""Read-through cache for reference data that rarely changes.
+
+Flavors, images, roles, networks and service capabilities are looked up
+over and over while a run creates servers, grants roles and sets up tests.
+Each ClientManager has a TTLCache so the lookups go to the API once per
+TTL. TTLs are per kind of data and can be changed with
+ROLETESTER_CACHE_TTL_<KIND> in seconds; 0 turns caching of a kind off.
+
+Actions that change reference data call invalidate(), which drops the
+kind from the cache of every client manager.
+"""
+import os
+import threading
+import time
+import weakref
+
+# Default seconds an entry is kept, by kind.
+_TTLS = {
+    'capabilities': 3600,
+    'flavors': 3600,
+    'images': 300,
+    'networks': 300,
+    'roles': 600
+}
+
+_caches = weakref.WeakSet()
+_caches_lock = threading.Lock()
+
+
+def ttl(kind):
+    """Get the TTL of a kind of data.
+
+    :param kind: Kind of data, e.g. flavors
+    :type kind: String
+    :returns: Float seconds
+    """
+    setting = os.getenv('ROLETESTER_CACHE_TTL_{}'.format(kind.upper()))
+    if setting is not None:
+        return float(setting)
+    return float(_TTLS.get(kind, 0))
+
+
+class TTLCache(object):
+
+    def __init__(self):
+        """Init an empty cache and register it for invalidation."""
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with _caches_lock:
+            _caches.add(self)
+
+    def get(self, kind, key, loader):
+        """Get a value, loading it on a miss or once it expired.
+
+        :param kind: Kind of data, picks the TTL
+        :type kind: String
+        :param key: Key of the value within its kind
+        :type key: Object
+        :param loader: Callable without arguments that loads the value
+        :type loader: Function
+        :returns: Object
+        """
+        lifetime = ttl(kind)
+        if lifetime <= 0:
+            return loader()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = loader()
+        with self._lock:
+            self._entries[(kind, key)] = (now + lifetime, value)
+        return value
+
+    def invalidate(self, kind, key=None):
+        """Drop a value or every value of a kind.
+
+        :param kind: Kind of data
+        :type kind: String
+        :param key: Key to drop. Drops the whole kind when None.
+        :type key: Object
+        """
+        with self._lock:
+            if key is not None:
+                self._entries.pop((kind, key), None)
+                return
+            for cached in [k for k in self._entries if k[0] == kind]:
+                del self._entries[cached]
+
+    def stats(self):
+        """Get the hit and miss counts.
+
+        :returns: Dict
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+def invalidate(kind, key=None):
+    """Drop a value or a kind from every cache.
+
+    :param kind: Kind of data
+    :type kind: String
+    :param key: Key to drop. Drops the whole kind when None.
+    :type key: Object
+    """
+    with _caches_lock:
+        caches = list(_caches)
+    for cache in caches:
+        cache.invalidate(kind, key)
@@ -1,17 +1,119 @@
+import atexit
+import importlib
 import os
-from keystoneauth1 import session
-from keystoneauth1.identity import v3
-from cinderclient import client as cinderclient
-from novaclient import client as novaclient
-from glanceclient import Client as glanceclient
-from keystoneclient import client as keystoneclient
-from neutronclient.v2_0 import client as neutronclient
-from swiftclient import client as swiftclient
+import threading
+import time
+from roletester import pools
+from roletester import singleflight
+from roletester.cache import TTLCache
+from roletester import token_cache
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.clients')
+
+# Client library module of each service. A library is only imported the
+# first time a client for its service is requested.
+SERVICES = {
+    'cinder': 'cinderclient.client',
+    'glance': 'glanceclient',
+    'keystone': 'keystoneclient.client',
+    'neutron': 'neutronclient.v2_0.client',
+    'nova': 'novaclient.client',
+    'swift': 'swiftclient.client'
+}
+
+_loaded = {}
+_import_seconds = {}
+_load_lock = threading.Lock()
+
+# Shared client managers by credentials, with their reference counts.
+_managers = {}
+_refcounts = {}
+_managers_lock = threading.Lock()
+
+
+def register_service(name, module):
+    """Register the client library module of a service.
+
+    :param name: Service name
+    :type name: String
+    :param module: Dotted module path, imported on first use
+    :type module: String
+    """
+    with _load_lock:
+        SERVICES[name] = module
+        _loaded.pop(name, None)
+
+
+def load_service(name):
+    """Import the client library of a service.
+
+    :param name: Service name
+    :type name: String
+    :returns: Module
+    """
+    with _load_lock:
+        if name not in _loaded:
+            start = time.time()
+            _loaded[name] = importlib.import_module(SERVICES[name])
+            _import_seconds[name] = time.time() - start
+            logger.debug("Imported {} client in {:.3f}s"
+                         .format(name, _import_seconds[name]))
+        return _loaded[name]
+
+
+def import_times():
+    """Get the seconds spent importing each client library loaded so far.
+
+    :returns: Dict of service name to seconds
+    """
+    with _load_lock:
+        return dict(_import_seconds)
+
+
+# Pooled swiftclient Connection classes by the Connection they extend.
+_swift_connections = {}
+
+
+def _swift_connection_class():
+    """Get a swiftclient Connection class that uses a shared pool.
+
+    swiftclient gives every HTTP connection it makes a requests session
+    of its own. Connections of this class mount their adapter attribute,
+    when set, on that session instead, so they reuse pooled connections.
+
+    :returns: Class
+    """
+    base = load_service('swift').Connection
+    with _load_lock:
+        if base not in _swift_connections:
+
+            class PooledConnection(base):
+
+                adapter = None
+
+                def http_connection(self, url=None):
+                    parsed, conn = base.http_connection(self, url)
+                    if self.adapter is not None:
+                        conn.request_session.mount('https://', self.adapter)
+                        conn.request_session.mount('http://', self.adapter)
+                    return parsed, conn
+
+            _swift_connections[base] = PooledConnection
+        return _swift_connections[base]
+
 
 class ClientManager(object):
     """Object that manages multiple openstack clients.
 
     Operates with the intention of sharing one keystone auth session.
+    Tokens are shared with other managers for the same user and scope
+    through roletester.token_cache. The password is sent once; the other
+    scope is reached by rescoping that token.
+
+    Safe to share between threads. Each service endpoint gets a connection
+    pool sized by roletester.pools; see pool_stats(). Identical GETs made
+    concurrently through a session are sent once; see coalesce_stats().
     """
     def __init__(self, **auth_kwargs):
         """Inits the client manager.
@@ -32,6 +134,15 @@ class ClientManager(object):
                                           'session': None},
                               'domain': {'kwargs': {},
                                          'session': None}}
+        # Guards lazy creation of sessions and clients. Never held during
+        # a request.
+        self._lock = threading.RLock()
+        # One requests session, and so one set of connection pools, for
+        # every scope and client. Service endpoints get their own pools.
+        self._http = pools.http_session()
+        self._adapters = {}
+        # Reference data such as flavors, images and roles.
+        self.cache = TTLCache()
 
     def get_session(self, scope='project'):
         """Get a keystone auth session.
@@ -45,14 +156,133 @@ class ClientManager(object):
         else:
             revoke_key = revoke_keys[scope]
 
-        if self._scope[scope]['session'] is None:
-            scoped_kwargs = { x: self.auth_kwargs[x]
-                              for x in self.auth_kwargs
-                              if x != revoke_key }
-            self._scope[scope]['kwargs'] = scoped_kwargs
-            auth = v3.Password(**self._scope[scope]['kwargs'])
-            self._scope[scope]['session'] = session.Session(auth=auth)
-        return self._scope[scope]['session']
+        sess = self._scope[scope]['session']
+        if sess is not None:
+            return sess
+        with self._lock:
+            if self._scope[scope]['session'] is None:
+                scoped_kwargs = { x: self.auth_kwargs[x]
+                                  for x in self.auth_kwargs
+                                  if x != revoke_key }
+                self._scope[scope]['kwargs'] = scoped_kwargs
+                token = self._get_token()
+                if token is not None:
+                    auth = token_cache.RescopedToken(token, **scoped_kwargs)
+                else:
+                    auth = token_cache.CachedPassword(**scoped_kwargs)
+                self._scope[scope]['session'] = \
+                    singleflight.CoalescingSession(auth=auth,
+                                                   session=self._http)
+            return self._scope[scope]['session']
+
+    def _get_token(self):
+        """Get a live token of this user in any scope, without a request.
+
+        :returns: String token or None
+        """
+        for scoped in self._scope.values():
+            sess = scoped['session']
+            if sess is None:
+                continue
+            auth_ref = sess.auth.auth_ref
+            if auth_ref is not None and not auth_ref.will_expire_soon(
+                    sess.auth.MIN_TOKEN_LIFE_SECONDS):
+                return auth_ref.auth_token
+        return None
+
+    def _mount(self, service, sess, service_type, interface='public'):
+        """Give the endpoint of a service its own connection pool.
+
+        :param service: Service name the pool settings are looked up by
+        :type service: String
+        :param sess: Session the client of the service uses
+        :type sess: keystoneauth1.session.Session
+        :param service_type: Catalog service type
+        :type service_type: String
+        :param interface: Catalog endpoint interface
+        :type interface: String
+        """
+        if service in self._adapters:
+            return
+        # Resolving the endpoint may authenticate, so it is done before
+        # the lock is taken.
+        try:
+            endpoint = sess.get_endpoint(service_type=service_type,
+                                         interface=interface)
+        except Exception:
+            logger.debug("No {} endpoint to pool connections for."
+                         .format(service_type))
+            return
+        with self._lock:
+            if endpoint and service not in self._adapters:
+                adapter = pools.adapter(service)
+                self._http.mount(endpoint, adapter)
+                self._adapters[service] = adapter
+
+    def _get_client(self, name, scope, service_type, interface, build):
+        """Get a cached client, creating it on first use.
+
+        The lock is only taken to store a new client, so threads sharing
+        the manager do not wait on each other once it exists.
+
+        :param name: Attribute and pool name of the service, e.g. nova
+        :type name: String
+        :param scope: Scope of the session the client uses
+        :type scope: String
+        :param service_type: Catalog service type
+        :type service_type: String
+        :param interface: Catalog endpoint interface
+        :type interface: String
+        :param build: Builds the client from a session
+        :type build: Function
+        :returns: Client instance
+        """
+        client = getattr(self, name)
+        if client is not None:
+            return client
+        sess = self.get_session(scope=scope)
+        self._mount(name, sess, service_type, interface)
+        with self._lock:
+            if getattr(self, name) is None:
+                setattr(self, name, build(sess))
+            return getattr(self, name)
+
+    def pool_stats(self):
+        """Get connection pool statistics by service.
+
+        Requests to endpoints without a pool of their own, e.g. for
+        tokens, are counted under default.
+
+        :returns: Dict of service name to PoolStats.as_dict()
+        """
+        with self._lock:
+            adapters = dict(self._adapters)
+        adapters['default'] = self._http.get_adapter('https://')
+        return dict((name, adapter.stats.as_dict())
+                    for name, adapter in adapters.items())
+
+    def coalesce_stats(self):
+        """Get request coalescing statistics by scope.
+
+        calls are requests that were sent, hits are requests answered by
+        an identical request already in flight.
+
+        :returns: Dict of scope to singleflight.Group.stats()
+        """
+        with self._lock:
+            return dict((scope, scoped['session'].coalescer.stats())
+                        for scope, scoped in self._scope.items()
+                        if scoped['session'] is not None)
+
+    @property
+    def auth_round_trips(self):
+        """Round trips made to keystone for this manager's tokens.
+
+        :returns: Integer
+        """
+        return sum(scoped['session'].auth.round_trips
+                   for scoped in self._scope.values()
+                   if scoped['session'] is not None)
 
     def get_nova(self, version='2.1', scope='project'):
         """Get a nova client instance.
@@ -60,10 +290,10 @@ class ClientManager(object):
         :param version: String api version
         :returns: novaclient.client.Client
         """
-        if self.nova is None:
-            sess = self.get_session(scope=scope)
-            self.nova = novaclient.Client(version, session=sess)
-        return self.nova
+        return self._get_client(
+            'nova', scope, 'compute', 'public',
+            lambda sess: load_service('nova').Client(version, session=sess)
+        )
 
     def get_neutron(self, version='2', scope='project'):
         """Get a neutron client instance.
@@ -71,11 +301,12 @@ class ClientManager(object):
         :param version: String api version
         :returns: neutronclient.v2_0.client.Client
         """
-        if self.neutron is None:
-            sess = self.get_session(scope=scope)
-	    iface = os.getenv('OS_ENDPOINT_TYPE', "internalURL")
-            self.neutron = neutronclient.Client(session=sess, interface=iface)
-        return self.neutron
+        iface = os.getenv('OS_ENDPOINT_TYPE', "internalURL")
+        return self._get_client(
+            'neutron', scope, 'network', iface,
+            lambda sess: load_service('neutron').Client(session=sess,
+                                                        interface=iface)
+        )
 
     def get_glance(self, version='2', scope='project'):
         """Get a glance client instance.
@@ -83,10 +314,10 @@ class ClientManager(object):
         :param version: String api version
         :return: glanceclient.Client
         """
-        if self.glance is None:
-            sess = self.get_session(scope=scope)
-            self.glance = glanceclient(version, session=sess)
-        return self.glance
+        return self._get_client(
+            'glance', scope, 'image', 'public',
+            lambda sess: load_service('glance').Client(version, session=sess)
+        )
 
     def get_cinder(self, version='2', scope='project'):
         """Get a cinder client instance.
@@ -94,28 +325,53 @@ class ClientManager(object):
         :param version: String api version
         :return: cinderclient.client.Client
         """
-        if self.cinder is None:
-            sess = self.get_session(scope=scope)
-            iface = os.getenv('OS_ENDPOINT_TYPE', "public")
-            self.cinder = cinderclient.Client(version,
-                                              session=sess,
-                                              interface=iface)
-        return self.cinder
+        iface = os.getenv('OS_ENDPOINT_TYPE', "public")
+        return self._get_client(
+            'cinder', scope, 'volumev2', iface,
+            lambda sess: load_service('cinder').Client(version,
+                                                       session=sess,
+                                                       interface=iface)
+        )
 
-    def get_swift(self):
+    def get_swift(self, scope='project'):
         """Get a swift client.Connection instance.
 
+        The token and storage url come from the keystone session, so swift
+        shares the manager's token, and its HTTP connections come from the
+        manager's swift pool.
+
+        :param scope: Sets the scope of the token swift uses.
+        :return: swiftclient.client.Connection
+        """
+        swift = self.swift
+        if swift is not None:
+            return swift
+        swift = self.new_swift(scope=scope)
+        with self._lock:
+            if self.swift is None:
+                self.swift = swift
+            return self.swift
+
+    def new_swift(self, scope='project'):
+        """Get a swift client.Connection of its own, e.g. for a thread.
+
+        swiftclient connections are not safe to share between threads.
+        Every connection made here shares the token and connection pool
+        of get_swift().
+
+        :param scope: Sets the scope of the token swift uses.
         :return: swiftclient.client.Connection
         """
-        if self.swift is None:
-            self.swift = swiftclient.Connection(
-                auth_version='3',
-                authurl=self.auth_kwargs["auth_url"],
-                user=self.auth_kwargs["username"],
-                key=self.auth_kwargs["password"],
-                tenant_name=self.auth_kwargs["project_name"]
-            )
-        return self.swift
+        sess = self.get_session(scope=scope)
+        iface = os.getenv('OS_ENDPOINT_TYPE', "public")
+        self._mount('swift', sess, 'object-store', iface)
+        swift = _swift_connection_class()(
+            session=sess,
+            os_options={'service_type': 'object-store',
+                        'endpoint_type': iface}
+        )
+        swift.adapter = self._adapters.get('swift')
+        return swift
 
     def get_keystone(self, version='3', scope='project'):
         """Get a keystone client instance.
@@ -124,10 +380,88 @@ class ClientManager(object):
         :param version: String api version
         :return: keystoneClient.Client
         """
-        if self.keystone is None:
-            iface = os.getenv('OS_ENDPOINT_TYPE', "internalURL")
-            self.keystone = keystoneclient.Client(
-                version=version,
-                session=self.get_session(scope=scope),
-                interface=iface)
-        return self.keystone
+        iface = os.getenv('OS_ENDPOINT_TYPE', "internalURL")
+        return self._get_client(
+            'keystone', scope, 'identity', iface,
+            lambda sess: load_service('keystone').Client(version=version,
+                                                         session=sess,
+                                                         interface=iface)
+        )
+
+    def close(self):
+        """Close the HTTP connections of every client.
+
+        The manager can still be used afterwards; it reconnects.
+        """
+        with self._lock:
+            self._http.close()
+            for scoped in self._scope.values():
+                scoped['session'] = None
+            if self.swift is not None:
+                self.swift.close()
+            self.neutron = None
+            self.nova = None
+            self.glance = None
+            self.cinder = None
+            self.swift = None
+            self.keystone = None
+
+
+def _registry_key(auth_kwargs):
+    return tuple(sorted(auth_kwargs.items()))
+
+
+def get_client_manager(**auth_kwargs):
+    """Get the shared client manager for a set of credentials.
+
+    Every caller with the same credentials and scope gets the same
+    manager, so its sessions, clients and connection pools are reused for
+    the whole process. Pair each call with release_client_manager().
+
+    :returns: ClientManager
+    """
+    key = _registry_key(auth_kwargs)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = ClientManager(**auth_kwargs)
+        _refcounts[key] = _refcounts.get(key, 0) + 1
+        return manager
+
+
+def release_client_manager(manager, close=False):
+    """Drop a reference to a shared client manager.
+
+    Unreferenced managers are kept for the next caller with the same
+    credentials unless close is set, e.g. because the user was deleted.
+
+    :param manager: Manager from get_client_manager()
+    :type manager: ClientManager
+    :param close: Close and forget the manager once unreferenced
+    :type close: Boolean
+    """
+    key = _registry_key(manager.auth_kwargs)
+    with _managers_lock:
+        if _managers.get(key) is not manager:
+            return
+        _refcounts[key] = max(_refcounts[key] - 1, 0)
+        if not close or _refcounts[key]:
+            return
+        del _managers[key]
+        del _refcounts[key]
+    manager.close()
+
+
+@atexit.register
+def close_all():
+    """Close every shared client manager."""
+    with _managers_lock:
+        managers = list(_managers.items())
+        _managers.clear()
+        _refcounts.clear()
+    for key, manager in managers:
+        try:
+            manager.close()
+        except Exception:
+            logger.exception("Error closing client manager for {}"
+                             .format(manager.auth_kwargs.get('username')))
@@ -0,0 +1,234 @@
+"""Scenario context with a cheap copy-on-write fork.
+
+Actions treat the context as a plain dict: context['x'], context.update,
+context.setdefault('stack', []).append and context.pop. Context supports
+all of that. Calling fork() freezes the keys written so far into a layer
+shared by the parent and the child. Each side then writes into its own
+local dict, so a fork costs no more than the keys changed since the
+previous one.
+
+The garbage stack is a persistent linked stack. Forked contexts share the
+entries pushed before the fork; entries pushed or popped afterwards are
+only seen by the side that made them.
+"""
+import collections
+import threading
+
+# Marks a key removed from a context while a shared layer still has it.
+_DELETED = object()
+
+# Flatten the shared layers once a chain of forks gets this deep.
+_MAX_DEPTH = 16
+
+# Guards the head of every GarbageStack.
+_lock = threading.Lock()
+
+
+class GarbageStack(object):
+    """LIFO of resources to clean up that can be forked in O(1)."""
+
+    __slots__ = ('_head', '_size')
+
+    def __init__(self, items=None):
+        """Init the stack.
+
+        :param items: Entries to push, bottom first
+        :type items: List
+        """
+        self._head = None
+        self._size = 0
+        for item in items or []:
+            self.append(item)
+
+    def append(self, item):
+        """Push an entry."""
+        with _lock:
+            self._head = (item, self._head)
+            self._size += 1
+
+    def extend(self, items):
+        """Push several entries, bottom first."""
+        for item in items:
+            self.append(item)
+
+    def pop(self):
+        """Pop the most recently pushed entry.
+
+        :returns: Object
+        """
+        with _lock:
+            if self._head is None:
+                raise IndexError('pop from empty stack')
+            item, self._head = self._head
+            self._size -= 1
+            return item
+
+    def fork(self):
+        """Get a stack that shares the current entries.
+
+        :returns: GarbageStack
+        """
+        stack = GarbageStack()
+        with _lock:
+            stack._head = self._head
+            stack._size = self._size
+        return stack
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        """Iterate bottom first, like a list."""
+        items = []
+        node = self._head
+        while node is not None:
+            items.append(node[0])
+            node = node[1]
+        return reversed(items)
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class _Layer(object):
+    """Frozen keys shared between forks."""
+
+    __slots__ = ('data', 'parent', 'depth')
+
+    def __init__(self, data, parent):
+        self.data = data
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 1
+
+
+class Context(collections.MutableMapping):
+
+    def __init__(self, *args, **kwargs):
+        """Init the context like a dict."""
+        self._local = {}
+        self._shared = None
+        # Makes setdefault atomic, links running in parallel share the
+        # context.
+        self._lock = threading.Lock()
+        self.update(*args, **kwargs)
+
+    def _lookup(self, key):
+        """Find a key in the shared layers.
+
+        :returns: Object - the value, _DELETED or KeyError is raised
+        """
+        layer = self._shared
+        while layer is not None:
+            if key in layer.data:
+                return layer.data[key]
+            layer = layer.parent
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        if key in self._local:
+            value = self._local[key]
+        else:
+            value = self._lookup(key)
+            if isinstance(value, GarbageStack):
+                # Stacks in shared layers are snapshots. Take a private fork
+                # before handing one out, it may be appended to.
+                value = self._local.setdefault(key, value.fork())
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key == 'stack' and isinstance(value, list):
+            value = GarbageStack(value)
+        self._local[key] = value
+
+    def __delitem__(self, key):
+        self[key]
+        try:
+            self._lookup(key)
+            self._local[key] = _DELETED
+        except KeyError:
+            del self._local[key]
+
+    def __iter__(self):
+        seen = set()
+        layers = [self._local]
+        layer = self._shared
+        while layer is not None:
+            layers.append(layer.data)
+            layer = layer.parent
+        for data in layers:
+            for key, value in data.items():
+                if key in seen:
+                    continue
+                seen.add(key)
+                if value is not _DELETED:
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def setdefault(self, key, default=None):
+        """Like dict.setdefault, returning the stored value.
+
+        Lists stored as the garbage stack become GarbageStacks, so the
+        value returned is the one that was actually stored. Two links
+        setting the same default at once get the same value back.
+        """
+        with self._lock:
+            try:
+                return self[key]
+            except KeyError:
+                self[key] = default
+                return self[key]
+
+    def fork(self):
+        """Get a context that shares everything set so far.
+
+        :returns: Context
+        """
+        frozen = {}
+        kept = {}
+        for key, value in self._local.items():
+            if isinstance(value, GarbageStack):
+                # This side keeps the stack object callers may hold on to.
+                frozen[key] = value.fork()
+                kept[key] = value
+            else:
+                frozen[key] = value
+        if frozen:
+            self._shared = _Layer(frozen, self._shared)
+        self._local = kept
+        if self._shared is not None and self._shared.depth > _MAX_DEPTH:
+            self._flatten()
+
+        child = Context()
+        child._shared = self._shared
+        return child
+
+    copy = fork
+
+    def _flatten(self):
+        """Collapse the shared layers into one."""
+        data = {}
+        layers = []
+        layer = self._shared
+        while layer is not None:
+            layers.append(layer.data)
+            layer = layer.parent
+        for frozen in reversed(layers):
+            data.update(frozen)
+        data = dict((k, v) for k, v in data.items() if v is not _DELETED)
+        self._shared = _Layer(data, None)
@@ -0,0 +1,458 @@
+"""Dependency graph execution of scenario links.
+
+Every action documents the context keys it touches with lines like
+"Uses context['server_id']" and "Sets context['server_id']". This module
+turns that contract (and the action source itself) into read and write
+sets, builds a dependency graph between the links of a scenario and runs
+links that do not depend on each other on a bounded thread pool.
+
+Keys name cloud resources as well as values, so an action that changes a
+resource (delete, update, attach, ...) is treated as writing every key it
+uses. Only read-only actions and creates, which merely reference their
+parent resources, share keys with other links.
+
+Keys do not capture every dependency in the cloud: a server boots on a
+network only once it has a subnet, and a floating IP is associated only
+once the router has an interface on the subnet. Links that change the
+cloud, creates included, therefore keep their scenario order among
+themselves. Read-only links such as waits and shows only wait on the keys
+they use, and run alongside the rest.
+
+Whenever the keys an action touches cannot be worked out, the link is
+treated as a barrier so that it runs in the same order it would serially.
+"""
+import ast
+import inspect
+import re
+import sys
+import textwrap
+import threading
+import six
+
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.dag')
+
+# Appending garbage to the stack is order independent so it never creates
+# a dependency between links.
+_IGNORED_KEYS = set(['stack'])
+
+# Action names that do not change the resources they use.
+_READ_ONLY_ACTIONS = set(['show', 'get', 'list', 'list_user', 'download',
+                          'wait_for_status'])
+
+# Action name prefixes that only reference the resources they use.
+_CREATE_PREFIXES = ('create', 'put', 'lease')
+
+_DOC_KEY = re.compile(
+    r"^\s*(Uses|Sets|Deletes|Removes)\s+context\['(\w+)", re.M
+)
+_SRC_SUBSCRIPT = re.compile(r"context\[\s*(['\"]?)(\w+)\1\s*\](\s*=(?!=))?")
+_SRC_METHOD = re.compile(
+    r"context\.(get|pop|setdefault|update)\(\s*(['\"]?)(\w*)\2"
+)
+_SRC_UPDATE_KWARG = re.compile(r"context\.update\(([^)]*)\)")
+_SRC_DICT_KEY = re.compile(r"['\"](\w+)['\"]\s*:")
+_SRC_KWARG = re.compile(r"(\w+)\s*=(?!=)")
+
+_contracts = {}
+_contracts_lock = threading.Lock()
+
+
+class Contract(object):
+    """Context keys read and written by an action."""
+
+    def __init__(self, reads=None, writes=None):
+        """Init the contract.
+
+        :param reads: Context keys the action reads
+        :type reads: Set
+        :param writes: Context keys the action sets or removes
+        :type writes: Set
+        """
+        self.reads = set(reads or []) - _IGNORED_KEYS
+        self.writes = set(writes or []) - _IGNORED_KEYS
+
+    def merge(self, other):
+        """Add the keys of another contract to this one.
+
+        :param other: Contract to merge
+        :type other: Contract
+        """
+        self.reads |= other.reads
+        self.writes |= other.writes
+
+    def conflicts(self, later):
+        """Check if a later link must wait for this one.
+
+        :param later: Contract of a link that comes after this one
+        :type later: Contract
+        :returns: Boolean
+        """
+        return bool(
+            self.writes & (later.reads | later.writes) or
+            self.reads & later.writes
+        )
+
+
+def _unwrap(action):
+    """Follow decorators that record the function they wrap."""
+    while getattr(action, '__wrapped__', None) is not None:
+        action = action.__wrapped__
+    return action
+
+
+def _parse_docstring(doc):
+    """Reads the Uses/Sets lines out of an action docstring.
+
+    :param doc: Docstring
+    :type doc: String
+    :returns: Contract
+    """
+    contract = Contract()
+    for verb, key in _DOC_KEY.findall(doc or ''):
+        if verb == 'Uses':
+            contract.reads.add(key)
+        else:
+            contract.writes.add(key)
+    contract.reads -= _IGNORED_KEYS
+    contract.writes -= _IGNORED_KEYS
+    return contract
+
+
+def _dotted_name(node):
+    """Get the dotted name of a called expression, e.g. waiter.wait.
+
+    :param node: Called expression
+    :type node: ast.AST
+    :returns: String|None - None for anything but names and attributes
+    """
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        owner = _dotted_name(node.value)
+        if owner is not None:
+            return owner + '.' + node.attr
+    return None
+
+
+def _context_calls(source):
+    """Finds the calls an action passes its context to.
+
+    :param source: Source of the action
+    :type source: String
+    :returns: List of (name, call) tuples|None - None when unparsable.
+        name is the dotted name called, None when it is not a plain name.
+    """
+    try:
+        tree = ast.parse(textwrap.dedent(source))
+    except SyntaxError:
+        return None
+    calls = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        args = node.args + [keyword.value for keyword in node.keywords]
+        if any(isinstance(arg, ast.Name) and arg.id == 'context'
+               for arg in args):
+            calls.append((_dotted_name(node.func), node))
+    return calls
+
+
+def _resolve(action, name):
+    """Looks a dotted name up in the globals of an action.
+
+    :param action: Action function
+    :type action: Function
+    :param name: Dotted name, e.g. waiter.wait_for_status
+    :type name: String
+    :returns: Object|None
+    """
+    parts = name.split('.')
+    found = action.__globals__.get(parts[0])
+    for part in parts[1:]:
+        found = getattr(found, part, None)
+    return found
+
+
+def _literal_arguments(callee, call):
+    """Binds the string literals of a call to the callee's parameters.
+
+    A helper like waiter.wait_for_status is told which context key to
+    use, e.g. 'server_status', and indexes the context with a parameter.
+
+    :param callee: Function called
+    :type callee: Function
+    :param call: Call expression
+    :type call: ast.Call
+    :returns: Dict of parameter name to string
+    """
+    try:
+        params = inspect.getargspec(_unwrap(callee)).args
+    except TypeError:
+        return {}
+    bound = {}
+    for param, arg in zip(params, call.args):
+        if isinstance(arg, ast.Str):
+            bound[param] = arg.s
+    for keyword in call.keywords:
+        if isinstance(keyword.value, ast.Str):
+            bound[keyword.arg] = keyword.value.s
+    return bound
+
+
+def _parse_source(action, seen, bound=None):
+    """Reads context access out of the source of an action.
+
+    :param action: Action function
+    :type action: Function
+    :param seen: Functions already visited, to stop recursion
+    :type seen: Set
+    :param bound: String values of parameters the action indexes the
+        context with, given by its caller
+    :type bound: Dict
+    :returns: Contract|None - None when access can not be inferred
+    """
+    bound = bound or {}
+    try:
+        source = inspect.getsource(action)
+    except (IOError, TypeError):
+        return None
+    calls = _context_calls(source)
+    if calls is None:
+        return None
+    if action.__doc__:
+        # The docstring is parsed on its own.
+        source = source.replace(action.__doc__, '', 1)
+
+    contract = Contract()
+    for quote, key, assignment in _SRC_SUBSCRIPT.findall(source):
+        if not quote:
+            if key not in bound:
+                # context[some_variable] - only known at runtime
+                return None
+            key = bound[key]
+        if assignment:
+            contract.writes.add(key)
+        else:
+            contract.reads.add(key)
+
+    for method, quote, key in _SRC_METHOD.findall(source):
+        if method == 'update':
+            continue
+        if not quote:
+            if key not in bound:
+                return None
+            key = bound[key]
+        contract.reads.add(key)
+        if method != 'get':
+            contract.writes.add(key)
+
+    for body in _SRC_UPDATE_KWARG.findall(source):
+        body = body.strip()
+        if body.startswith('{'):
+            contract.writes.update(_SRC_DICT_KEY.findall(body))
+        elif _SRC_KWARG.match(body):
+            contract.writes.update(_SRC_KWARG.findall(body))
+        else:
+            return None
+
+    # Helpers that receive the context touch it too.
+    for name, call in calls:
+        if name is None:
+            return None
+        callee = _resolve(action, name)
+        if callee is None or not callable(callee):
+            return None
+        if callee in seen:
+            continue
+        seen.add(callee)
+        nested = _infer(callee, seen, _literal_arguments(callee, call))
+        if nested is None:
+            return None
+        contract.merge(nested)
+
+    contract.reads -= _IGNORED_KEYS
+    contract.writes -= _IGNORED_KEYS
+    return contract
+
+
+def _infer(action, seen, bound=None):
+    """Infers the contract of an action, without caching."""
+    action = _unwrap(action)
+    try:
+        argspec = inspect.getargspec(action)
+    except TypeError:
+        return None
+    if 'context' not in argspec.args:
+        return None
+
+    contract = _parse_source(action, seen, bound)
+    if contract is None:
+        return None
+    contract.merge(_parse_docstring(action.__doc__))
+    return contract
+
+
+def _changes_cloud(action):
+    """Check if an action creates or changes resources.
+
+    :param action: Action function
+    :type action: Function
+    :returns: Boolean
+    """
+    return _unwrap(action).__name__ not in _READ_ONLY_ACTIONS
+
+
+def _mutates_resources(action):
+    """Check if an action changes the resources named by the keys it uses.
+
+    :param action: Action function
+    :type action: Function
+    :returns: Boolean
+    """
+    name = _unwrap(action).__name__
+    return not (name in _READ_ONLY_ACTIONS or
+                name.startswith(_CREATE_PREFIXES))
+
+
+def contract(action):
+    """Get the context contract of an action.
+
+    Results are cached per action.
+
+    :param action: Action function
+    :type action: Function
+    :returns: Contract|None - None when the contract can not be inferred
+    """
+    with _contracts_lock:
+        if action in _contracts:
+            return _contracts[action]
+    inferred = _infer(action, set([action]))
+    if inferred is not None and _mutates_resources(action):
+        inferred.writes |= inferred.reads
+    if inferred is None:
+        logger.debug(
+            "Unable to infer context contract of {}; running it serially."
+            .format(getattr(action, '__name__', action))
+        )
+    with _contracts_lock:
+        _contracts[action] = inferred
+    return inferred
+
+
+def _lineage(keys, parents):
+    """Expands keys with the keys of the resources they were made from.
+
+    :param keys: Context keys
+    :type keys: Set
+    :param parents: Map of key to the keys read by the link that set it
+    :type parents: Dict
+    :returns: Set
+    """
+    expanded = set()
+    todo = list(keys)
+    while todo:
+        key = todo.pop()
+        if key in expanded:
+            continue
+        expanded.add(key)
+        todo.extend(parents.get(key, []))
+    return expanded
+
+
+def dependencies(actions):
+    """Builds the dependency graph for a list of actions.
+
+    A resource set by a link is made from the keys that link read, e.g. a
+    server from context['network_id']. Using the server therefore counts as
+    using the network too, so the network is not deleted underneath it.
+
+    Links that change the cloud also wait for every earlier one that does.
+
+    :param actions: Actions in scenario order
+    :type actions: List
+    :returns: List of sets - indexes each action must wait for
+    """
+    parents = {}
+    contracts = []
+    for action in actions:
+        declared = contract(action)
+        if declared is None:
+            contracts.append(None)
+            continue
+        reads = _lineage(declared.reads, parents)
+        for key in declared.writes:
+            parents.setdefault(key, set()).update(reads - set([key]))
+        contracts.append(Contract(reads, declared.writes))
+
+    changes = [_changes_cloud(action) for action in actions]
+    deps = []
+    for j, later in enumerate(contracts):
+        waits = set()
+        for i in range(j):
+            earlier = contracts[i]
+            if earlier is None or later is None or earlier.conflicts(later):
+                waits.add(i)
+            elif changes[i] and changes[j]:
+                waits.add(i)
+        deps.append(waits)
+    return deps
+
+
+def run(links, context, run_link, workers):
+    """Runs scenario links concurrently honoring their dependencies.
+
+    A link only starts after every link it depends on has finished. Once
+    a link raises, no new links are started; links already running are
+    allowed to finish and the exception of the earliest failing link is
+    re-raised.
+
+    :param links: Scenario links
+    :type links: List
+    :param context: Scenario context
+    :type context: Dict
+    :param run_link: Callable that runs a single link against the context
+    :type run_link: Function
+    :param workers: Maximum number of links to run at the same time
+    :type workers: Integer
+    """
+    deps = dependencies([link[0] for link in links])
+    pending = set(range(len(links)))
+    done = set()
+    running = set()
+    failures = {}
+    results = Queue()
+    pool = ThreadPool(processes=workers)
+
+    def execute(index):
+        try:
+            run_link(links[index], context)
+            results.put((index, None))
+        except Exception:
+            results.put((index, sys.exc_info()))
+
+    try:
+        while pending or running:
+            if not failures:
+                ready = sorted(i for i in pending if deps[i] <= done)
+                for index in ready:
+                    pending.discard(index)
+                    running.add(index)
+                    pool.apply_async(execute, (index,))
+            if not running:
+                break
+            index, exc_info = results.get()
+            running.discard(index)
+            if exc_info is not None:
+                failures[index] = exc_info
+            else:
+                done.add(index)
+    finally:
+        pool.close()
+        pool.join()
+
+    if failures:
+        six.reraise(*failures[min(failures)])
@@ -0,0 +1,200 @@
+"""Resumable, verified glance image downloads.
+
+An image is read into one preallocated buffer per download, hashed as it
+arrives and written to a file in a directory or to a null sink that only
+counts. When the connection breaks, the download resumes from the last byte
+received with a Range request, up to ROLETESTER_DOWNLOAD_RETRIES times
+(default 3). A .part file left behind by an earlier run is resumed the same
+way. The md5 is compared with the checksum glance reports once the image is
+complete.
+
+download_many() runs several downloads at once, at most
+ROLETESTER_DOWNLOAD_WORKERS (default 4), to measure the download
+throughput of a role.
+"""
+import hashlib
+import os
+import time
+
+from multiprocessing.pool import ThreadPool
+from requests import exceptions as requests_exceptions
+from requests.packages.urllib3 import exceptions as urllib3_exceptions
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.downloads')
+
+BUFFER_SIZE = 4 * 1024 * 1024
+
+_RETRIES = int(os.getenv('ROLETESTER_DOWNLOAD_RETRIES', 3))
+_DEFAULT_WORKERS = int(os.getenv('ROLETESTER_DOWNLOAD_WORKERS', 4))
+
+# Errors after which a download is resumed.
+_INTERRUPTED = (IOError,
+                requests_exceptions.RequestException,
+                urllib3_exceptions.HTTPError)
+
+
+class NullSink(object):
+    """File-like sink that discards what is written to it."""
+
+    def write(self, data):
+        pass
+
+    def truncate(self, size=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class Interrupted(IOError):
+    """The image ended before its size was reached."""
+
+
+def _open_sink(directory, image_id):
+    """Open where an image goes.
+
+    :returns: (sink, partial path or None, offset of data already there)
+    """
+    if directory is None:
+        return NullSink(), None, 0
+    partial = os.path.join(directory, '{}.part'.format(image_id))
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    return open(partial, 'ab'), partial, offset
+
+
+def _hash_file(path, md5, buf):
+    """Hash an existing file into md5 using buf."""
+    with open(path, 'rb') as f:
+        while True:
+            read = f.readinto(buf)
+            if not read:
+                break
+            md5.update(memoryview(buf)[:read])
+
+
+def download(clients, image_id, directory=None, buffer_size=BUFFER_SIZE,
+             retries=_RETRIES):
+    """Download an image, verifying it on the fly.
+
+    :param clients: Client manager
+    :type clients: roletester.clients.ClientManager
+    :param image_id: Image id
+    :type image_id: String
+    :param directory: Directory to save the image in, as <image_id>. The
+        image is only counted when None.
+    :type directory: String
+    :param buffer_size: Bytes read at a time into the preallocated buffer
+    :type buffer_size: Integer
+    :param retries: Times a broken download is resumed
+    :type retries: Integer
+    :returns: Dict with bytes, seconds, bytes_per_second, md5 and resumes
+    """
+    glance = clients.get_glance()
+    image = glance.images.get(image_id)
+    expected_size = getattr(image, 'size', None)
+    expected_md5 = getattr(image, 'checksum', None)
+
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    md5 = hashlib.md5()
+    sink, partial, offset = _open_sink(directory, image_id)
+    if offset:
+        _hash_file(partial, md5, buf)
+        logger.debug("Resuming {} from {} bytes on disk."
+                     .format(image_id, offset))
+    start = time.time()
+    received = 0
+    resumes = 0
+    try:
+        while True:
+            headers = {}
+            if offset:
+                headers['Range'] = 'bytes={}-'.format(offset)
+            resp = None
+            try:
+                resp, _ = glance.http_client.get(
+                    '/v2/images/{}/file'.format(image_id), headers=headers)
+                if offset and resp.status_code != 206:
+                    # The range was ignored, start over.
+                    logger.debug("Range not honoured for {}, restarting."
+                                 .format(image_id))
+                    md5 = hashlib.md5()
+                    sink.truncate(0)
+                    offset = 0
+                while True:
+                    read = resp.raw.readinto(buf)
+                    if not read:
+                        break
+                    chunk = view[:read]
+                    sink.write(chunk)
+                    md5.update(chunk)
+                    offset += read
+                    received += read
+                if expected_size and offset < expected_size:
+                    raise Interrupted("{} ended at {} of {} bytes".format(
+                        image_id, offset, expected_size))
+                break
+            except _INTERRUPTED as e:
+                if resp is not None:
+                    resp.close()
+                if resumes >= retries:
+                    raise
+                resumes += 1
+                logger.debug("Download of {} interrupted at {} bytes ({}),"
+                             " resuming.".format(image_id, offset, e))
+    finally:
+        sink.close()
+
+    checksum = md5.hexdigest()
+    if expected_md5 and checksum != expected_md5:
+        if partial is not None:
+            os.remove(partial)
+        raise ValueError("Image {} has checksum {} but {} was downloaded"
+                         .format(image_id, expected_md5, checksum))
+    if partial is not None:
+        os.rename(partial, os.path.join(directory, image_id))
+    seconds = time.time() - start
+    return {'bytes': received,
+            'seconds': seconds,
+            'bytes_per_second': received / seconds if seconds else 0.0,
+            'md5': checksum,
+            'resumes': resumes}
+
+
+def download_many(clients, image_ids, directory=None, workers=None,
+                  buffer_size=BUFFER_SIZE):
+    """Download images concurrently.
+
+    :param clients: Client manager
+    :type clients: roletester.clients.ClientManager
+    :param image_ids: Image ids
+    :type image_ids: List
+    :param directory: Directory to save the images in, None to count only
+    :type directory: String
+    :param workers: Maximum number of downloads to run at once
+    :type workers: Integer
+    :param buffer_size: Bytes read at a time per download
+    :type buffer_size: Integer
+    :returns: Dict with bytes, seconds, bytes_per_second and the result of
+        each image under images
+    """
+    image_ids = list(image_ids)
+    workers = max(1, min(workers or _DEFAULT_WORKERS, len(image_ids) or 1))
+    start = time.time()
+    pool = ThreadPool(processes=workers)
+    try:
+        results = pool.map(
+            lambda image_id: download(clients, image_id, directory,
+                                      buffer_size),
+            image_ids
+        )
+    finally:
+        pool.close()
+        pool.join()
+    seconds = time.time() - start
+    received = sum(result['bytes'] for result in results)
+    return {'bytes': received,
+            'seconds': seconds,
+            'bytes_per_second': received / seconds if seconds else 0.0,
+            'images': dict(zip(image_ids, results))}
@@ -1,19 +1,37 @@
-from cinderclient.exceptions import NotFound as CinderNotFound
-from cinderclient.exceptions import Forbidden as CinderForbidden
-from glanceclient.exc import HTTPNotFound as GlanceNotFound
-from glanceclient.exc import Unauthorized as GlanceUnauthorized
-from glanceclient.exc import HTTPForbidden as GlanceForbidden
-from keystoneauth1.exceptions.http import Unauthorized as KeystoneUnauthorized
-from keystoneauth1.exceptions.http import Forbidden as KeystoneForbidden
-from keystoneauth1.exceptions.http import NotFound as KeystoneNotFound
-from neutronclient.common.exceptions import NotFound as NeutronNotFound
-from novaclient.exceptions import NotFound as NovaNotFound
-from novaclient.exceptions import Forbidden as NovaForbidden
-from swiftclient.client import ClientException as SwiftClientException
-from neutronclient.common.exceptions import Forbidden as NeutronForbidden
-from swift_exceptions import SwiftNotAuthorized as SwiftNotAuthorized
-from swift_exceptions import SwiftNotFoundException as SwiftNotFoundException
-from swift_exceptions import SwiftForbidden as SwiftForbidden
+"""Exception aliases for every service client.
+
+The aliases resolve lazily: importing this module imports no client
+library, and using an alias imports only the library it comes from. Code
+that should not pull in every client library at import time should use
+`from roletester import exc` and refer to `exc.NovaNotFound` where it is
+needed.
+"""
+import importlib
+import sys
+import types
+
+# Alias name to (module, attribute) it resolves to.
+_ALIASES = {
+    'CinderNotFound': ('cinderclient.exceptions', 'NotFound'),
+    'CinderForbidden': ('cinderclient.exceptions', 'Forbidden'),
+    'GlanceNotFound': ('glanceclient.exc', 'HTTPNotFound'),
+    'GlanceUnauthorized': ('glanceclient.exc', 'Unauthorized'),
+    'GlanceForbidden': ('glanceclient.exc', 'HTTPForbidden'),
+    'KeystoneUnauthorized': ('keystoneauth1.exceptions.http',
+                             'Unauthorized'),
+    'KeystoneForbidden': ('keystoneauth1.exceptions.http', 'Forbidden'),
+    'KeystoneNotFound': ('keystoneauth1.exceptions.http', 'NotFound'),
+    'NeutronNotFound': ('neutronclient.common.exceptions', 'NotFound'),
+    'NeutronForbidden': ('neutronclient.common.exceptions', 'Forbidden'),
+    'NovaNotFound': ('novaclient.exceptions', 'NotFound'),
+    'NovaForbidden': ('novaclient.exceptions', 'Forbidden'),
+    'SwiftClientException': ('swiftclient.client', 'ClientException'),
+    'SwiftNotAuthorized': ('roletester.swift_exceptions',
+                           'SwiftNotAuthorized'),
+    'SwiftNotFoundException': ('roletester.swift_exceptions',
+                               'SwiftNotFoundException'),
+    'SwiftForbidden': ('roletester.swift_exceptions', 'SwiftForbidden')
+}
 
 __all__ = [
     'CinderNotFound',
@@ -25,10 +43,37 @@ __all__ = [
     'NeutronNotFound',
     'KeystoneNotFound',
     'KeystoneUnauthorized',
-    'KeystoneForbidden'
+    'KeystoneForbidden',
     'NovaNotFound',
+    'NovaForbidden',
     'SwiftClientException',
     'SwiftNotAuthorized',
     'SwiftNotFoundException',
     'SwiftForbidden'
 ]
+
+
+class _LazyModule(types.ModuleType):
+    """Module that imports its aliases the first time they are used."""
+
+    def __getattr__(self, name):
+        if name not in _ALIASES:
+            raise AttributeError(
+                "module {} has no attribute {}".format(self.__name__, name)
+            )
+        module, attribute = _ALIASES[name]
+        value = getattr(importlib.import_module(module), attribute)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_ALIASES))
+
+
+_module = _LazyModule(__name__, __doc__)
+_module.__dict__.update(
+    (k, v) for k, v in globals().items() if k.startswith('__')
+)
+_module._ALIASES = _ALIASES
+_module._original = sys.modules[__name__]
+sys.modules[__name__] = _module
@@ -1,12 +1,19 @@
-from log import logging
+"""Garbage collection of the resources scenarios leave on their stacks.
+
+Deletions run concurrently, up to ROLETESTER_GC_WORKERS (default 8) at
+once, and are ordered by resource type rather than by resource: stack
+entries only record the id of what was made, not what it was made from.
+A subnet therefore waits for every server and port being collected, not
+just the ones on it, and one slow server delete holds back the subnets,
+ports and networks of the whole collection.
+"""
+import os
 
-from exc import CinderNotFound
-from exc import GlanceNotFound
-from exc import KeystoneNotFound
-from exc import NeutronNotFound
-from exc import NovaNotFound
-from exc import SwiftNotFoundException
+from log import logging
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
 
+from roletester import exc
 from roletester.actions.cinder import volume_delete
 from roletester.actions.cinder import volume_detach
 from roletester.actions.cinder import volume_wait_for_status
@@ -24,12 +31,67 @@ from roletester.actions.neutron import subnet_delete
 from roletester.actions.nova import server_delete
 from roletester.actions.nova import server_wait_for_status
 from roletester.actions.swift import swift_container_delete
+from roletester.actions.swift import swift_container_empty
 from roletester.actions.swift import swift_object_delete
+from roletester.actions.swift import swift_object_delete_many
 
 from scenario import Scenario
 
 logger = logging.getLogger('roletester.garbage.Collector')
 
+_DEFAULT_WORKERS = int(os.getenv('ROLETESTER_GC_WORKERS', 8))
+
+_KEYSTONE_DEPENDS_ON = [
+    'volume_attachment_id', 'security_group_rule_id', 'object_name',
+    'object_names', 'router_subnet_mdx', 'floatingip_id', 'server_id',
+    'port_id', 'volume_id', 'subnet_id', 'router_id', 'security_group_id',
+    'network_id', 'image_id', 'container_name'
+]
+
+# Resource types that have to be gone before a type can be deleted.
+# Types that do not depend on each other are deleted at the same time.
+# Roughly: detaches and interface removals, then servers and floating ips,
+# then ports and volumes, then subnets, routers and security groups and
+# finally networks, images, containers and keystone objects.
+_DEPENDS_ON = {
+    'volume_attachment_id': [],
+    'security_group_rule_id': [],
+    'object_name': [],
+    'object_names': [],
+    'floatingip_id': [],
+    # Neutron refuses to remove an interface a floating ip is routed over.
+    'router_subnet_mdx': ['floatingip_id'],
+    'server_id': ['volume_attachment_id'],
+    'port_id': ['server_id', 'floatingip_id'],
+    'volume_id': ['volume_attachment_id', 'server_id'],
+    'subnet_id': ['server_id', 'port_id', 'floatingip_id',
+                  'router_subnet_mdx'],
+    'router_id': ['floatingip_id', 'router_subnet_mdx'],
+    'security_group_id': ['security_group_rule_id', 'server_id', 'port_id'],
+    'network_id': ['server_id', 'port_id', 'floatingip_id', 'subnet_id',
+                   'router_id'],
+    'image_id': ['server_id'],
+    'container_name': ['object_name', 'object_names'],
+    'project_obj': _KEYSTONE_DEPENDS_ON,
+    'user_obj': _KEYSTONE_DEPENDS_ON
+}
+
+
+def _identity(key, context):
+    """Identifies a resource so it is only deleted once.
+
+    Objects are only unique within their container.
+
+    :param key: Type key of the resource
+    :type key: String
+    :param context: Stack entry the resource came from
+    :type context: Dict
+    :returns: Tuple
+    """
+    if key == 'object_name':
+        return key, context.get('container_name'), context[key]
+    return key, context[key]
+
 
 class Collector(object):
 
@@ -42,11 +104,15 @@ class Collector(object):
         self._clients = clients
         self._delete_map = {
             'container_name': Scenario()
+            .chain(swift_container_empty, clients)
             .chain(swift_container_delete, clients),
 
             'floatingip_id': Scenario().chain(floatingip_delete, clients),
             'image_id': Scenario().chain(image_delete, clients),
             'object_name': Scenario().chain(swift_object_delete, clients),
+
+            'object_names': Scenario()
+            .chain(swift_object_delete_many, clients, missing_ok=True),
             'network_id': Scenario().chain(network_delete, clients),
             'port_id': Scenario().chain(port_delete, clients),
             'router_id': Scenario().chain(router_delete, clients),
@@ -84,47 +150,150 @@ class Collector(object):
             .chain(router_remove_interface, clients)
         }
 
-    def delete(self, resource_dict):
+    def _delete(self, key, context):
+        """Run the delete scenario of one resource.
+
+        Resources that are already gone are ignored and other errors are
+        logged, so one failure does not stop the collection.
+
+        :param key: Type key of the resource
+        :type key: String
+        :param context: Stack entry the resource came from
+        :type context: Dict
+        """
+        resource_id = context[key]
+        try:
+            self._delete_map[key].run(context=context)
+        except (exc.CinderNotFound,
+                exc.GlanceNotFound,
+                exc.KeystoneNotFound,
+                exc.NeutronNotFound,
+                exc.NovaNotFound,
+                exc.SwiftNotFoundException):
+            logger.debug("{}:{} Was not found.".format(key, resource_id))
+        except Exception:
+            logger.exception(
+                "Error garbage collecting {}:{}"
+                .format(key, resource_id)
+            )
+
+    def _pending(self, resource_dicts):
+        """Split stack entries into one deletion per resource.
+
+        Objects are grouped into one deletion per container.
+
+        :param resource_dicts: Stack entries, most recently pushed first
+        :type resource_dicts: List of Dicts
+        :returns: List of (key, context) tuples
+        """
+        pending = []
+        seen = set()
+        objects = {}
+        for resource_dict in resource_dicts:
+            for key, resource_id in resource_dict.items():
+                if key not in self._delete_map:
+                    logger.warn(
+                        'Unable to find scenario to clean {}:{}'
+                        .format(key, resource_id)
+                    )
+                    continue
+                identity = _identity(key, resource_dict)
+                if identity in seen:
+                    continue
+                seen.add(identity)
+                if key == 'object_name':
+                    # Objects are deleted together, per container.
+                    container = resource_dict.get('container_name')
+                    objects.setdefault(container, []).append(resource_id)
+                    continue
+                # Every deletion gets its own copy, they may run at once.
+                pending.append((key, dict(resource_dict)))
+        for container, names in objects.items():
+            pending.append(('object_names', {'container_name': container,
+                                             'object_names': names}))
+        return pending
+
+    def delete(self, resource_dict, workers=1):
         """Clean up a specific resource item.
 
         :param resource_dict: Dict containing the type_id and value
         :type resource_dict: Dict
+        :param workers: Maximum number of deletions to run at once
+        :type workers: Integer
+        """
+        self._run(self._pending([resource_dict]), workers)
+
+    def _run(self, pending, workers):
+        """Delete resources in dependency order.
+
+        A resource is deleted as soon as no resource of a type it depends on
+        is left, with up to workers deletions running at the same time.
+
+        :param pending: Deletions as (key, context) tuples
+        :type pending: List
+        :param workers: Maximum number of deletions to run at once
+        :type workers: Integer
         """
-        for key, resource_id in resource_dict.items():
-            scenario = self._delete_map.get(key)
-            if not scenario:
-                logger.warn(
-                    'Unable to find scenario to clean {}:{}'
-                    .format(key, resource_id)
-                )
-                continue
+        if not pending:
+            return
+        remaining = {}
+        for key, _ in pending:
+            remaining[key] = remaining.get(key, 0) + 1
+
+        results = Queue()
+        pool = ThreadPool(processes=max(1, min(workers, len(pending))))
+
+        def execute(key, context):
             try:
-                scenario.run(context=resource_dict)
-            except (CinderNotFound,
-                    GlanceNotFound,
-                    KeystoneNotFound,
-                    NeutronNotFound,
-                    NovaNotFound,
-                    SwiftNotFoundException):
-                logger.debug("{}:{} Was not found.".format(key, resource_id))
-                pass
-            except Exception:
-                logger.exception(
-                    "Error garbage collecting {}:{}"
-                    .format(key, resource_id)
-                )
-
-    def collect(self, contexts):
+                self._delete(key, context)
+            finally:
+                results.put(key)
+
+        running = 0
+        try:
+            while pending or running:
+                ready = [
+                    item for item in pending
+                    if not any(remaining.get(dep) for dep in
+                               _DEPENDS_ON.get(item[0], []))
+                ]
+                for item in ready:
+                    pending.remove(item)
+                    running += 1
+                    pool.apply_async(execute, item)
+                if not running:
+                    # Only possible if the dependency map has a cycle.
+                    logger.warn("Unable to order deletion of {}".format(
+                        [key for key, _ in pending]))
+                    break
+                key = results.get()
+                running -= 1
+                remaining[key] -= 1
+        finally:
+            pool.close()
+            pool.join()
+
+    def collect(self, contexts, workers=None):
         """Clean up any remaining resources.
 
+        Resources left on the stacks of every context are deleted together,
+        tier by tier, in dependency order.
+
         :param contexts: List of scenario contexts.
         :type contexts: List of Dicts
+        :param workers: Maximum number of deletions to run at once.
+            Defaults to $ROLETESTER_GC_WORKERS or 8.
+        :type workers: Integer
         """
         logger.debug("Beginning resource garbage collection.")
         if not isinstance(contexts, list):
             contexts = [contexts]
 
+        resource_dicts = []
         for context in contexts:
             stack = context.get('stack', [])
             while stack:
-                self.delete(stack.pop())
+                resource_dicts.append(stack.pop())
+
+        workers = workers or _DEFAULT_WORKERS
+        self._run(self._pending(resource_dicts), workers)
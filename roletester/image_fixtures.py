@@ -0,0 +1,203 @@
+"""Shared glance images for tests that only need an image to exist.
+
+Fixtures are keyed by image name, visibility and the md5 of the local image
+file. The first request for a fixture looks for an active image with that
+name and visibility in one filtered listing and uploads the file only when
+none has the right checksum, so an image is uploaded at most once per run.
+Later requests reuse the image id, checking with a single GET that the image
+is still active once its last check is ROLETESTER_IMAGE_FIXTURE_TTL seconds
+(default 60) old.
+
+When ROLETESTER_IMAGE_FIXTURES names a file, fixture ids are kept there for
+later runs too.
+
+Fixture images are not put on a context stack, so the garbage collector
+leaves them alone.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from roletester import exc
+from roletester import streaming
+from roletester.actions.glance import image_create
+from roletester.actions.glance import image_wait_for_status
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.image_fixtures')
+
+_TTL = float(os.getenv('ROLETESTER_IMAGE_FIXTURE_TTL', 60))
+
+_registry = None
+_registry_lock = threading.Lock()
+
+# md5 of local image files by (path, size, mtime).
+_checksums = {}
+
+
+def file_checksum(path):
+    """Get the md5 of a file, hashed once per path, size and mtime.
+
+    :param path: File path
+    :type path: String
+    :returns: String hex digest
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    with _registry_lock:
+        if key in _checksums:
+            return _checksums[key]
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(streaming.CHUNK_SIZE), ''):
+            md5.update(chunk)
+    with _registry_lock:
+        _checksums[key] = md5.hexdigest()
+    return _checksums[key]
+
+
+class ImageFixtures(object):
+
+    def __init__(self, path=None, ttl=_TTL):
+        """Init the registry.
+
+        :param path: File to keep fixture ids in. Memory only when None.
+        :type path: String
+        :param ttl: Seconds a checked fixture is trusted without a GET
+        :type ttl: Float
+        """
+        self.path = path
+        self.ttl = ttl
+        self._ids = self._read()
+        self._checked = {}
+        self._lock = threading.Lock()
+        self.uploads = 0
+
+    def _read(self):
+        """Read fixture ids from disk.
+
+        :returns: Dict of key to image id
+        """
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            logger.warn("Ignoring unreadable image fixtures {}"
+                        .format(self.path))
+            return {}
+
+    def _write(self):
+        """Write fixture ids to disk. Called with the lock held."""
+        if not self.path:
+            return
+        tmp = '{}.{}'.format(self.path, os.getpid())
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self._ids, f)
+            os.rename(tmp, self.path)
+        except (IOError, OSError):
+            logger.exception("Unable to write image fixtures {}"
+                             .format(self.path))
+
+    def _usable(self, glance, image_id, checksum):
+        """Check that an image is still active and holds the file.
+
+        :returns: Boolean
+        """
+        try:
+            image = glance.images.get(image_id)
+        except exc.GlanceNotFound:
+            return False
+        return (image.status == 'active' and
+                getattr(image, 'checksum', None) == checksum)
+
+    def _find(self, glance, name, visibility, checksum):
+        """Find a matching image with one filtered listing.
+
+        :returns: String image id or None
+        """
+        filters = {'name': name, 'visibility': visibility,
+                   'status': 'active'}
+        for image in glance.images.list(filters=filters):
+            if getattr(image, 'checksum', None) == checksum:
+                return image.id
+        return None
+
+    def get(self, clients, image_file, name="glance test image",
+            visibility='public', disk_format='qcow2',
+            container_format='bare'):
+        """Get the id of an active image of a file, uploading it if needed.
+
+        :param clients: Client manager allowed to create the image
+        :type clients: roletester.clients.ClientManager
+        :param image_file: File path of the image
+        :type image_file: String
+        :param name: Image name
+        :type name: String
+        :param visibility: Image visibility. public | private
+        :type visibility: String
+        :param disk_format: Glance disk file format
+        :type disk_format: String
+        :param container_format: Image container format
+        :type container_format: String
+        :returns: String image id
+        """
+        checksum = file_checksum(image_file)
+        key = '|'.join([name, visibility, checksum])
+        glance = clients.get_glance()
+        # One lookup or upload at a time, so concurrent tests share one.
+        with self._lock:
+            image_id = self._ids.get(key)
+            if image_id is not None:
+                if time.time() - self._checked.get(key, 0) < self.ttl:
+                    return image_id
+                if not self._usable(glance, image_id, checksum):
+                    logger.info("Image fixture {} is gone.".format(image_id))
+                    image_id = None
+            if image_id is None:
+                image_id = self._find(glance, name, visibility, checksum)
+            if image_id is None:
+                logger.info("Uploading image fixture {}.".format(name))
+                context = {}
+                image_create(clients, context, image_file,
+                             visibility=visibility, name=name,
+                             disk_format=disk_format,
+                             container_format=container_format)
+                image_wait_for_status(clients, context)
+                image_id = context['image_id']
+                self.uploads += 1
+            self._checked[key] = time.time()
+            if self._ids.get(key) != image_id:
+                self._ids[key] = image_id
+                self._write()
+            return image_id
+
+
+def get_registry():
+    """Get the process-wide image fixture registry.
+
+    :returns: ImageFixtures
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ImageFixtures(os.getenv('ROLETESTER_IMAGE_FIXTURES'))
+        return _registry
+
+
+def get_image(clients, image_file, **kwargs):
+    """Get the id of a shared image of a file.
+
+    See ImageFixtures.get().
+
+    :param clients: Client manager allowed to create the image
+    :type clients: roletester.clients.ClientManager
+    :param image_file: File path of the image
+    :type image_file: String
+    :returns: String image id
+    """
+    return get_registry().get(clients, image_file, **kwargs)
@@ -1,13 +1,89 @@
 import os
+import threading
 import types
 import binascii
+from multiprocessing.pool import ThreadPool
 from Crypto.Cipher import AES
 from Crypto import Random
 from Crypto.Random import random
-from clients import ClientManager
+from clients import get_client_manager
+from clients import release_client_manager
 from string import ascii_letters, digits
 from roletester.throttle_decorator import throttled
+from roletester import cache
+from roletester import user_pool
+from roletester.log import logging
 
+logger = logging.getLogger('roletester.keystone_manager')
+
+
+class KeystoneIndex(object):
+    """
+    Name to resource index for one keystone resource type.
+
+    Filled by a single list() call the first time it is used and kept
+    up to date as resources are created and deleted through it.
+    """
+
+    def __init__(self, get_resources):
+        """
+        :param get_resources: Returns the keystone manager for the type,
+            like keystone.projects
+        :type get_resources: function
+        """
+        self._get_resources = get_resources
+        self._by_name = None
+        self._lock = threading.RLock()
+
+    def _load(self):
+        """
+        Lists the resources once. The first resource with a name wins,
+        like the linear scans this replaces.
+        """
+        if self._by_name is None:
+            by_name = {}
+            for resource in self._get_resources().list():
+                by_name.setdefault(resource.name, resource)
+            self._by_name = by_name
+
+    def get(self, name):
+        """
+        :param name: Resource name
+        :type name: string
+        :returns: keystoneclient.base.Resource or None
+        """
+        with self._lock:
+            self._load()
+            return self._by_name.get(name)
+
+    def add(self, resource):
+        """
+        Records a resource that was just created.
+
+        :type resource: keystoneclient.base.Resource
+        """
+        with self._lock:
+            self._load()
+            self._by_name[resource.name] = resource
+
+    def remove(self, name):
+        """
+        Forgets a resource that was just deleted.
+
+        :param name: Resource name
+        :type name: string
+        """
+        with self._lock:
+            if self._by_name is not None:
+                self._by_name.pop(name, None)
+
+    def refresh(self):
+        """
+        Lists the resources again, dropping anything known so far.
+        """
+        with self._lock:
+            self._by_name = None
+            self._load()
 
 
 class KeystoneManager(object):
@@ -20,7 +96,7 @@ class KeystoneManager(object):
     role) and return back a fresh user.
     """
 
-    def __init__(self):
+    def __init__(self, pool_path=None):
         """
         This is what holds the decryption keys for the hashes.
         It's really important that this doesn't change during
@@ -30,6 +106,9 @@ class KeystoneManager(object):
         :type key: 16 character length string.
         :param iv: The initialization vector for reversing a hash.
         :type iv: binary number in bytes
+        :param pool_path: SQLite file of a persistent user pool. Defaults
+            to $ROLETESTER_USER_POOL; no pool is used when neither is set.
+        :type pool_path: string
         """
         self.__crypto_info = {
             'key': "Sixteen byte key",
@@ -60,7 +139,7 @@ class KeystoneManager(object):
             for (k,v) in env_vars_default.items()
         }
 
-        self.admin_client_manager = ClientManager(**self.env_vars)
+        self.admin_client_manager = get_client_manager(**self.env_vars)
 
         """
         Used a few places to get keystone objects by string
@@ -68,17 +147,74 @@ class KeystoneManager(object):
         self.ks_attr = lambda t: getattr(
             self.admin_client_manager.get_keystone(), "%ss" % t)
 
+        """
+        Name to resource indexes, one per keystone resource type.
+        """
+        self.__indexes = {}
+        self.__indexes_lock = threading.Lock()
+
+        """
+        Users leased from the persistent pool go back to it on teardown
+        instead of being deleted.
+        """
+        self.__leased = set()
+        self.pool = None
+        pool_path = pool_path or os.getenv('ROLETESTER_USER_POOL')
+        if pool_path:
+            self.pool = user_pool.get_pool(pool_path)
+            if not self.pool.validated:
+                self.pool.validate(self.admin_client_manager.get_keystone())
+
+    def _index(self, resource_type):
+        """
+        Gets the name index for a keystone resource type.
+
+        :param resource_type: "domain" || "project" || "user" || "role"
+        :type resource_type: string
+        :returns: KeystoneIndex
+        """
+        with self.__indexes_lock:
+            if resource_type not in self.__indexes:
+                self.__indexes[resource_type] = KeystoneIndex(
+                    lambda: self.ks_attr(resource_type))
+            return self.__indexes[resource_type]
+
+    def refresh_index(self, resource_type=None):
+        """
+        Reloads the name indexes from keystone.
+
+        Use when resources were changed outside of this manager.
+
+        :param resource_type: Type to reload. All loaded types if None.
+        :type resource_type: string
+        """
+        if resource_type is not None:
+            self._index(resource_type).refresh()
+            return
+        with self.__indexes_lock:
+            indexes = self.__indexes.values()
+        for index in indexes:
+            index.refresh()
+
     def teardown(self):
         """
         Need to ensure all users created during this are destroyed.
         """
+        users = self._index('user')
         for u in self.__users.values():
             ks = self.admin_client_manager.get_keystone()
             username = u.auth_kwargs['username']
-            usr_test = [x for x in ks.users.list() if x.name==username]
-            if usr_test != []:
-                usr = usr_test[0]
+            if username in self.__leased:
+                self.pool.release(username)
+                release_client_manager(u)
+                continue
+            usr = users.get(username)
+            if usr is not None:
                 ks.users.delete(usr)
+                users.remove(username)
+            release_client_manager(u, close=True)
+        self.__users.clear()
+        release_client_manager(self.admin_client_manager)
 
     def get_random_string(self, length):
         """
@@ -106,7 +242,6 @@ class KeystoneManager(object):
             iv = self.__crypto_info['iv']
         return (AES.new(key, AES.MODE_CFB, iv), iv)
 
-    @throttled
     def find_user_credentials(self,
         domain='default',
         project='default',
@@ -115,6 +250,8 @@ class KeystoneManager(object):
         """
         Finds a user that matches your auth needs, creating one if necessary.
 
+        Only creating a user is throttled, cached users come back at once.
+
         :param domain: Keystone domain. Defaults to project's value.
         :type domain: string
         :param project: Keystone project. Default to `Default`
@@ -127,47 +264,154 @@ class KeystoneManager(object):
 
         if domain == '' or domain == None:
             domain = project
-        hash = self._encode_hash(domain, project, role)
+        hash = self._encode_hash(domain, project, role, inherited)
         if hash in self.__users.keys():
             return self.__users[hash]
         else:
-            domain_resource = self._ensure_keystone_resource(
-                "domain",
-                domain)
-            project_resource = self._ensure_keystone_resource(
-                "project",
-                project,
-                domain)
-            user_resource = self._ensure_keystone_resource(
-                "user",
-                "test-user-%s" % self.get_random_string(6),
-                domain,
-                project)
-            role_resource = self._ensure_keystone_resource(
-                "role",
-                role)
-            role_requirement_resources = self.create_role_assignments(
-                role_resource,
-                user_resource,
-                domain_resource,
-                project_resource,
-                inherited
-            )
+            self.__users[hash] = self._obtain_user_credentials(
+                domain, project, role, inherited)
+            return self.__users[hash]
+
+    def find_users_credentials(self, assignments, workers=8):
+        """
+        Finds users for many role assignments at once.
+
+        Shared domains, projects and roles are ensured once, then the
+        missing users and their grants are created concurrently. Call it
+        from setUpClass with every assignment a test class needs so that
+        find_user_credentials only hits the cache afterwards.
+
+        :param assignments: (domain, project, role[, inherited]) tuples
+        :type assignments: [tuple]
+        :param workers: Maximum keystone requests in flight
+        :type workers: int
+        :returns: {tuple: clients.ClientManager} keyed like assignments
+        """
+        wanted = []
+        for assignment in assignments:
+            domain, project, role = assignment[:3]
+            inherited = assignment[3] if len(assignment) > 3 else True
+            if domain == '' or domain == None:
+                domain = project
+            if (domain, project, role, inherited) not in wanted:
+                wanted.append((domain, project, role, inherited))
+
+        missing = [k for k in wanted
+                   if self._encode_hash(*k) not in self.__users]
+
+        """
+        Projects are indexed by name alone, so a name used in several
+        domains is one project, created in the domain of its first
+        assignment just like one find_user_credentials call at a time.
+        """
+        projects = {}
+        for domain, project, _, _ in missing:
+            projects.setdefault(project, domain)
+
+        pool = ThreadPool(processes=max(1, min(workers, len(missing))))
+        try:
             """
-            Finally build or fetch the user's client manager.
+            Parents first, each distinct name once, so concurrent user
+            creation never races to create the same domain, project or
+            role.
             """
-            user_kwargs = {
-                'username': user_resource.name,
-                'password': user_resource.password,
-                'project_name': project_resource.name,
-                'auth_url': self.env_vars['auth_url'],
-                'user_domain_name': domain_resource.name,
-                'project_domain_name': domain_resource.name,
-		        'domain_id': domain_resource.id
-            }
-            print user_kwargs
-            self.__users[hash] = ClientManager(**user_kwargs)
-            return self.__users[hash]
+            pool.map(lambda d: self._ensure_keystone_resource("domain", d),
+                     set(k[0] for k in missing))
+            pool.map(lambda pd: self._ensure_keystone_resource(
+                         "project", pd[0], pd[1]),
+                     projects.items())
+            pool.map(lambda r: self._ensure_keystone_resource("role", r),
+                     set(k[2] for k in missing))
+
+            def provision(key):
+                self.__users[self._encode_hash(*key)] = \
+                    self._obtain_user_credentials(*key)
+            pool.map(provision, missing)
+        finally:
+            pool.close()
+            pool.join()
+
+        result = {}
+        for assignment in assignments:
+            result[assignment] = self.find_user_credentials(*assignment)
+        return result
+
+    def _obtain_user_credentials(self, domain, project, role, inherited):
+        """
+        Leases a pooled user for a role assignment or creates a new one.
+
+        Users created while a pool is configured are added to it.
+
+        :returns: clients.ClientManager
+        """
+        if self.pool is None:
+            return self._create_user_credentials(
+                domain, project, role, inherited)
+
+        key = user_pool.assignment_key(domain, project, role, inherited)
+        user_kwargs = self.pool.lease(key)
+        if user_kwargs is None:
+            clients = self._create_user_credentials(
+                domain, project, role, inherited)
+            user_kwargs = clients.auth_kwargs
+            user = self._index('user').get(user_kwargs['username'])
+            self.pool.add(key, user.id, user_kwargs)
+        else:
+            clients = get_client_manager(**user_kwargs)
+        self.__leased.add(user_kwargs['username'])
+        return clients
+
+    @throttled(bucket='keystone')
+    def _create_user_credentials(self, domain, project, role, inherited):
+        """
+        Creates a user for a role assignment along with anything it needs.
+
+        :param domain: Keystone domain
+        :type domain: string
+        :param project: Keystone project
+        :type project: string
+        :param role: Keystone role
+        :type role: string
+        :type inherited: bool
+        :returns: clients.ClientManager
+        """
+        domain_resource = self._ensure_keystone_resource(
+            "domain",
+            domain)
+        project_resource = self._ensure_keystone_resource(
+            "project",
+            project,
+            domain)
+        user_resource = self._ensure_keystone_resource(
+            "user",
+            "test-user-%s" % self.get_random_string(6),
+            domain,
+            project)
+        role_resource = self._ensure_keystone_resource(
+            "role",
+            role)
+        role_requirement_resources = self.create_role_assignments(
+            role_resource,
+            user_resource,
+            domain_resource,
+            project_resource,
+            inherited
+        )
+        """
+        Finally build or fetch the user's client manager.
+        """
+        user_kwargs = {
+            'username': user_resource.name,
+            'password': user_resource.password,
+            'project_name': project_resource.name,
+            'auth_url': self.env_vars['auth_url'],
+            'user_domain_name': domain_resource.name,
+            'project_domain_name': domain_resource.name,
+            'domain_id': domain_resource.id
+        }
+        logger.debug("User credentials: {}".format(dict(
+            (k, v) for k, v in user_kwargs.items() if k != 'password')))
+        return get_client_manager(**user_kwargs)
 
     def create_role_assignments(self,
         role=None,
@@ -233,14 +477,7 @@ class KeystoneManager(object):
         """
         if name == None: # None specified by user
             return None
-        ks = self.admin_client_manager.get_keystone()
-        collection = [x
-            for x in self.ks_attr(resource_type).list()
-            if x.name == name]
-        if collection == []:
-            return None
-        else:
-            return collection[0]
+        return self._index(resource_type).get(name)
 
 
     def _encode_hash(self, *args):
@@ -282,8 +519,9 @@ class KeystoneManager(object):
         :type name: string
         :returns: boolean
         """
-        ks = self.admin_client_manager.get_keystone()
-        return name in [x.name for x in getattr(ks, keystone_type).list()]
+        if keystone_type.endswith('s'):
+            keystone_type = keystone_type[:-1]
+        return self._index(keystone_type).get(name) is not None
 
     def _ensure_keystone_resource(self,
         keystone_resource_type,
@@ -298,59 +536,44 @@ class KeystoneManager(object):
         :returns: keystoneclient.v3.domains.Domain
         """
 
-        ks = self.admin_client_manager.get_keystone() # used like, everywhere
-
         # clarity
         resources = self.ks_attr(keystone_resource_type)
+        index = self._index(keystone_resource_type)
 
-        """
-        check whether a keystone object exists in its list by name.
-        :returns: boolean
-        """
-        entity_exists = lambda name: name in [x.name for x in resources.list()]
+        existing = index.get(name)
+        if existing is not None:
+            return existing
 
         """
         these become the *args that are sent to create() methods in keystone.
         """
-        all_args = {
-            "role": [name],
-            "domain": [name],
-            "project": [
-                name,
-                self.get_resource_by_name(domain_name, 'domain')],
-            "user": [
+        if keystone_resource_type == "project":
+            my_args = [name, self.get_resource_by_name(domain_name, 'domain')]
+        elif keystone_resource_type == "user":
+            my_args = [
                 name,
                 self.get_resource_by_name(domain_name, 'domain'),
                 self.get_resource_by_name(project_name, 'project')
             ]
+        else:
+            my_args = [name]
 
-        }
-
-        if entity_exists(name) == False:
+        if keystone_resource_type == 'user':
             """
-            create the resource!
+            User has an extra field (password) that needs to be tagged on.
+            Conveniently, it is stored last in *args position
             """
-            my_args = all_args[keystone_resource_type]
-            if keystone_resource_type == 'user':
-                """
-                User has an extra field (password) that needs to be tagged on.
-                Conveniently, it is stored last in *args position
-                """
-                password = self.get_random_string(32)
-                my_args.append(password)
-                # Hijack the user, add password so we can slurp it on return
-                user = resources.create(*my_args)
-                user.password = password
-                return user
-            else:
-                """
-                non-user objects are all standard
-                """
-                return resources.create(*my_args)
+            password = self.get_random_string(32)
+            my_args.append(password)
+            # Hijack the user, add password so we can slurp it on return
+            resource = resources.create(*my_args)
+            resource.password = password
         else:
             """
-            load the resource
+            non-user objects are all standard
             """
-            return [resources.get(x.id)
-                for x in resources.list()
-                if x.name == name][0]
+            resource = resources.create(*my_args)
+        index.add(resource)
+        if keystone_resource_type == 'role':
+            cache.invalidate('roles')
+        return resource
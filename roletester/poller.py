@@ -0,0 +1,251 @@
+"""Shared status polling for resources being waited on.
+
+Each wait_for_status action used to GET its own resource every few
+seconds. A StatusMultiplexer collects the resources waited on for one
+service and answers all of them from a single list call per tick, filtered
+by id where the API allows it and limited to the project of the clients
+otherwise. Resources missing from the listing (other projects, just
+deleted, ...) fall back to a plain GET, so a deleted resource still raises
+the service's NotFound exception to its waiter. A multiplexer whose list
+call is forbidden only GETs from then on.
+
+Set ROLETESTER_BATCH_POLL=0 to GET every resource on its own again and
+ROLETESTER_POLL_TICK to change the minimum seconds between list calls.
+"""
+import os
+import sys
+import threading
+import time
+import weakref
+import six
+
+from roletester import exc
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.poller')
+
+ENABLED = os.getenv('ROLETESTER_BATCH_POLL', '1') != '0'
+
+# Minimum seconds between two list calls against the same service.
+_TICK = float(os.getenv('ROLETESTER_POLL_TICK', 1))
+
+_multiplexers = weakref.WeakKeyDictionary()
+_multiplexers_lock = threading.Lock()
+
+
+class _Slot(object):
+    """A single poll waiting to be served by a tick."""
+
+    __slots__ = ('event', 'status', 'exc_info')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.status = None
+        self.exc_info = None
+
+
+class StatusMultiplexer(object):
+
+    def __init__(self, name, list_statuses, get_status, tick=_TICK,
+                 forbidden=None):
+        """Init the multiplexer.
+
+        :param name: Service name, used for logging
+        :type name: String
+        :param list_statuses: Callable taking a list of ids and returning a
+            dict of id to status for the ones it could find
+        :type list_statuses: Function
+        :param get_status: Callable taking one id and returning its status
+        :type get_status: Function
+        :param tick: Minimum seconds between list calls
+        :type tick: Float
+        :param forbidden: Exception the list call raises when the clients
+            may not list. Listing stops once it is raised.
+        :type forbidden: Exception
+        """
+        self.name = name
+        self._list_statuses = list_statuses
+        self._get_status = get_status
+        self._tick = tick
+        self._forbidden = forbidden
+        self._can_list = True
+        self._waiting = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_tick = 0
+        self.list_calls = 0
+        self.get_calls = 0
+
+    def poll(self, resource_id):
+        """Get the current status of a resource.
+
+        Blocks until the next tick has fetched it.
+
+        :param resource_id: Id of the resource
+        :type resource_id: String
+        :returns: String status
+        """
+        slot = _Slot()
+        with self._lock:
+            self._waiting.setdefault(resource_id, []).append(slot)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='poller-{}'.format(self.name)
+                )
+                self._thread.daemon = True
+                self._thread.start()
+        slot.event.wait()
+        if slot.exc_info is not None:
+            six.reraise(*slot.exc_info)
+        return slot.status
+
+    def _run(self):
+        """Serve ticks until nobody is waiting."""
+        while True:
+            delay = self._last_tick + self._tick - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            with self._lock:
+                waiting, self._waiting = self._waiting, {}
+                if not waiting:
+                    self._thread = None
+                    return
+            self._last_tick = time.time()
+            self._serve(waiting)
+
+    def _serve(self, waiting):
+        """Fetch the statuses of one tick and wake their waiters.
+
+        :param waiting: Map of resource id to the slots waiting on it
+        :type waiting: Dict
+        """
+        ids = list(waiting)
+        statuses = {}
+        if len(ids) > 1 and self._can_list:
+            try:
+                self.list_calls += 1
+                statuses = self._list_statuses(ids)
+            except Exception as e:
+                if (self._forbidden is not None and
+                        isinstance(e, self._forbidden)):
+                    self._can_list = False
+                    logger.info(
+                        "Not allowed to list {} statuses; getting them one "
+                        "by one from now on.".format(self.name)
+                    )
+                else:
+                    logger.exception(
+                        "Listing {} statuses failed; getting them one by "
+                        "one.".format(self.name)
+                    )
+        logger.debug(
+            "Polled {} {} resources; {} listed.".format(
+                len(ids), self.name, len(statuses))
+        )
+
+        for resource_id, slots in waiting.items():
+            status, exc_info = None, None
+            if resource_id in statuses:
+                status = statuses[resource_id]
+            else:
+                try:
+                    self.get_calls += 1
+                    status = self._get_status(resource_id)
+                except Exception:
+                    exc_info = sys.exc_info()
+            for slot in slots:
+                slot.status = status
+                slot.exc_info = exc_info
+                slot.event.set()
+
+
+def _nova(clients):
+    clients = weakref.proxy(clients)
+
+    def list_statuses(ids):
+        servers = clients.get_nova().servers.list()
+        return dict((s.id, s.status) for s in servers if s.id in ids)
+
+    def get_status(server_id):
+        return clients.get_nova().servers.get(server_id).status
+
+    return StatusMultiplexer('nova', list_statuses, get_status,
+                             forbidden=exc.NovaForbidden)
+
+
+def _cinder(clients):
+    clients = weakref.proxy(clients)
+
+    def list_statuses(ids):
+        volumes = clients.get_cinder().volumes.list()
+        return dict(
+            (v.id, v.status.lower()) for v in volumes if v.id in ids
+        )
+
+    def get_status(volume_id):
+        return clients.get_cinder().volumes.get(volume_id).status.lower()
+
+    return StatusMultiplexer('cinder', list_statuses, get_status,
+                             forbidden=exc.CinderForbidden)
+
+
+def _glance(clients):
+    clients = weakref.proxy(clients)
+
+    def list_statuses(ids):
+        images = clients.get_glance().images.list(
+            filters={'id': 'in:{}'.format(','.join(ids))}
+        )
+        return dict(
+            (i.id, i.status.lower()) for i in images if i.id in ids
+        )
+
+    def get_status(image_id):
+        return clients.get_glance().images.get(image_id).status.lower()
+
+    return StatusMultiplexer('glance', list_statuses, get_status,
+                             forbidden=exc.GlanceForbidden)
+
+
+_FACTORIES = {
+    'nova': _nova,
+    'cinder': _cinder,
+    'glance': _glance
+}
+
+
+def get_multiplexer(clients, service):
+    """Get the multiplexer for a service and set of clients.
+
+    :param clients: Client manager the statuses are fetched with
+    :type clients: roletester.clients.ClientManager
+    :param service: One of nova, cinder or glance
+    :type service: String
+    :returns: StatusMultiplexer
+    """
+    # Multiplexers only hold a proxy to their clients so they go away with
+    # the client manager.
+    with _multiplexers_lock:
+        by_service = _multiplexers.setdefault(clients, {})
+        if service not in by_service:
+            by_service[service] = _FACTORIES[service](clients)
+        return by_service[service]
+
+
+def poll(clients, service, resource_id):
+    """Get the current status of a resource.
+
+    Goes through the service multiplexer unless batching is disabled.
+
+    :param clients: Client manager the status is fetched with
+    :type clients: roletester.clients.ClientManager
+    :param service: One of nova, cinder or glance
+    :type service: String
+    :param resource_id: Id of the resource
+    :type resource_id: String
+    :returns: String status, lowercased for cinder and glance
+    """
+    if ENABLED:
+        return get_multiplexer(clients, service).poll(resource_id)
+    return get_multiplexer(clients, service)._get_status(resource_id)
@@ -0,0 +1,194 @@
+"""HTTP connection pools per service endpoint, with usage statistics.
+
+Every ClientManager shares one requests session between its keystone
+sessions. The endpoint of each service it creates a client for gets its
+own adapter and so its own connection pool, sized from configure() or
+the ROLETESTER_POOL_<SERVICE> environment variable, formatted as
+"maxsize[,block[,keepalive]]", e.g. ROLETESTER_POOL_NOVA=50,1,1.
+
+The statistics show whether a pool is big enough: hits are requests that
+reused a pooled connection, new_connections had to connect, and waits
+blocked on a full pool.
+"""
+import os
+import socket
+import threading
+import time
+import requests
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3 import connectionpool
+from requests.packages.urllib3.connection import HTTPConnection
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.pools')
+
+# requests' own defaults.
+_DEFAULT = {'maxsize': 10, 'block': False, 'keepalive': True}
+
+_config = {}
+_config_lock = threading.Lock()
+
+
+class PoolStats(object):
+    """Counts how the connections of a pool are used."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.new_connections = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def record(self, **counts):
+        """Add to the counters.
+
+        :param counts: Counter name to amount
+        :type counts: Dict
+        """
+        with self._lock:
+            for name, amount in counts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        """Get the counters.
+
+        :returns: Dict
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'new_connections': self.new_connections,
+                    'waits': self.waits,
+                    'wait_seconds': self.wait_seconds}
+
+
+class _CountingPool(object):
+    """Mixin for urllib3 connection pools that records PoolStats."""
+
+    stats = None
+
+    def _get_conn(self, timeout=None):
+        full = self.pool is not None and self.pool.empty()
+        start = time.time()
+        conn = super(_CountingPool, self)._get_conn(timeout=timeout)
+        if full and self.block:
+            self.stats.record(waits=1, wait_seconds=time.time() - start)
+        return conn
+
+    def _new_conn(self):
+        self.stats.record(new_connections=1)
+        return super(_CountingPool, self)._new_conn()
+
+    def _make_request(self, conn, *args, **kwargs):
+        if getattr(conn, 'sock', None) is not None:
+            self.stats.record(hits=1)
+        return super(_CountingPool, self)._make_request(conn, *args, **kwargs)
+
+
+def _pool_classes(stats):
+    """Pool classes that record into stats."""
+    http = type('CountingHTTPConnectionPool',
+                (_CountingPool, connectionpool.HTTPConnectionPool),
+                {'stats': stats})
+    https = type('CountingHTTPSConnectionPool',
+                 (_CountingPool, connectionpool.HTTPSConnectionPool),
+                 {'stats': stats})
+    return {'http': http, 'https': https}
+
+
+class PoolAdapter(HTTPAdapter):
+    """HTTPAdapter with pool settings of a service and usage statistics."""
+
+    def __init__(self, name, maxsize, block, keepalive):
+        """Init the adapter.
+
+        :param name: Service name the adapter is for
+        :type name: String
+        :param maxsize: Connections kept per host
+        :type maxsize: Integer
+        :param block: Wait for a free connection rather than open more
+        :type block: Boolean
+        :param keepalive: Keep connections open between requests
+        :type keepalive: Boolean
+        """
+        self.name = name
+        self.keepalive = keepalive
+        self.stats = PoolStats()
+        super(PoolAdapter, self).__init__(pool_maxsize=maxsize,
+                                          pool_block=block)
+
+    def init_poolmanager(self, connections, maxsize, block=False,
+                         **pool_kwargs):
+        if self.keepalive:
+            pool_kwargs['socket_options'] = (
+                HTTPConnection.default_socket_options +
+                [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+            )
+        super(PoolAdapter, self).init_poolmanager(
+            connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = _pool_classes(self.stats)
+
+    def add_headers(self, request, **kwargs):
+        if not self.keepalive:
+            request.headers['Connection'] = 'close'
+
+
+def configure(service, maxsize=None, block=None, keepalive=None):
+    """Set the pool settings of a service for managers created afterwards.
+
+    :param service: Service name, e.g. nova, or default
+    :type service: String
+    :param maxsize: Connections kept per host
+    :type maxsize: Integer
+    :param block: Wait for a free connection rather than open more
+    :type block: Boolean
+    :param keepalive: Keep connections open between requests
+    :type keepalive: Boolean
+    """
+    settings = dict(maxsize=maxsize, block=block, keepalive=keepalive)
+    with _config_lock:
+        current = _config.setdefault(service, {})
+        current.update((k, v) for k, v in settings.items() if v is not None)
+
+
+def settings(service):
+    """Get the pool settings of a service.
+
+    :param service: Service name
+    :type service: String
+    :returns: Dict with maxsize, block and keepalive
+    """
+    result = dict(_DEFAULT)
+    setting = os.getenv('ROLETESTER_POOL_{}'.format(service.upper()))
+    if setting:
+        values = setting.split(',')
+        result['maxsize'] = int(values[0])
+        if len(values) > 1:
+            result['block'] = values[1] not in ('0', 'false', 'False')
+        if len(values) > 2:
+            result['keepalive'] = values[2] not in ('0', 'false', 'False')
+    with _config_lock:
+        result.update(_config.get(service, {}))
+    return result
+
+
+def adapter(service):
+    """Build an adapter with the pool settings of a service.
+
+    :param service: Service name
+    :type service: String
+    :returns: PoolAdapter
+    """
+    return PoolAdapter(service, **settings(service))
+
+
+def http_session():
+    """Build a requests session whose default pools record statistics.
+
+    :returns: requests.Session
+    """
+    http = requests.Session()
+    default = adapter('default')
+    http.mount('https://', default)
+    http.mount('http://', default)
+    return http
@@ -1,7 +1,12 @@
+import six
+import sys
 import unittest
+from roletester import server_pool
+from roletester.context import Context
 from roletester.garbage import Collector as GC
 from roletester.keystone_manager import KeystoneManager as KM
 from roletester.log import logging
+from roletester.scheduler import PrefixScheduler
 
 logger = logging.getLogger('roletester.base')
 
@@ -12,21 +17,100 @@ class Base(unittest.TestCase):
     Actual role test classes should subclass this this test class.
     """
 
+    # (domain, project, role[, inherited]) tuples to provision in bulk
+    # before the first test. Tests then share one keystone manager.
+    CREDENTIALS = []
+
+    # Credentials for the garbage collector.
+    _GC_CREDENTIALS = ('Default', 'Default', 'cloud-admin', False)
+
+    @classmethod
+    def setUpClass(cls):
+        """Called once before the tests of a class."""
+        # Scenario results of the groups run by run_shared(), by group,
+        # and the contexts they ran in.
+        cls.shared_results = {}
+        cls.shared_contexts = []
+        cls.class_km = None
+        if cls.CREDENTIALS:
+            cls.class_km = KM()
+            cls.class_km.find_users_credentials(
+                list(cls.CREDENTIALS) + [cls._GC_CREDENTIALS])
+
+    @classmethod
+    def tearDownClass(cls):
+        """Called once after the tests of a class."""
+        if cls.shared_contexts:
+            km = cls.class_km or KM()
+            try:
+                admin = km.find_user_credentials(*cls._GC_CREDENTIALS)
+                GC(admin).collect(cls.shared_contexts)
+            except Exception:
+                logger.exception("Exception when garbage collecting")
+            finally:
+                if km is not cls.class_km:
+                    km.teardown()
+        if cls.class_km is not None:
+            # Pools boot and delete servers as the class's users.
+            server_pool.close_all()
+            cls.class_km.teardown()
+
     def setUp(self):
         """Called before each test method."""
 
         # Pass this context to scenraio.run()
-        self.context = {}
+        self.context = Context()
 
         # Keystone manage - use this for test credentials
-        self.km = KM()
+        self.km = self.class_km or KM()
 
         # Set up the garbage collector
         # admin = self.km.find_user_credentials('Default', 'admin', 'admin')
         print "Garbage user:"
-        admin = self.km.find_user_credentials('Default', 'Default', 'cloud-admin', False)
+        admin = self.km.find_user_credentials(*self._GC_CREDENTIALS)
         self.gc = GC(admin)
 
+    def run_shared(self, group, name):
+        """Run one scenario of a group that shares its prefixes.
+
+        The first test of the group to run gets every scenario of the
+        group from self._<group>_scenarios() and runs them together in a
+        fork of its context, the links they share once. Each test then raises the failure of its
+        own scenario, if any. What the group made is collected once the
+        class is done.
+
+        :param group: Group name
+        :type group: String
+        :param name: Scenario name within the group
+        :type name: String
+        """
+        cls = type(self)
+        if group not in cls.shared_results:
+            scenarios = getattr(self, '_{}_scenarios'.format(group))()
+            scheduler = PrefixScheduler()
+            for scenario_name in sorted(scenarios):
+                scheduler.add(scenarios[scenario_name], scenario_name)
+            # Starts from what setUp put in the context, with a garbage
+            # stack of its own.
+            context = self.context.fork()
+            context['stack'] = []
+            try:
+                results = scheduler.run(context=context)
+            except Exception:
+                logger.exception("Scenario group {} failed.".format(group))
+                exc_info = sys.exc_info()
+                results = dict((scenario_name, exc_info)
+                               for scenario_name in scenarios)
+            finally:
+                # Branches first, they use what the shared prefixes made.
+                cls.shared_contexts.extend(
+                    list(reversed(scheduler.contexts[1:])) +
+                    scheduler.contexts[:1])
+            cls.shared_results[group] = results
+        result = cls.shared_results[group][name]
+        if result is not None:
+            six.reraise(*result)
+
     def tearDown(self):
         """Called after each test method."""
         try:
@@ -34,4 +118,6 @@ class Base(unittest.TestCase):
         except Exception:
             logger.exception("Exception when garbage collecting")
         finally:
-            self.km.teardown()
+            if self.km is not self.class_km:
+                server_pool.close_all()
+                self.km.teardown()
@@ -175,6 +175,27 @@ class TestSample(BaseTestCase):
 
     project = randomname()
 
+    CREDENTIALS = [
+        ('Default', project, 'bu-admin'),
+        ('Default', project, 'bu-brt'),
+        ('Default', project, 'bu-poweruser', False),
+        ('Default', project, 'bu-user'),
+        ('Default', project, 'cirt'),
+        ('Default', project, 'cirt', False),
+        ('Default', project, 'cloud-admin'),
+        ('Default', project, 'cloud-admin', False),
+        ('Default', project, 'cloud-support'),
+        ('Default', 'torst', 'bu-brt'),
+        ('Default', 'torst', 'bu-poweruser', False),
+        ('Default', 'torst', 'cloud-admin'),
+        ('Default', 'torst', 'cloud-admin', False),
+        ('Domain2', project, 'bu-admin'),
+        ('Domain2', project, 'bu-poweruser', False),
+        ('Domain2', project, 'cirt'),
+        ('Domain2', project, 'cloud-admin', False),
+        ('Domain2', project, 'cloud-support')
+    ]
+
     def test_cloud_admin_all(self):
         cloud_admin = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin', False
@@ -6,6 +6,7 @@ from roletester.actions.glance import image_delete
 from roletester.actions.glance import image_wait_for_status
 from roletester.actions.glance import image_list
 from roletester.actions.glance import image_download
+from roletester.actions.glance import image_download_many
 from roletester.exc import GlanceForbidden
 from roletester.exc import KeystoneUnauthorized
 from roletester.scenario import ScenarioFactory as Factory
@@ -44,12 +45,35 @@ class ImageCreateFactory(Factory):
     IMAGE_CREATE = 0
 
 
+class DownloadManyFactory(Factory):
+    _ACTIONS = [
+        image_create,
+        image_wait_for_status,
+        image_download_many
+    ]
+
+    IMAGE_CREATE = 0
+    IMAGE_WAIT = 1
+    IMAGE_DOWNLOAD_MANY = 2
+
+
 class TestSample(BaseTestCase):
     name = 'scratch'
     flavor = '1'
     image_file = '/Users/egle/Downloads/cirros-0.3.4-x86_64-disk.img'
     project = randomname()
 
+    CREDENTIALS = [
+        ('Default', project, 'bu-admin'),
+        ('Default', project, 'bu-brt'),
+        ('Default', project, 'bu-poweruser', False),
+        ('Default', project, 'bu-user'),
+        ('Default', project, 'cirt', False),
+        ('Default', project, 'cloud-admin', False),
+        ('Default', project, 'cloud-support'),
+        ('Domain2', project, 'bu-admin')
+    ]
+
     def test_cloud_admin_all(self):
         cloud_admin = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin', False
@@ -75,6 +99,20 @@ class TestSample(BaseTestCase):
             .produce() \
             .run(context=self.context)
 
+    def test_cloud_admin_download_many(self):
+        cloud_admin = self.km.find_user_credentials(
+            'Default', self.project, 'cloud-admin', False
+        )
+
+        DownloadManyFactory(cloud_admin) \
+            .set(DownloadManyFactory.IMAGE_CREATE,
+                 args=(self.image_file,),
+                 kwargs={'visibility': 'public'}) \
+            .set(DownloadManyFactory.IMAGE_DOWNLOAD_MANY,
+                 kwargs={'copies': 8}) \
+            .produce() \
+            .run(context=self.context)
+
     def test_cloud_admin_same_domain_different_user(self):
         creator = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin', False
@@ -132,6 +132,25 @@ class TestSample(BaseTestCase):
     flavor = '1'
     project = randomname()
 
+    CREDENTIALS = [
+        ('Default', project, 'cloud-admin', False),
+        ('Default', 'torst', 'bu-admin'),
+        ('Domain2', project, 'bu-admin'),
+        ('CustomDomain', project, 'bu-brt'),
+        ('CustomDomain', project, 'bu-poweruser'),
+        ('CustomDomain', project, 'bu-user'),
+        ('CustomDomain', project, 'cirt'),
+        ('CustomDomain', project, 'cloud-admin', False),
+        ('CustomDomain', project, 'cloud-support'),
+        ('CustomDomain', 'torst', 'bu-brt'),
+        ('CustomDomain', 'torst', 'bu-poweruser'),
+        ('CustomDomain', 'torst', 'bu-user'),
+        ('CustomDomain', 'torst', 'cirt'),
+        ('CustomDomain', 'torst', 'cloud-admin', False),
+        ('CustomDomain', 'torst', 'cloud-support'),
+        ('CustomDomain_1', 'torst', 'cloud-admin', False)
+    ]
+
     def test_cloud_admin_all(self):
         cloud_admin = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin', False
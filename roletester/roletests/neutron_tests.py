@@ -1,5 +1,4 @@
 from base import Base as BaseTestCase
-from roletester.actions.glance import image_create
 from roletester.actions.glance import image_wait_for_status
 from roletester.actions.nova import server_create
 from roletester.actions.nova import server_delete
@@ -34,6 +33,7 @@ from roletester.exc import KeystoneUnauthorized
 from roletester.exc import NeutronForbidden
 from neutronclient.common.exceptions import NetworkNotFoundClient
 from roletester.exc import NeutronNotFound
+from roletester import image_fixtures
 from roletester.scenario import ScenarioFactory as Factory
 from roletester.utils import randomname
 
@@ -279,43 +279,42 @@ class TestSample(BaseTestCase):
 
     project = randomname()
 
+    CREDENTIALS = [
+        ('Default', project, 'admin'),
+        ('Default', project, 'bu-admin'),
+        ('Default', project, 'bu-brt'),
+        ('Default', project, 'bu-poweruser', False),
+        ('Default', project, 'bu-user'),
+        ('Default', project, 'cirt'),
+        ('Default', project, 'cloud-admin'),
+        ('Default', project, 'cloud-support'),
+        ('Domain2', project, 'bu-admin'),
+        ('Domain2', project, 'bu-brt'),
+        ('Domain2', project, 'bu-poweruser', False),
+        ('Domain2', project, 'bu-user'),
+        ('Domain2', project, 'cirt'),
+        ('Domain2', project, 'cloud-support')
+    ]
+
     def setUp(self):
         super(TestSample, self).setUp()
         try:
-            n = self.km.admin_client_manager.get_neutron()
-            networks = n.list_networks()['networks']
-            public_network = [x['id']
-                              for x in networks
-                              if x['router:external'] is True][0]
+            admin = self.km.admin_client_manager
+            n = admin.get_neutron()
+            public_network = admin.cache.get(
+                'networks', 'external',
+                lambda: [x['id']
+                         for x in n.list_networks()['networks']
+                         if x['router:external'] is True][0]
+            )
         except IndexError:
             err_str = "No public network found to create floating ips from."
             raise NetworkNotFoundClient(message=err_str)
         self.context["external_network_id"] = public_network
 
-        kwargs = {
-            'name': "glance test image",
-            'disk_format': 'qcow2',
-            'container_format': 'bare',
-            'is_public': 'public'
-        }
-        try:
-            image_id = self.context['image_id']
-        except Exception:
-            logger.info("No image_id found, creating image")
-
-            glance = self.km.admin_client_manager.get_glance()
-            images = glance.images.list()
-            for img in images:
-                if img.name == "glance test image" and img.status == "active" and img.visibility == 'public':
-                    logger.info("found image with image id: %s" %img.id)
-                    self.context.update(image_id=img.id)
-            if 'image_id' in self.context:
-                logger.info("image found:")
-                logger.info("image_id in context: %s" %self.context['image_id'])
-            else:
-                logger.info("creating new image.")
-                image_create(self.km.admin_client_manager, self.context, self.image_file)
-                image_id = self.context['image_id']
+        if 'image_id' not in self.context:
+            self.context.update(image_id=image_fixtures.get_image(
+                self.km.admin_client_manager, self.image_file))
 
     def test_cloud_admin_all(self):
         cloud_admin = self.km.find_user_credentials(
@@ -1,5 +1,6 @@
+import os
+
 from base import Base as BaseTestCase
-from roletester.actions.glance import image_create
 from roletester.actions.glance import image_delete
 from roletester.actions.glance import image_wait_for_status
 from roletester.actions.nova import interface_attach
@@ -7,6 +8,7 @@ from roletester.actions.nova import interface_detach
 from roletester.actions.nova import server_create
 from roletester.actions.nova import server_update
 from roletester.actions.nova import server_delete
+from roletester.actions.nova import server_lease
 from roletester.actions.nova import server_show
 from roletester.actions.nova import server_create_image
 from roletester.actions.nova import server_wait_for_status
@@ -17,6 +19,7 @@ from roletester.exc import KeystoneUnauthorized
 from roletester.exc import NeutronNotFound
 from roletester.exc import NovaForbidden
 from roletester.exc import GlanceForbidden
+from roletester import image_fixtures
 from roletester.scenario import ScenarioFactory as Factory
 from roletester.utils import randomname
 
@@ -168,6 +171,21 @@ class NetworkDetachInterfaceFactory(Factory):
     SERVER_DELETE = 7
 
 
+class ServerLeaseFactory(Factory):
+
+    _ACTIONS = [
+        server_lease,
+        server_show,
+        server_update,
+        server_delete
+    ]
+
+    SERVER_LEASE = 0
+    SERVER_SHOW = 1
+    SERVER_UPDATE = 2
+    SERVER_DELETE = 3
+
+
 class TestSample(BaseTestCase):
 
     name = 'scratch'
@@ -175,42 +193,42 @@ class TestSample(BaseTestCase):
     image_file = '/Users/egle/Downloads/cirros-0.3.4-x86_64-disk.img'
     project = randomname()
 
+    CREDENTIALS = [
+        ('Default', project, 'bu-admin'),
+        ('Default', project, 'bu-brt'),
+        ('Default', project, 'bu-poweruser', False),
+        ('Default', project, 'bu-user'),
+        ('Default', project, 'cirt'),
+        ('Default', project, 'cloud-admin'),
+        ('Default', project, 'cloud-support'),
+        ('Domain2', project, 'bu-admin'),
+        ('Domain2', project, 'bu-brt'),
+        ('Domain2', project, 'bu-poweruser', False),
+        ('Domain2', project, 'bu-user'),
+        ('Domain2', project, 'cirt'),
+        ('Domain2', project, 'cloud-support')
+    ]
+
     def setUp(self):
         super(TestSample, self).setUp()
 
-        kwargs = {
-            'name': "glance test image",
-            'disk_format': 'qcow2',
-            'container_format': 'bare',
-            'is_public': 'public'
-        }
         try:
-            n = self.km.admin_client_manager.get_neutron()
-            networks = n.list_networks()['networks']
-            public_network = [x['id']
-                              for x in networks
-                              if x['router:external'] is True][0]
+            admin = self.km.admin_client_manager
+            n = admin.get_neutron()
+            public_network = admin.cache.get(
+                'networks', 'external',
+                lambda: [x['id']
+                         for x in n.list_networks()['networks']
+                         if x['router:external'] is True][0]
+            )
         except IndexError:
             err_str = "No public network found to create floating ips from."
             raise NeutronNotFound(message=err_str)
         self.context["external_network_id"] = public_network
 
-        try:
-            image_id = self.context['image_id']
-        except Exception:
-            logger.info("No image_id found, creating image")
-
-            glance = self.km.admin_client_manager.get_glance()
-            images = glance.images.list()
-            for img in images:
-                if img.name == "nova test image" and img.status == "active" and img.visibility == 'public':
-                    logger.info("found image with image id: %s" %img.id)
-                    self.context.update(image_id=img.id)
-            if 'image_id' in self.context:
-                logger.info("image_id in context: %s" %self.context['image_id'])
-            else:
-                image_create(self.km.admin_client_manager, self.context, self.image_file)
-                image_id = self.context['image_id']
+        if 'image_id' not in self.context:
+            self.context.update(image_id=image_fixtures.get_image(
+                self.km.admin_client_manager, self.image_file))
 
     def test_cloud_admin_all_cloud_admin_user(self):
         creator = self.km.find_user_credentials(
@@ -298,64 +316,41 @@ class TestSample(BaseTestCase):
             .produce() \
             .run(context=self.context)
 
-    def test_bu_admin_different_domain_different_user_server_and_snapshot(self):
+    def _bu_admin_different_domain_scenarios(self):
         creator = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin'
         )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
         bu_admin = self.km.find_user_credentials(
             'Domain2', self.project, 'bu-admin'
         )
+        user1 = self.km.find_user_credentials(
+            'Default', self.project, 'bu-admin'
+        )
 
-        SnapFactory(bu_admin) \
-            .set(SnapFactory.NETWORK_CREATE, clients=user1) \
-            .set(SampleFactory.SUBNET_CREATE, clients=user1) \
-            .set(SnapFactory.SERVER_CREATE, clients=user1) \
-            .set(SnapFactory.SERVER_WAIT, clients=user1) \
+        scenarios = {}
+        scenarios['server_and_snapshot'] = SnapFactory(bu_admin) \
+            .set(SnapFactory.NETWORK_CREATE, clients=creator) \
+            .set(SampleFactory.SUBNET_CREATE, clients=creator) \
+            .set(SnapFactory.SERVER_CREATE, clients=creator) \
+            .set(SnapFactory.SERVER_WAIT, clients=creator) \
             .set(SnapFactory.SERVER_SHOW,
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(SnapFactory.SERVER_UPDATE,
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(SnapFactory.SERVER_CREATE_IMAGE,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_bu_admin_different_domain_different_user_network(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'bu-admin'
-        )
+            .produce()
 
-        NetworkPortFactory(bu_admin) \
-            .set(NetworkPortFactory.SERVER_CREATE, clients=user1) \
-            .set(NetworkPortFactory.SERVER_WAIT, clients=user1) \
+        scenarios['network'] = NetworkPortFactory(bu_admin) \
+            .set(NetworkPortFactory.SERVER_CREATE, clients=creator) \
+            .set(NetworkPortFactory.SERVER_WAIT, clients=creator) \
             .set(NetworkPortFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkPortFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkPortFactory.PORT_CREATE,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
+            .produce()
 
-    def test_bu_admin_different_domain_different_user_attach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'bu-admin'
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'bu-admin'
-        )
-
-        NetworkAttachInterfaceFactory(bu_admin) \
+        scenarios['attach_interface'] = NetworkAttachInterfaceFactory(bu_admin) \
             .set(NetworkAttachInterfaceFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkAttachInterfaceFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkAttachInterfaceFactory.PORT_CREATE,
@@ -364,21 +359,9 @@ class TestSample(BaseTestCase):
             .set(NetworkAttachInterfaceFactory.SERVER_WAIT, clients=user1) \
             .set(NetworkAttachInterfaceFactory.INTERFACE_ATTACH,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_bu_admin_different_domain_different_user_detach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'bu-admin'
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'bu-admin'
-        )
+            .produce()
 
-        NetworkDetachInterfaceFactory(bu_admin) \
+        scenarios['detach_interface'] = NetworkDetachInterfaceFactory(bu_admin) \
             .set(NetworkDetachInterfaceFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.PORT_CREATE,
@@ -391,8 +374,21 @@ class TestSample(BaseTestCase):
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(NetworkDetachInterfaceFactory.SERVER_DELETE,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
+            .produce()
+
+        return scenarios
+
+    def test_bu_admin_different_domain_different_user_server_and_snapshot(self):
+        self.run_shared('bu_admin_different_domain', 'server_and_snapshot')
+
+    def test_bu_admin_different_domain_different_user_network(self):
+        self.run_shared('bu_admin_different_domain', 'network')
+
+    def test_bu_admin_different_domain_different_user_attach_interface(self):
+        self.run_shared('bu_admin_different_domain', 'attach_interface')
+
+    def test_bu_admin_different_domain_different_user_detach_interface(self):
+        self.run_shared('bu_admin_different_domain', 'detach_interface')
 
         ######
         # bu_user
@@ -415,7 +411,7 @@ class TestSample(BaseTestCase):
             .run(context=self.context)
 
 
-    def test_bu_user_different_domain_different_user_server_and_snapshot(self):
+    def _bu_user_different_domain_scenarios(self):
         creator = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin'
         )
@@ -426,7 +422,8 @@ class TestSample(BaseTestCase):
             'Domain2', self.project, 'bu-user'
         )
 
-        SnapFactory(creator) \
+        scenarios = {}
+        scenarios['server_and_snapshot'] = SnapFactory(creator) \
             .set(SnapFactory.SERVER_WAIT, clients=user1) \
             .set(SnapFactory.SERVER_SHOW, clients=bu_user,
                  expected_exceptions=[KeystoneUnauthorized]) \
@@ -434,53 +431,20 @@ class TestSample(BaseTestCase):
                  expected_exceptions=[NovaForbidden]) \
             .set(SnapFactory.SERVER_CREATE_IMAGE, clients=bu_user,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_bu_user_different_domain_different_user_network(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'bu-user'
-        )
-        bu_user = self.km.find_user_credentials(
-            'Domain2', self.project, 'bu-user'
-        )
+            .produce()
 
-        NetworkPortFactory(creator) \
+        scenarios['network'] = NetworkPortFactory(creator) \
             .set(NetworkPortFactory.SERVER_WAIT, clients=user1) \
             .set(NetworkPortFactory.PORT_CREATE, clients=bu_user,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
+            .produce()
 
-    def test_bu_user_different_domain_different_user_attach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        bu_user = self.km.find_user_credentials(
-            'Domain2', self.project, 'bu-user'
-        )
-
-        NetworkAttachInterfaceFactory(creator) \
+        scenarios['attach_interface'] = NetworkAttachInterfaceFactory(creator) \
             .set(NetworkAttachInterfaceFactory.INTERFACE_ATTACH, clients=bu_user,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
+            .produce()
 
-    def test_bu_user_different_domain_different_user_detach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'bu-user'
-        )
-        bu_user = self.km.find_user_credentials(
-            'Default', self.project, 'bu-user'
-        )
-
-        NetworkDetachInterfaceFactory(bu_user) \
+        scenarios['detach_interface'] = NetworkDetachInterfaceFactory(user1) \
             .set(NetworkDetachInterfaceFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.SERVER_CREATE, clients=creator) \
@@ -493,8 +457,21 @@ class TestSample(BaseTestCase):
                  expected_exceptions=[NovaForbidden]) \
             .set(NetworkDetachInterfaceFactory.SERVER_DELETE,
                  expected_exceptions=[NovaForbidden]) \
-            .produce() \
-            .run(context=self.context)
+            .produce()
+
+        return scenarios
+
+    def test_bu_user_different_domain_different_user_server_and_snapshot(self):
+        self.run_shared('bu_user_different_domain', 'server_and_snapshot')
+
+    def test_bu_user_different_domain_different_user_network(self):
+        self.run_shared('bu_user_different_domain', 'network')
+
+    def test_bu_user_different_domain_different_user_attach_interface(self):
+        self.run_shared('bu_user_different_domain', 'attach_interface')
+
+    def test_bu_user_different_domain_different_user_detach_interface(self):
+        self.run_shared('bu_user_different_domain', 'detach_interface')
 
 #cirt
 
@@ -512,7 +489,7 @@ class TestSample(BaseTestCase):
             .produce() \
             .run(context=self.context)
 
-    def test_cirt_different_domain_different_user_server_and_snapshot(self):
+    def _cirt_different_domain_scenarios(self):
         creator = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin'
         )
@@ -523,7 +500,8 @@ class TestSample(BaseTestCase):
             'Domain2', self.project, 'cirt'
         )
 
-        SnapFactory(creator) \
+        scenarios = {}
+        scenarios['server_and_snapshot'] = SnapFactory(creator) \
             .set(SnapFactory.SERVER_WAIT, clients=user1) \
             .set(SnapFactory.SERVER_SHOW, clients=bu_user,
                  expected_exceptions=[KeystoneUnauthorized]) \
@@ -531,53 +509,20 @@ class TestSample(BaseTestCase):
                  expected_exceptions=[NovaForbidden]) \
             .set(SnapFactory.SERVER_CREATE_IMAGE, clients=bu_user,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
+            .produce()
 
-    def test_cirt_different_domain_different_user_network(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cirt'
-        )
-        bu_user = self.km.find_user_credentials(
-            'Domain2', self.project, 'cirt'
-        )
-
-        NetworkPortFactory(creator) \
+        scenarios['network'] = NetworkPortFactory(creator) \
             .set(NetworkPortFactory.SERVER_WAIT, clients=user1) \
             .set(NetworkPortFactory.PORT_CREATE, clients=bu_user,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_cirt_different_domain_different_user_attach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        bu_user = self.km.find_user_credentials(
-            'Domain2', self.project, 'cirt'
-        )
+            .produce()
 
-        NetworkAttachInterfaceFactory(creator) \
+        scenarios['attach_interface'] = NetworkAttachInterfaceFactory(creator) \
             .set(NetworkAttachInterfaceFactory.INTERFACE_ATTACH, clients=bu_user,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_cirt_different_domain_different_user_detach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cirt'
-        )
-        bu_user = self.km.find_user_credentials(
-            'Default', self.project, 'cirt'
-        )
+            .produce()
 
-        NetworkDetachInterfaceFactory(bu_user) \
+        scenarios['detach_interface'] = NetworkDetachInterfaceFactory(user1) \
             .set(NetworkDetachInterfaceFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.SERVER_CREATE, clients=creator) \
@@ -590,12 +535,26 @@ class TestSample(BaseTestCase):
                  expected_exceptions=[NovaForbidden]) \
             .set(NetworkDetachInterfaceFactory.SERVER_DELETE,
                  expected_exceptions=[NovaForbidden]) \
-            .produce() \
-            .run(context=self.context)
+            .produce()
+
+        return scenarios
+
+    def test_cirt_different_domain_different_user_server_and_snapshot(self):
+        self.run_shared('cirt_different_domain', 'server_and_snapshot')
+
+    def test_cirt_different_domain_different_user_network(self):
+        self.run_shared('cirt_different_domain', 'network')
+
+    def test_cirt_different_domain_different_user_attach_interface(self):
+        self.run_shared('cirt_different_domain', 'attach_interface')
+
+    def test_cirt_different_domain_different_user_detach_interface(self):
+        self.run_shared('cirt_different_domain', 'detach_interface')
 
 
 #cloud support
     #todo: retest
+
     def test_cloud_support_all_cloud_admin_user(self):
         creator = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin'
@@ -642,64 +601,41 @@ class TestSample(BaseTestCase):
             .produce() \
             .run(context=self.context)
 
-    def test_cloud_support_different_domain_different_user_server_and_snapshot(self):
+    def _cloud_support_different_domain_scenarios(self):
         creator = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin'
         )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
         bu_admin = self.km.find_user_credentials(
             'Domain2', self.project, 'cloud-support'
         )
+        user1 = self.km.find_user_credentials(
+            'Default', self.project, 'cloud-support'
+        )
 
-        SnapFactory(bu_admin) \
-            .set(SnapFactory.NETWORK_CREATE, clients=user1) \
-            .set(SampleFactory.SUBNET_CREATE, clients=user1) \
-            .set(SnapFactory.SERVER_CREATE, clients=user1) \
-            .set(SnapFactory.SERVER_WAIT, clients=user1) \
+        scenarios = {}
+        scenarios['server_and_snapshot'] = SnapFactory(bu_admin) \
+            .set(SnapFactory.NETWORK_CREATE, clients=creator) \
+            .set(SampleFactory.SUBNET_CREATE, clients=creator) \
+            .set(SnapFactory.SERVER_CREATE, clients=creator) \
+            .set(SnapFactory.SERVER_WAIT, clients=creator) \
             .set(SnapFactory.SERVER_SHOW,
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(SnapFactory.SERVER_UPDATE,
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(SnapFactory.SERVER_CREATE_IMAGE,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
+            .produce()
 
-    def test_cloud_support_different_domain_different_user_network(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'cloud-support'
-        )
-
-        NetworkPortFactory(bu_admin) \
-            .set(NetworkPortFactory.SERVER_CREATE, clients=user1) \
-            .set(NetworkPortFactory.SERVER_WAIT, clients=user1) \
+        scenarios['network'] = NetworkPortFactory(bu_admin) \
+            .set(NetworkPortFactory.SERVER_CREATE, clients=creator) \
+            .set(NetworkPortFactory.SERVER_WAIT, clients=creator) \
             .set(NetworkPortFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkPortFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkPortFactory.PORT_CREATE,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
+            .produce()
 
-    def test_cloud_support_different_domain_different_user_attach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-support'
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'cloud-support'
-        )
-
-        NetworkAttachInterfaceFactory(bu_admin) \
+        scenarios['attach_interface'] = NetworkAttachInterfaceFactory(bu_admin) \
             .set(NetworkAttachInterfaceFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkAttachInterfaceFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkAttachInterfaceFactory.PORT_CREATE,
@@ -708,21 +644,9 @@ class TestSample(BaseTestCase):
             .set(NetworkAttachInterfaceFactory.SERVER_WAIT, clients=user1) \
             .set(NetworkAttachInterfaceFactory.INTERFACE_ATTACH,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_cloud_support_different_domain_different_user_detach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-support'
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'cloud-support'
-        )
+            .produce()
 
-        NetworkDetachInterfaceFactory(bu_admin) \
+        scenarios['detach_interface'] = NetworkDetachInterfaceFactory(bu_admin) \
             .set(NetworkDetachInterfaceFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.PORT_CREATE,
@@ -735,10 +659,24 @@ class TestSample(BaseTestCase):
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(NetworkDetachInterfaceFactory.SERVER_DELETE,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
+            .produce()
+
+        return scenarios
+
+    def test_cloud_support_different_domain_different_user_server_and_snapshot(self):
+        self.run_shared('cloud_support_different_domain', 'server_and_snapshot')
+
+    def test_cloud_support_different_domain_different_user_network(self):
+        self.run_shared('cloud_support_different_domain', 'network')
+
+    def test_cloud_support_different_domain_different_user_attach_interface(self):
+        self.run_shared('cloud_support_different_domain', 'attach_interface')
+
+    def test_cloud_support_different_domain_different_user_detach_interface(self):
+        self.run_shared('cloud_support_different_domain', 'detach_interface')
 
 #bu-brt
+
     def test_bu_brt_all_cloud_admin_user(self):
         creator = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin'
@@ -785,64 +723,41 @@ class TestSample(BaseTestCase):
             .produce() \
             .run(context=self.context)
 
-    def test_bu_brt_different_domain_different_user_server_and_snapshot(self):
+    def _bu_brt_different_domain_scenarios(self):
         creator = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin'
         )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
         bu_admin = self.km.find_user_credentials(
             'Domain2', self.project, 'bu-brt'
         )
+        user1 = self.km.find_user_credentials(
+            'Default', self.project, 'bu-brt'
+        )
 
-        SnapFactory(bu_admin) \
-            .set(SnapFactory.NETWORK_CREATE, clients=user1) \
-            .set(SampleFactory.SUBNET_CREATE, clients=user1) \
-            .set(SnapFactory.SERVER_CREATE, clients=user1) \
-            .set(SnapFactory.SERVER_WAIT, clients=user1) \
+        scenarios = {}
+        scenarios['server_and_snapshot'] = SnapFactory(bu_admin) \
+            .set(SnapFactory.NETWORK_CREATE, clients=creator) \
+            .set(SampleFactory.SUBNET_CREATE, clients=creator) \
+            .set(SnapFactory.SERVER_CREATE, clients=creator) \
+            .set(SnapFactory.SERVER_WAIT, clients=creator) \
             .set(SnapFactory.SERVER_SHOW,
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(SnapFactory.SERVER_UPDATE,
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(SnapFactory.SERVER_CREATE_IMAGE,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_bu_brt_different_domain_different_user_network(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'bu-brt'
-        )
+            .produce()
 
-        NetworkPortFactory(bu_admin) \
-            .set(NetworkPortFactory.SERVER_CREATE, clients=user1) \
-            .set(NetworkPortFactory.SERVER_WAIT, clients=user1) \
+        scenarios['network'] = NetworkPortFactory(bu_admin) \
+            .set(NetworkPortFactory.SERVER_CREATE, clients=creator) \
+            .set(NetworkPortFactory.SERVER_WAIT, clients=creator) \
             .set(NetworkPortFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkPortFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkPortFactory.PORT_CREATE,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_bu_brt_different_domain_different_user_attach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'bu-brt'
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'bu-brt'
-        )
+            .produce()
 
-        NetworkAttachInterfaceFactory(bu_admin) \
+        scenarios['attach_interface'] = NetworkAttachInterfaceFactory(bu_admin) \
             .set(NetworkAttachInterfaceFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkAttachInterfaceFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkAttachInterfaceFactory.PORT_CREATE,
@@ -851,21 +766,9 @@ class TestSample(BaseTestCase):
             .set(NetworkAttachInterfaceFactory.SERVER_WAIT, clients=user1) \
             .set(NetworkAttachInterfaceFactory.INTERFACE_ATTACH,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_bu_brt_different_domain_different_user_detach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'bu-brt'
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'bu-brt'
-        )
+            .produce()
 
-        NetworkDetachInterfaceFactory(bu_admin) \
+        scenarios['detach_interface'] = NetworkDetachInterfaceFactory(bu_admin) \
             .set(NetworkDetachInterfaceFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.PORT_CREATE,
@@ -878,11 +781,25 @@ class TestSample(BaseTestCase):
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(NetworkDetachInterfaceFactory.SERVER_DELETE,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
+            .produce()
+
+        return scenarios
+
+    def test_bu_brt_different_domain_different_user_server_and_snapshot(self):
+        self.run_shared('bu_brt_different_domain', 'server_and_snapshot')
+
+    def test_bu_brt_different_domain_different_user_network(self):
+        self.run_shared('bu_brt_different_domain', 'network')
+
+    def test_bu_brt_different_domain_different_user_attach_interface(self):
+        self.run_shared('bu_brt_different_domain', 'attach_interface')
+
+    def test_bu_brt_different_domain_different_user_detach_interface(self):
+        self.run_shared('bu_brt_different_domain', 'detach_interface')
 
 
 #bu-poweruser
+
     def test_bu_poweruser_all_cloud_admin_user(self):
         creator = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin'
@@ -929,64 +846,41 @@ class TestSample(BaseTestCase):
             .produce() \
             .run(context=self.context)
 
-    def test_bu_poweruser_different_domain_different_user_server_and_snapshot(self):
+    def _bu_poweruser_different_domain_scenarios(self):
         creator = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin'
         )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
         bu_admin = self.km.find_user_credentials(
             'Domain2', self.project, 'bu-poweruser', False
         )
+        user1 = self.km.find_user_credentials(
+            'Default', self.project, 'bu-poweruser', False
+        )
 
-        SnapFactory(bu_admin) \
-            .set(SnapFactory.NETWORK_CREATE, clients=user1) \
-            .set(SampleFactory.SUBNET_CREATE, clients=user1) \
-            .set(SnapFactory.SERVER_CREATE, clients=user1) \
-            .set(SnapFactory.SERVER_WAIT, clients=user1) \
+        scenarios = {}
+        scenarios['server_and_snapshot'] = SnapFactory(bu_admin) \
+            .set(SnapFactory.NETWORK_CREATE, clients=creator) \
+            .set(SampleFactory.SUBNET_CREATE, clients=creator) \
+            .set(SnapFactory.SERVER_CREATE, clients=creator) \
+            .set(SnapFactory.SERVER_WAIT, clients=creator) \
             .set(SnapFactory.SERVER_SHOW,
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(SnapFactory.SERVER_UPDATE,
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(SnapFactory.SERVER_CREATE_IMAGE,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_bu_poweruser_different_domain_different_user_network(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'bu-poweruser', False
-        )
+            .produce()
 
-        NetworkPortFactory(bu_admin) \
-            .set(NetworkPortFactory.SERVER_CREATE, clients=user1) \
-            .set(NetworkPortFactory.SERVER_WAIT, clients=user1) \
+        scenarios['network'] = NetworkPortFactory(bu_admin) \
+            .set(NetworkPortFactory.SERVER_CREATE, clients=creator) \
+            .set(NetworkPortFactory.SERVER_WAIT, clients=creator) \
             .set(NetworkPortFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkPortFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkPortFactory.PORT_CREATE,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_bu_poweruser_different_domain_different_user_attach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'bu-poweruser', False
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'bu-poweruser', False
-        )
+            .produce()
 
-        NetworkAttachInterfaceFactory(bu_admin) \
+        scenarios['attach_interface'] = NetworkAttachInterfaceFactory(bu_admin) \
             .set(NetworkAttachInterfaceFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkAttachInterfaceFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkAttachInterfaceFactory.PORT_CREATE,
@@ -995,21 +889,9 @@ class TestSample(BaseTestCase):
             .set(NetworkAttachInterfaceFactory.SERVER_WAIT, clients=user1) \
             .set(NetworkAttachInterfaceFactory.INTERFACE_ATTACH,
                  expected_exceptions=[KeystoneUnauthorized]) \
-            .produce() \
-            .run(context=self.context)
-
-    def test_bu_poweruser_different_domain_different_user_detach_interface(self):
-        creator = self.km.find_user_credentials(
-            'Default', self.project, 'cloud-admin'
-        )
-        user1 = self.km.find_user_credentials(
-            'Default', self.project, 'bu-poweruser', False
-        )
-        bu_admin = self.km.find_user_credentials(
-            'Domain2', self.project, 'bu-poweruser', False
-        )
+            .produce()
 
-        NetworkDetachInterfaceFactory(bu_admin) \
+        scenarios['detach_interface'] = NetworkDetachInterfaceFactory(bu_admin) \
             .set(NetworkDetachInterfaceFactory.NETWORK_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.SUBNET_CREATE, clients=creator) \
             .set(NetworkDetachInterfaceFactory.PORT_CREATE,
@@ -1022,5 +904,35 @@ class TestSample(BaseTestCase):
                  expected_exceptions=[KeystoneUnauthorized]) \
             .set(NetworkDetachInterfaceFactory.SERVER_DELETE,
                  expected_exceptions=[KeystoneUnauthorized]) \
+            .produce()
+
+        return scenarios
+
+    def test_bu_poweruser_different_domain_different_user_server_and_snapshot(self):
+        self.run_shared('bu_poweruser_different_domain', 'server_and_snapshot')
+
+    def test_bu_poweruser_different_domain_different_user_network(self):
+        self.run_shared('bu_poweruser_different_domain', 'network')
+
+    def test_bu_poweruser_different_domain_different_user_attach_interface(self):
+        self.run_shared('bu_poweruser_different_domain', 'attach_interface')
+
+    def test_bu_poweruser_different_domain_different_user_detach_interface(self):
+        self.run_shared('bu_poweruser_different_domain', 'detach_interface')
+
+    def test_cloud_admin_leased_server(self):
+        # Pool servers outlive the test, so they go on a network that does
+        # too instead of one created by the scenario.
+        network_id = os.getenv('ROLETESTER_SERVER_POOL_NETWORK')
+        if not network_id:
+            self.skipTest("ROLETESTER_SERVER_POOL_NETWORK is not set.")
+        self.context['network_id'] = network_id
+        cloud_admin = self.km.find_user_credentials(
+            'Default', self.project, 'cloud-admin'
+        )
+
+        ServerLeaseFactory(cloud_admin) \
+            .set(ServerLeaseFactory.SERVER_LEASE,
+                 kwargs={'flavor': self.flavor}) \
             .produce() \
-            .run(context=self.context)
\ No newline at end of file
+            .run(context=self.context)
@@ -1,10 +1,16 @@
 from base import Base as BaseTestCase
 from roletester.actions.swift import swift_container_create
 from roletester.actions.swift import swift_container_delete
+from roletester.actions.swift import swift_container_empty
 from roletester.actions.swift import swift_container_add_metadata
 from roletester.actions.swift import swift_object_put
+from roletester.actions.swift import swift_object_put_many
+from roletester.actions.swift import swift_object_put_large
 from roletester.actions.swift import swift_object_delete
+from roletester.actions.swift import swift_object_delete_large
+from roletester.actions.swift import swift_object_delete_many
 from roletester.actions.swift import swift_object_get
+from roletester.actions.swift import swift_object_download
 from roletester.exc import SwiftClientException
 from roletester.scenario import ScenarioFactory as Factory
 from roletester.utils import randomname
@@ -70,10 +76,58 @@ class SwiftObjectCreateFactory(Factory):
     SWIFT_OBJECT_PUT = 1
 
 
+class SwiftBulkFactory(Factory):
+
+    _ACTIONS = [
+        swift_container_create,
+        swift_object_put_many,
+        swift_object_delete_many,
+        swift_container_empty,
+        swift_container_delete
+    ]
+
+    SWIFT_CONTAINER_CREATE = 0
+    SWIFT_OBJECT_PUT_MANY = 1
+    SWIFT_OBJECT_DELETE_MANY = 2
+    SWIFT_CONTAINER_EMPTY = 3
+    SWIFT_CONTAINER_DELETE = 4
+
+
+class SwiftLargeObjectFactory(Factory):
+
+    _ACTIONS = [
+        swift_container_create,
+        swift_object_put_large,
+        swift_object_download,
+        swift_object_delete_large,
+        swift_container_delete
+    ]
+
+    SWIFT_CONTAINER_CREATE = 0
+    SWIFT_OBJECT_PUT_LARGE = 1
+    SWIFT_OBJECT_DOWNLOAD = 2
+    SWIFT_OBJECT_DELETE_LARGE = 3
+    SWIFT_CONTAINER_DELETE = 4
+
+
 class TestSample(BaseTestCase):
 
     project = randomname()
 
+    CREDENTIALS = [
+        ('Default', project, 'bu-admin'),
+        ('Default', project, 'bu-brt'),
+        ('Default', project, 'bu-poweruser'),
+        ('Default', project, 'bu-user'),
+        ('Default', project, 'cirt'),
+        ('Default', project, 'cloud-admin'),
+        ('Default', project, 'cloud-support'),
+        ('Domain2', project, 'bu-admin'),
+        ('Domain2', project, 'bu-brt'),
+        ('Domain2', project, 'bu-poweruser'),
+        ('Domain2', project, 'cloud-support')
+    ]
+
     def test_cloud_admin_all(self):
         cloud_admin = self.km.find_user_credentials(
             'Default', self.project, 'cloud-admin'
@@ -90,6 +144,27 @@ class TestSample(BaseTestCase):
             .produce() \
             .run(context=self.context)
 
+    def test_cloud_admin_bulk(self):
+        cloud_admin = self.km.find_user_credentials(
+            'Default', self.project, 'cloud-admin'
+        )
+        SwiftBulkFactory(cloud_admin) \
+            .produce() \
+            .run(context=self.context)
+
+    def test_cloud_admin_large_object(self):
+        cloud_admin = self.km.find_user_credentials(
+            'Default', self.project, 'cloud-admin'
+        )
+        # 4 segments of 1 MiB.
+        large_object_kwargs = {'size': 4 * 1024 * 1024,
+                               'segment_size': 1024 * 1024}
+        SwiftLargeObjectFactory(cloud_admin) \
+            .set(SwiftLargeObjectFactory.SWIFT_OBJECT_PUT_LARGE,
+                 kwargs=large_object_kwargs) \
+            .produce() \
+            .run(context=self.context)
+
     def test_bu_admin_all(self):
         bu_admin = self.km.find_user_credentials(
             'Default', self.project, 'bu-admin'
@@ -121,6 +196,27 @@ class TestSample(BaseTestCase):
             .produce() \
             .run(context=self.context)
 
+    def test_bu_admin_bulk_different_domain(self):
+        creator = self.km.find_user_credentials(
+            'Default', self.project, 'bu-admin'
+        )
+        bu_admin = self.km.find_user_credentials(
+            'Domain2', self.project, 'bu-admin'
+        )
+        SwiftBulkFactory(bu_admin) \
+            .set(SwiftBulkFactory.SWIFT_CONTAINER_CREATE,
+                 clients=creator) \
+            .set(SwiftBulkFactory.SWIFT_OBJECT_PUT_MANY,
+                 clients=creator) \
+            .set(SwiftBulkFactory.SWIFT_OBJECT_DELETE_MANY,
+                 expected_exceptions=[SwiftClientException]) \
+            .set(SwiftBulkFactory.SWIFT_CONTAINER_EMPTY,
+                 expected_exceptions=[SwiftClientException]) \
+            .set(SwiftBulkFactory.SWIFT_CONTAINER_DELETE,
+                 expected_exceptions=[SwiftClientException]) \
+            .produce() \
+            .run(context=self.context)
+
     def test_bu_poweruser_all(self):
         bu_admin = self.km.find_user_credentials(
             'Default', self.project, 'bu-poweruser'
@@ -1,8 +1,14 @@
+import os
 import pprint
+from roletester import dag
+from roletester.context import Context
 from roletester.log import logging
 
 logger = logging.getLogger('roletester.scenario')
 
+# Number of links a scenario may run at the same time. 1 runs serially.
+_DEFAULT_WORKERS = int(os.getenv('ROLETESTER_WORKERS', 1))
+
 
 class ExpectedException(Exception):
     def __init__(self, expected_exceptions):
@@ -35,28 +41,51 @@ class Scenario(list):
         )
         return self
 
-    def run(self, context=None):
+    def run(self, context=None, workers=None):
         """Run the scenario
 
+        With more than one worker, links whose context keys do not overlap
+        run at the same time. See roletester.dag.
+
         :param context: Object that will be passed by reference to
             each action in the scenario.
-        :type context: Dict
+        :type context: roletester.context.Context|Dict
+        :param workers: Maximum number of links to run at once. Defaults to
+            the ROLETESTER_WORKERS environment variable or 1.
+        :type workers: Integer
         """
-        context = context if context is not None else {}
-        for action, clients, expected_exceptions, args, kwargs in self:
-            try:
-                action(clients, context, *args, **kwargs)
-                if expected_exceptions:
-                    raise ExpectedException(expected_exceptions)
-            except Exception as e:
-                matches = [isinstance(e, t) for t in expected_exceptions or []]
-                if not any(matches):
-                    logger.exception('Unexpected Exception!')
-                    logger.debug("Type: {}".format(type(e)))
-                    raise e
-                logger.debug("Found expected exception {}".format(type(e)))
+        context = context if context is not None else Context()
+        workers = workers if workers is not None else _DEFAULT_WORKERS
+        if workers > 1:
+            dag.run(self, context, self.run_link, workers)
+            return
+
+        for link in self:
+            self.run_link(link, context)
             logger.debug('Context: {}'.format(pprint.pprint(context)))
 
+    @staticmethod
+    def run_link(link, context):
+        """Run a single link, honoring its expected exceptions.
+
+        :param link: [action, clients, expected_exceptions, args, kwargs]
+        :type link: List
+        :param context: Scenario context
+        :type context: Dict
+        """
+        action, clients, expected_exceptions, args, kwargs = link
+        try:
+            action(clients, context, *args, **kwargs)
+            if expected_exceptions:
+                raise ExpectedException(expected_exceptions)
+        except Exception as e:
+            matches = [isinstance(e, t) for t in expected_exceptions or []]
+            if not any(matches):
+                logger.exception('Unexpected Exception!')
+                logger.debug("Type: {}".format(type(e)))
+                raise
+            logger.debug("Found expected exception {}".format(type(e)))
+
 
 class ScenarioFactory(object):
 
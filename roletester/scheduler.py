@@ -0,0 +1,219 @@
+"""Runs many scenarios while sharing their common prefixes.
+
+Most role tests boot the same network, subnet and server with the same
+clients before they get to the action being checked. The PrefixScheduler
+merges the scenarios of a test class into a trie of links, runs every
+shared prefix once and forks the context for each suffix that differs.
+
+A suffix that deletes or detaches a resource made by the shared prefix
+would break its siblings. Such suffixes run after the others, and only one
+of them keeps the shared resources; the rest replay the prefix in a fresh
+context.
+"""
+import sys
+
+from roletester import dag
+from roletester.context import Context
+from roletester.log import logging
+from roletester.scenario import Scenario
+
+logger = logging.getLogger('roletester.scheduler')
+
+# Action name prefixes that take away a resource other links may still use.
+_DESTRUCTIVE_PREFIXES = ('delete', 'detach', 'remove', 'disassociate',
+                         'revoke')
+
+
+def _same_link(a, b):
+    """Check if two links would do exactly the same thing.
+
+    :param a: [action, clients, expected_exceptions, args, kwargs]
+    :type a: List
+    :param b: [action, clients, expected_exceptions, args, kwargs]
+    :type b: List
+    :returns: Boolean
+    """
+    return (a[0] is b[0] and
+            a[1] is b[1] and
+            (a[2] or []) == (b[2] or []) and
+            tuple(a[3]) == tuple(b[3]) and
+            a[4] == b[4])
+
+
+def _fork(context):
+    """Copy a context for a branch.
+
+    Values are shared by reference. The branch gets its own empty garbage
+    stack so each resource is collected from the context that created it.
+
+    :param context: Context to fork
+    :type context: roletester.context.Context|Dict
+    :returns: roletester.context.Context
+    """
+    if isinstance(context, Context):
+        forked = context.fork()
+    else:
+        forked = Context(context)
+    forked['stack'] = []
+    return forked
+
+
+class _Node(object):
+    """A link in the trie and the branches that follow it."""
+
+    def __init__(self, link=None):
+        self.link = link
+        self.children = []
+        # Names of scenarios that end at this node.
+        self.ends = []
+
+    def child(self, link):
+        """Get or add the child node for a link."""
+        for node in self.children:
+            if _same_link(node.link, link):
+                return node
+        node = _Node(link)
+        self.children.append(node)
+        return node
+
+    def names(self):
+        """Names of every scenario in this subtree."""
+        names = list(self.ends)
+        for node in self.children:
+            names.extend(node.names())
+        return names
+
+    def destroys(self, shared_keys):
+        """Check if the subtree takes away any of the shared resources.
+
+        :param shared_keys: Context keys set by the shared prefix
+        :type shared_keys: Set
+        :returns: Boolean
+        """
+        action, _, expected_exceptions, _, _ = self.link
+        name = getattr(dag._unwrap(action), '__name__', '')
+        if name.startswith(_DESTRUCTIVE_PREFIXES) and not expected_exceptions:
+            contract = dag.contract(action)
+            if contract is None or contract.reads & shared_keys:
+                return True
+        return any(node.destroys(shared_keys) for node in self.children)
+
+
+class PrefixScheduler(object):
+
+    def __init__(self):
+        """Init an empty scheduler."""
+        self._root = _Node()
+        self._count = 0
+        # Every context used during the run, parents before children.
+        self.contexts = []
+
+    def add(self, scenario, name=None):
+        """Add a scenario to the trie.
+
+        :param scenario: Scenario to run
+        :type scenario: roletester.scenario.Scenario
+        :param name: Name used to report the result. Defaults to the
+            order in which the scenario was added.
+        :type name: String|Integer
+        :returns: Self for chaining
+        :rtype: PrefixScheduler
+        """
+        name = name if name is not None else self._count
+        self._count += 1
+        node = self._root
+        for link in scenario:
+            node = node.child(link)
+        node.ends.append(name)
+        return self
+
+    def run(self, context=None):
+        """Run every scenario, sharing common prefixes.
+
+        Pass self.contexts, reversed, to the garbage collector afterwards so
+        that branch resources are cleaned up before the prefix they used.
+
+        :param context: Starting context for every scenario
+        :type context: Dict
+        :returns: Map of scenario name to None on success or the
+            sys.exc_info() of the exception that failed it.
+        :rtype: Dict
+        """
+        context = context if context is not None else Context()
+        base = _fork(context)
+        self.contexts = [context]
+        results = {}
+        self._run_node(self._root, context, [], base, results)
+        return results
+
+    def _run_node(self, node, context, path, base, results):
+        """Run the branches below a node that has already run.
+
+        :param node: Node whose link has run in context
+        :type node: _Node
+        :param context: Context the node ran in
+        :type context: Dict
+        :param path: Links from the root to the node
+        :type path: List
+        :param base: Context as it was before any link ran
+        :type base: Dict
+        :param results: Results by scenario name
+        :type results: Dict
+        """
+        for name in node.ends:
+            results[name] = None
+
+        shared_keys = set()
+        for link in path:
+            contract = dag.contract(link[0])
+            if contract is not None:
+                shared_keys |= contract.writes
+
+        safe = []
+        destructive = []
+        for child in node.children:
+            if child.destroys(shared_keys):
+                destructive.append(child)
+            else:
+                safe.append(child)
+
+        for index, child in enumerate(safe + destructive):
+            replay = index > len(safe)
+            if replay:
+                branch = self._replay(path, base)
+                if isinstance(branch, tuple):
+                    for name in child.names():
+                        results[name] = branch
+                    continue
+            else:
+                branch = _fork(context)
+                self.contexts.append(branch)
+
+            try:
+                Scenario.run_link(child.link, branch)
+            except Exception:
+                exc_info = sys.exc_info()
+                for name in child.names():
+                    results[name] = exc_info
+                continue
+            self._run_node(child, branch, path + [child.link], base, results)
+
+    def _replay(self, path, base):
+        """Run the links of a prefix again in a fresh context.
+
+        :param path: Links of the prefix
+        :type path: List
+        :param base: Context as it was before any link ran
+        :type base: Dict
+        :returns: Dict|Tuple - the new context or the sys.exc_info() of the
+            exception that stopped the replay
+        """
+        logger.debug("Replaying {} shared links.".format(len(path)))
+        context = _fork(base)
+        self.contexts.append(context)
+        try:
+            for link in path:
+                Scenario.run_link(link, context)
+        except Exception:
+            return sys.exc_info()
+        return context
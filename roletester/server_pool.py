@@ -0,0 +1,241 @@
+"""Warm pools of ACTIVE servers for scenarios that only need one to exist.
+
+Booting a server and waiting for it to go ACTIVE is the slowest link of
+most scenarios. A ServerPool keeps ROLETESTER_SERVER_POOL_SIZE (default
+2) ACTIVE servers per project, network, flavor and image booted ahead of
+demand. lease() hands one out and boots its replacement in the
+background. A leased server belongs to whoever leased it; the server_lease
+action puts it on the context stack so the garbage collector deletes it.
+
+Each pool boots, checks and deletes its servers with a client manager it
+holds on to, so the users that lease from it may come and go. The owner
+has to outlive the pool: close the pools with close_all() before its user
+is deleted. close_all() waits for boots in flight and deletes every server
+that was never leased.
+"""
+import atexit
+import os
+import sys
+import threading
+import time
+
+from Queue import Empty
+from Queue import Queue
+from roletester import exc
+from roletester.actions.nova import server_create
+from roletester.actions.nova import server_delete
+from roletester.actions.nova import server_wait_for_status
+from roletester.clients import get_client_manager
+from roletester.clients import release_client_manager
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.server_pool')
+
+_DEFAULT_SIZE = int(os.getenv('ROLETESTER_SERVER_POOL_SIZE', 2))
+
+# Seconds a server gets to go ACTIVE.
+_BOOT_TIMEOUT = int(os.getenv('ROLETESTER_SERVER_POOL_TIMEOUT', 300))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ServerPool(object):
+
+    def __init__(self, owner, network_id, flavor=None, image_id=None,
+                 size=_DEFAULT_SIZE, name='roletester pool server'):
+        """Init the pool and start booting its servers.
+
+        :param owner: Client manager of the project the servers are booted
+            in. The pool holds a reference to it until it is closed.
+        :type owner: roletester.clients.ClientManager
+        :param network_id: Network the servers are attached to
+        :type network_id: String
+        :param flavor: Flavor id. The first flavor when None.
+        :type flavor: String
+        :param image_id: Image id
+        :type image_id: String
+        :param size: Number of servers kept ready
+        :type size: Integer
+        :param name: Name of the servers
+        :type name: String
+        """
+        self.network_id = network_id
+        self.flavor = flavor
+        self.image_id = image_id
+        self.size = size
+        self.name = name
+        self._clients = get_client_manager(**owner.auth_kwargs)
+        # Server ids, or the exc_info of a boot that failed.
+        self._ready = Queue()
+        self._booting = 0
+        self._closed = False
+        self._lock = threading.Condition()
+        self.leases = 0
+        self.waits = 0
+        self._fill()
+
+    def _fill(self):
+        """Boot servers until the pool is full again."""
+        with self._lock:
+            if self._closed:
+                return
+            missing = self.size - self._ready.qsize() - self._booting
+            self._booting += max(missing, 0)
+        for _ in range(missing):
+            thread = threading.Thread(target=self._boot)
+            thread.daemon = True
+            thread.start()
+
+    def _boot(self):
+        """Boot one server and add it to the pool once it is ACTIVE."""
+        context = {'network_id': self.network_id}
+        try:
+            server_create(self._clients, context, name=self.name,
+                          flavor=self.flavor, image=self.image_id)
+            server_wait_for_status(self._clients, context,
+                                   timeout=_BOOT_TIMEOUT)
+            if 'server_status' in context:
+                raise Exception("Server {} is {} after {}s".format(
+                    context['server_id'], context['server_status'],
+                    _BOOT_TIMEOUT))
+            item = (context['server_id'], None)
+        except Exception:
+            logger.exception("Unable to boot a pool server.")
+            if 'server_id' in context:
+                self._delete(context['server_id'])
+            item = (None, sys.exc_info())
+        with self._lock:
+            if item[0] is None or not self._closed:
+                self._ready.put(item)
+                item = None
+        if item is not None:
+            # Closed while it booted.
+            self._delete(item[0])
+        with self._lock:
+            self._booting -= 1
+            self._lock.notify_all()
+
+    def _delete(self, server_id):
+        """Delete a server, ignoring that it is already gone."""
+        try:
+            server_delete(self._clients, {'server_id': server_id})
+        except exc.NovaNotFound:
+            pass
+        except Exception:
+            logger.exception("Unable to delete pool server {}"
+                             .format(server_id))
+
+    def lease(self, timeout=_BOOT_TIMEOUT):
+        """Take an ACTIVE server out of the pool.
+
+        :param timeout: Seconds to wait for a server when none is ready
+        :type timeout: Integer
+        :returns: String server id
+        """
+        deadline = time.time() + timeout
+        while True:
+            self._fill()
+            if self._ready.empty():
+                self.waits += 1
+            try:
+                server_id, exc_info = self._ready.get(
+                    timeout=max(deadline - time.time(), 0))
+            except Empty:
+                raise Exception("No pool server became ACTIVE in {}s"
+                                .format(timeout))
+            if exc_info is not None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            # It may have been deleted or broken while it waited.
+            try:
+                server = self._clients.get_nova().servers.get(server_id)
+                status = server.status
+            except exc.NovaNotFound:
+                status = None
+            if status == 'ACTIVE':
+                break
+            logger.info("Pool server {} is {}, dropping it."
+                        .format(server_id, status))
+            if status is not None:
+                self._delete(server_id)
+        self._fill()
+        self.leases += 1
+        return server_id
+
+    def close(self):
+        """Stop refilling and delete the servers that were never leased.
+
+        Waits up to the boot timeout for boots in flight, which delete
+        their server themselves once the pool is closed.
+        """
+        deadline = time.time() + _BOOT_TIMEOUT
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while self._booting and time.time() < deadline:
+                self._lock.wait(deadline - time.time())
+            if self._booting:
+                logger.warn("{} pool servers still booting after {}s"
+                            .format(self._booting, _BOOT_TIMEOUT))
+        while True:
+            try:
+                server_id, _ = self._ready.get_nowait()
+            except Empty:
+                break
+            if server_id is not None:
+                self._delete(server_id)
+        release_client_manager(self._clients)
+
+
+def _project_key(auth_kwargs):
+    """Identify the project of a set of auth kwargs.
+
+    :param auth_kwargs: v3.Password kwargs
+    :type auth_kwargs: Dict
+    :returns: Tuple
+    """
+    return (auth_kwargs.get('auth_url'),
+            auth_kwargs.get('project_id') or auth_kwargs.get('project_name'),
+            auth_kwargs.get('project_domain_id') or
+            auth_kwargs.get('project_domain_name'))
+
+
+def get_pool(clients, network_id, flavor=None, image_id=None, size=None,
+             owner=None):
+    """Get the pool for a project, network, flavor and image.
+
+    :param clients: Client manager of the project the servers are for
+    :type clients: roletester.clients.ClientManager
+    :param network_id: Network the servers are attached to
+    :type network_id: String
+    :param flavor: Flavor id. The first flavor when None.
+    :type flavor: String
+    :param image_id: Image id
+    :type image_id: String
+    :param size: Number of servers kept ready. Defaults to
+        $ROLETESTER_SERVER_POOL_SIZE or 2.
+    :type size: Integer
+    :param owner: Client manager a new pool boots and deletes its servers
+        with. Defaults to clients. It must be in the same project.
+    :type owner: roletester.clients.ClientManager
+    :returns: ServerPool
+    """
+    key = (_project_key(clients.auth_kwargs), network_id, flavor, image_id)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ServerPool(
+                owner or clients, network_id, flavor, image_id,
+                size=size or _DEFAULT_SIZE)
+        return pool
+
+
+@atexit.register
+def close_all():
+    """Close every pool, deleting the servers that were never leased."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
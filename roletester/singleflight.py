@@ -0,0 +1,141 @@
+"""Coalescing of identical in-flight GET requests.
+
+Concurrent scenarios often ask for the same thing at the same moment, e.g.
+every waiter polling a shared fixture server or every grant listing the
+roles. A CoalescingSession runs a GET that is already in flight with the
+same url, parameters and headers only once and hands its response, or its
+exception, to every caller that asked for it meanwhile. Requests that are
+not idempotent, stream their body or bring their own auth are always sent.
+
+Responses are shared and should be treated as read-only. Set
+ROLETESTER_COALESCE=0 to send every request.
+"""
+import os
+import sys
+import threading
+import six
+
+from keystoneauth1 import session
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.singleflight')
+
+ENABLED = os.getenv('ROLETESTER_COALESCE', '1') != '0'
+
+_IDEMPOTENT = ('GET', 'HEAD')
+
+# Request kwargs that do not change what is sent.
+_IGNORED_KWARGS = ('logger', 'rate_semaphore', 'log')
+
+
+class _Call(object):
+    """A request in flight and the callers waiting for it."""
+
+    __slots__ = ('event', 'result', 'exc_info', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.exc_info = None
+        self.waiters = 0
+
+
+class Group(object):
+    """Runs each key once at a time, sharing the outcome with callers."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hits = 0
+
+    def do(self, key, fn):
+        """Run fn, or wait for the run of the same key in flight.
+
+        :param key: Hashable identity of the call
+        :type key: Object
+        :param fn: Callable without arguments
+        :type fn: Function
+        :returns: Whatever fn returns
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.hits += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                leader = True
+        if leader:
+            try:
+                call.result = fn()
+            except Exception:
+                call.exc_info = sys.exc_info()
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+        else:
+            call.event.wait()
+        if call.exc_info is not None:
+            six.reraise(*call.exc_info)
+        return call.result
+
+    def stats(self):
+        """Get the number of calls run and of calls served by another.
+
+        :returns: Dict
+        """
+        with self._lock:
+            return {'calls': self.calls, 'hits': self.hits}
+
+
+def _freeze(value):
+    """Turn request kwargs into something hashable and order independent."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def request_key(url, method, kwargs):
+    """Get the coalescing key of a request.
+
+    :param url: Request url or path
+    :type url: String
+    :param method: HTTP method
+    :type method: String
+    :param kwargs: Other Session.request kwargs
+    :type kwargs: Dict
+    :returns: Tuple or None when the request must always be sent
+    """
+    if method.upper() not in _IDEMPOTENT:
+        return None
+    if kwargs.get('stream') or kwargs.get('auth') or \
+            kwargs.get('requests_auth'):
+        return None
+    return (method.upper(), url, _freeze(
+        dict((k, v) for k, v in kwargs.items() if k not in _IGNORED_KWARGS)
+    ))
+
+
+class CoalescingSession(session.Session):
+    """Keystone session that coalesces identical in-flight GETs."""
+
+    def __init__(self, *args, **kwargs):
+        super(CoalescingSession, self).__init__(*args, **kwargs)
+        self.coalescer = Group()
+
+    def request(self, url, method, **kwargs):
+        parent = super(CoalescingSession, self).request
+        key = request_key(url, method, kwargs) if ENABLED else None
+        if key is None:
+            return parent(url, method, **kwargs)
+        return self.coalescer.do(key, lambda: parent(url, method, **kwargs))
@@ -0,0 +1,101 @@
+"""Measures the import cost of roletester modules and client libraries.
+
+Every measurement imports a module in a fresh interpreter, so nothing is
+already cached in sys.modules. Alongside the time, the client libraries
+the import pulled in are listed.
+
+Run with:
+
+    python -m roletester.startup_benchmark [--repeat N] [--json FILE]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+# Modules most test processes import first.
+MODULES = [
+    'roletester.exc',
+    'roletester.clients',
+    'roletester.keystone_manager',
+    'roletester.garbage',
+    'roletester.actions.swift'
+]
+
+_CLIENT_LIBRARIES = ['cinderclient', 'glanceclient', 'keystoneclient',
+                     'neutronclient', 'novaclient', 'swiftclient']
+
+_PROBE = """
+import json, sys, time
+start = time.time()
+{statement}
+seconds = time.time() - start
+libraries = [name for name in {libraries!r} if name in sys.modules]
+print(json.dumps({{'seconds': seconds, 'libraries': libraries}}))
+"""
+
+
+def measure(statement, repeat=5):
+    """Time a statement in fresh interpreters.
+
+    :param statement: Python statement to time, usually an import
+    :type statement: String
+    :param repeat: Number of interpreters to time it in
+    :type repeat: Integer
+    :returns: Dict with the best seconds and the client libraries loaded
+    """
+    probe = _PROBE.format(statement=statement, libraries=_CLIENT_LIBRARIES)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', probe])
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(runs, key=lambda run: run['seconds'])
+    return {'seconds': best['seconds'], 'libraries': best['libraries']}
+
+
+def run(repeat=5):
+    """Measure every module and every service client library.
+
+    :param repeat: Number of interpreters to time each import in
+    :type repeat: Integer
+    :returns: List of (name, result) tuples
+    """
+    results = []
+    for module in MODULES:
+        results.append(
+            (module, measure('import {}'.format(module), repeat))
+        )
+    from roletester.clients import SERVICES
+    for service in sorted(SERVICES):
+        statement = (
+            'from roletester.clients import load_service; '
+            'load_service({!r})'.format(service)
+        )
+        results.append(
+            ('load_service({!r})'.format(service),
+             measure(statement, repeat))
+        )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Interpreters to time each import in")
+    parser.add_argument('--json', type=str, default=None,
+                        help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat)
+    print('{:<40} {:>10}  {}'.format('import', 'best (ms)', 'libraries'))
+    for name, result in results:
+        print('{:<40} {:>10.1f}  {}'.format(
+            name, result['seconds'] * 1000,
+            ', '.join(result['libraries']) or '-'))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(dict(results), f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
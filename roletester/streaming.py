@@ -0,0 +1,348 @@
+"""Large payloads without holding them in memory.
+
+put_large() uploads a payload as segments of a static (SLO) or dynamic
+(DLO) large object. Segments are read one after another from a file, a
+file-like object or an iterable of strings and PUT concurrently, with at
+most one segment per worker in memory. get_hashed() streams an object
+back, hashing and discarding every chunk as it arrives. delete_large()
+removes a large object together with its segments.
+
+Both return the bytes moved, the seconds taken and the throughput, so they
+can be timed against a local swift stand-in as well as a real cluster.
+
+HashingReader reads a file in fixed size chunks for clients that take a
+file-like body, e.g. glance image uploads, and hashes it on the way.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+from roletester import exc
+from roletester import swift_bulk
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.streaming')
+
+_DEFAULT_WORKERS = int(os.getenv('ROLETESTER_SWIFT_WORKERS', 8))
+
+SEGMENT_SIZE = 16 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+def segments_container(container):
+    """Get the container the segments of a container's objects go in.
+
+    :param container: Container of the manifest
+    :type container: String
+    :returns: String
+    """
+    return '{}_segments'.format(container)
+
+
+def payload(size, chunk_size=CHUNK_SIZE):
+    """Generate size bytes of test data a chunk at a time.
+
+    :param size: Bytes to generate
+    :type size: Integer
+    :param chunk_size: Bytes per chunk
+    :type chunk_size: Integer
+    :returns: Generator of strings
+    """
+    block = os.urandom(chunk_size)
+    sent = 0
+    while sent < size:
+        chunk = block[:min(chunk_size, size - sent)]
+        sent += len(chunk)
+        yield chunk
+
+
+class _Reader(object):
+    """Reads fixed size pieces from a path, file or iterable of strings."""
+
+    def __init__(self, source):
+        self._file = None
+        self._iter = None
+        self._buffer = ''
+        if isinstance(source, basestring):
+            self._file = self._opened = open(source, 'rb')
+        elif hasattr(source, 'read'):
+            self._file = source
+            self._opened = None
+        else:
+            self._iter = iter(source)
+            self._opened = None
+
+    def read(self, size):
+        """Read up to size bytes, fewer only at the end of the source.
+
+        :param size: Bytes to read
+        :type size: Integer
+        :returns: String
+        """
+        if self._file is not None:
+            return self._file.read(size)
+        pieces = [self._buffer]
+        have = len(self._buffer)
+        while have < size:
+            try:
+                chunk = next(self._iter)
+            except StopIteration:
+                break
+            pieces.append(chunk)
+            have += len(chunk)
+        data = ''.join(pieces)
+        self._buffer = data[size:]
+        return data[:size]
+
+    def close(self):
+        """Close the file when it was opened from a path."""
+        if self._opened is not None:
+            self._opened.close()
+
+
+class HashingReader(object):
+    """Reads a file in fixed size chunks, hashing what is read.
+
+    Use it as a context manager so the file is closed however the upload
+    ends.
+    """
+
+    def __init__(self, path, algorithms=('md5', 'sha256'),
+                 chunk_size=CHUNK_SIZE):
+        """Open the file.
+
+        :param path: File to read
+        :type path: String
+        :param algorithms: hashlib algorithms to hash the file with
+        :type algorithms: Tuple
+        :param chunk_size: Most bytes returned by one read
+        :type chunk_size: Integer
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.size = 0
+        self._hashes = dict((name, hashlib.new(name)) for name in algorithms)
+        self._file = open(path, 'rb')
+        self._start = time.time()
+
+    def read(self, size=-1):
+        """Read the next chunk, at most chunk_size bytes.
+
+        :param size: Most bytes to read
+        :type size: Integer
+        :returns: String, empty at the end of the file
+        """
+        if size is None or size < 0 or size > self.chunk_size:
+            size = self.chunk_size
+        data = self._file.read(size)
+        for hash_ in self._hashes.values():
+            hash_.update(data)
+        self.size += len(data)
+        return data
+
+    def __iter__(self):
+        return iter(lambda: self.read(self.chunk_size), '')
+
+    def hexdigests(self):
+        """Get the hashes of what was read so far.
+
+        :returns: Dict of algorithm to hex digest
+        """
+        return dict((name, hash_.hexdigest())
+                    for name, hash_ in self._hashes.items())
+
+    def result(self):
+        """Get the bytes read, the seconds taken and the throughput.
+
+        :returns: Dict
+        """
+        return _result(self.size, self._start, **self.hexdigests())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _result(size, start, **extra):
+    """Build a transfer result."""
+    seconds = time.time() - start
+    result = {'bytes': size,
+              'seconds': seconds,
+              'bytes_per_second': size / seconds if seconds else 0.0}
+    result.update(extra)
+    return result
+
+
+def put_large(clients, container, name, source, segment_size=SEGMENT_SIZE,
+              manifest='slo', workers=None):
+    """Upload a payload as a segmented large object.
+
+    Segments go to segments_container(container) under name/<index>.
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param container: Container of the manifest
+    :type container: String
+    :param name: Object name of the manifest
+    :type name: String
+    :param source: Path, file-like object or iterable of strings
+    :type source: Object
+    :param segment_size: Bytes per segment
+    :type segment_size: Integer
+    :param manifest: slo or dlo
+    :type manifest: String
+    :param workers: Maximum number of segments to PUT at once
+    :type workers: Integer
+    :returns: Dict with bytes, seconds, bytes_per_second and segments
+    """
+    if manifest not in ('slo', 'dlo'):
+        raise ValueError("manifest must be either `slo` or `dlo`.")
+    workers = max(1, workers or _DEFAULT_WORKERS)
+    segments = segments_container(container)
+    clients.get_swift().put_container(segments)
+
+    connections = Queue()
+    for _ in range(workers):
+        connections.put(clients.new_swift())
+    # A segment is only read once a worker is free to send it, which
+    # bounds memory to one segment per worker.
+    free = threading.Semaphore(workers)
+    failed = []
+
+    def put_segment(index, data):
+        swift = connections.get()
+        try:
+            path = '{}/{:08d}'.format(name, index)
+            etag = swift.put_object(segments, path, data)
+            return {'path': '/{}/{}'.format(segments, path),
+                    'etag': etag,
+                    'size_bytes': len(data)}
+        except Exception:
+            failed.append(index)
+            raise
+        finally:
+            connections.put(swift)
+            free.release()
+
+    start = time.time()
+    reader = _Reader(source)
+    pool = ThreadPool(processes=workers)
+    pending = []
+    size = 0
+    try:
+        while not failed:
+            free.acquire()
+            data = reader.read(segment_size)
+            if not data:
+                free.release()
+                break
+            size += len(data)
+            pending.append(
+                pool.apply_async(put_segment, (len(pending), data))
+            )
+            del data
+        entries = [result.get() for result in pending]
+    finally:
+        reader.close()
+        pool.close()
+        pool.join()
+
+    swift = clients.get_swift()
+    if manifest == 'slo':
+        swift.put_object(container, name, json.dumps(entries),
+                         query_string='multipart-manifest=put')
+    else:
+        swift.put_object(container, name, '', headers={
+            'X-Object-Manifest': '{}/{}/'.format(segments, name)
+        })
+    result = _result(size, start, segments=len(entries))
+    logger.debug("Uploaded {} in {} segments at {:.0f} B/s".format(
+        name, len(entries), result['bytes_per_second']))
+    return result
+
+
+def get_hashed(clients, container, name, chunk_size=CHUNK_SIZE):
+    """Stream an object, hashing and discarding it chunk by chunk.
+
+    The md5 is checked against the etag of objects that are not large
+    object manifests, whose etag is not the md5 of their content.
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param container: Container name
+    :type container: String
+    :param name: Object name
+    :type name: String
+    :param chunk_size: Bytes read at a time
+    :type chunk_size: Integer
+    :returns: Dict with bytes, seconds, bytes_per_second and md5
+    """
+    start = time.time()
+    headers, body = clients.get_swift().get_object(
+        container, name, resp_chunk_size=chunk_size)
+    md5 = hashlib.md5()
+    size = 0
+    for chunk in body:
+        md5.update(chunk)
+        size += len(chunk)
+    checksum = md5.hexdigest()
+    manifest = ('x-static-large-object' in headers or
+                'x-object-manifest' in headers)
+    etag = headers.get('etag', '').strip('"')
+    if not manifest and etag and etag != checksum:
+        raise ValueError("Object {} has md5 {} but etag {}"
+                         .format(name, checksum, etag))
+    result = _result(size, start, md5=checksum)
+    logger.debug("Downloaded {} at {:.0f} B/s".format(
+        name, result['bytes_per_second']))
+    return result
+
+
+def delete_large(clients, container, name, workers=None):
+    """Delete a large object and its segments.
+
+    A static large object is deleted with multipart-manifest=delete, which
+    makes swift delete its segments. The segments of a dynamic large
+    object are listed by the manifest prefix and deleted after it. The
+    segments container is deleted too once nothing else is left in it.
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param container: Container of the manifest
+    :type container: String
+    :param name: Object name of the manifest
+    :type name: String
+    :param workers: Maximum number of segment deletes to run at once
+        without bulk delete
+    :type workers: Integer
+    """
+    swift = clients.get_swift()
+    headers = swift.head_object(container, name)
+    segments = segments_container(container)
+    if 'x-static-large-object' in headers:
+        swift.delete_object(container, name,
+                            query_string='multipart-manifest=delete')
+    else:
+        swift.delete_object(container, name)
+        if 'x-object-manifest' in headers:
+            segments, _, prefix = headers['x-object-manifest'].partition('/')
+            _, objects = swift.get_container(segments, prefix=prefix,
+                                             full_listing=True)
+            swift_bulk.delete_many(clients, segments,
+                                   [obj['name'] for obj in objects], workers,
+                                   missing_ok=True)
+    try:
+        swift.delete_container(segments)
+    except exc.SwiftClientException as e:
+        # 409 - other large objects still have segments in it.
+        if e.http_status not in (404, 409):
+            raise
@@ -0,0 +1,190 @@
+"""Bulk and concurrent swift object operations.
+
+Objects are uploaded concurrently, each worker on a swift connection of
+its own that shares the client manager's connection pool. Deletes go
+through the bulk delete middleware when the cluster advertises it in
+/info, in as few requests as its max_deletes_per_request allows, and fall
+back to concurrent single deletes otherwise. Objects that are already
+gone are an error unless the caller allows it: a 404 is what a user of
+another domain gets for someone else's objects, so only cleanup ignores
+it.
+
+ROLETESTER_SWIFT_WORKERS sets the default number of workers (8).
+"""
+import os
+import urllib
+
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+from keystoneauth1 import exceptions as ks_exceptions
+from roletester import exc
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.swift_bulk')
+
+_DEFAULT_WORKERS = int(os.getenv('ROLETESTER_SWIFT_WORKERS', 8))
+
+
+def _concurrently(clients, func, items, workers=None):
+    """Call func(swift, item) for every item on a pool of connections.
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param func: Callable taking a swift connection and an item
+    :type func: Function
+    :param items: Items to call func with
+    :type items: List
+    :param workers: Maximum number of calls to run at once
+    :type workers: Integer
+    :returns: List of results, in the order of items
+    """
+    if not items:
+        return []
+    workers = max(1, min(workers or _DEFAULT_WORKERS, len(items)))
+    connections = Queue()
+    for _ in range(workers):
+        connections.put(clients.new_swift())
+
+    def call(item):
+        swift = connections.get()
+        try:
+            return func(swift, item)
+        finally:
+            connections.put(swift)
+
+    pool = ThreadPool(processes=workers)
+    try:
+        return pool.map(call, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def put_many(clients, container, objects, workers=None):
+    """Upload objects into a container concurrently.
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param container: Container name
+    :type container: String
+    :param objects: List of (name, contents) tuples
+    :type objects: List
+    :param workers: Maximum number of uploads to run at once
+    :type workers: Integer
+    :returns: List of object names
+    """
+    def put(swift, item):
+        swift.put_object(container, item[0], item[1])
+        return item[0]
+
+    return _concurrently(clients, put, list(objects), workers)
+
+
+def bulk_delete_limit(clients):
+    """Get the most objects one bulk delete request may name.
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :returns: Integer, 0 when bulk delete is not available
+    """
+    def load():
+        try:
+            info = clients.get_swift().get_capabilities()
+        except exc.SwiftClientException:
+            logger.debug("Unable to read swift capabilities.")
+            return 0
+        return info.get('bulk_delete', {}).get('max_deletes_per_request', 0)
+
+    return clients.cache.get('capabilities', 'swift_bulk_delete', load)
+
+
+def _bulk_delete(swift, container, names, missing_ok=False):
+    """Delete objects with one bulk delete request.
+
+    :param swift: Swift connection
+    :type swift: swiftclient.client.Connection
+    :param container: Container name
+    :type container: String
+    :param names: Object names
+    :type names: List
+    :param missing_ok: Ignore objects that are already gone
+    :type missing_ok: Boolean
+    :returns: Dict, the bulk delete response
+    """
+    url, _ = swift.get_auth()
+    body = '\n'.join(
+        urllib.quote(u'/{}/{}'.format(container, name).encode('utf-8'))
+        for name in names
+    )
+    try:
+        resp = swift.session.request(
+            '{}?bulk-delete'.format(url), 'DELETE', data=body,
+            headers={'Content-Type': 'text/plain',
+                     'Accept': 'application/json'}
+        )
+    except ks_exceptions.HttpError as e:
+        raise exc.SwiftClientException(e.message, http_status=e.http_status)
+    result = resp.json()
+    errors = [(path, status) for path, status in result.get('Errors', [])
+              if not (missing_ok and status.startswith('404'))]
+    if errors:
+        raise exc.SwiftClientException(
+            "Bulk delete failed for {}".format(errors),
+            http_status=int(errors[0][1].split()[0])
+        )
+    return result
+
+
+def delete_many(clients, container, names, workers=None, missing_ok=False):
+    """Delete objects from a container.
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param container: Container name
+    :type container: String
+    :param names: Object names
+    :type names: List
+    :param workers: Maximum number of deletes to run at once without bulk
+        delete
+    :type workers: Integer
+    :param missing_ok: Ignore objects that are already gone
+    :type missing_ok: Boolean
+    """
+    names = list(names)
+    limit = bulk_delete_limit(clients) if len(names) > 1 else 0
+    if limit:
+        swift = clients.get_swift()
+        for start in range(0, len(names), limit):
+            _bulk_delete(swift, container, names[start:start + limit],
+                         missing_ok)
+        return
+
+    def delete(swift, name):
+        try:
+            swift.delete_object(container, name)
+        except exc.SwiftClientException as e:
+            if not (missing_ok and e.http_status == 404):
+                raise
+
+    _concurrently(clients, delete, names, workers)
+
+
+def empty(clients, container, workers=None):
+    """Delete every object in a container.
+
+    Objects deleted by someone else after the listing are ignored.
+
+    :param clients: Client Manager
+    :type clients: roletester.clients.ClientManager
+    :param container: Container name
+    :type container: String
+    :param workers: Maximum number of deletes to run at once without bulk
+        delete
+    :type workers: Integer
+    :returns: List of the deleted object names
+    """
+    _, objects = clients.get_swift().get_container(container,
+                                                   full_listing=True)
+    names = [obj['name'] for obj in objects]
+    delete_many(clients, container, names, workers, missing_ok=True)
+    return names
@@ -1,24 +1,24 @@
-from swiftclient.client import ClientException as SwiftClientException
-from swift_exceptions import SwiftNotAuthorized
-from swift_exceptions import SwiftNotFoundException
-from swift_exceptions import SwiftForbidden
+import functools
+from roletester import exc
 
 
 def swift_error(swift_function):
+    @functools.wraps(swift_function)
     def wrapper(*args, **kwargs):
         try:
 
             result = swift_function(*args, **kwargs)
             return result
-        except SwiftClientException as exception:
+        except exc.SwiftClientException as exception:
             if exception.http_status == 404:
-                raise SwiftNotFoundException(exception)
+                raise exc.SwiftNotFoundException(exception)
             if exception.http_status == 401:
-                raise SwiftNotAuthorized(exception)
+                raise exc.SwiftNotAuthorized(exception)
             if exception.http_status == 403:
-                raise SwiftForbidden(exception)
+                raise exc.SwiftForbidden(exception)
             else:
                 raise
 
+    wrapper.__wrapped__ = swift_function
     return wrapper
 
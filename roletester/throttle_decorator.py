@@ -1,16 +1,143 @@
+"""Token bucket rate limiting for calls against openstack services.
+
+Each named bucket refills at a sustained rate up to a burst size. A call
+takes one token and blocks only while the bucket is empty. Buckets are
+configured with configure() or the ROLETESTER_THROTTLE_<NAME> environment
+variable, formatted as "rate,burst" with rate in calls per second.
+"""
+import functools
+import os
+import threading
 import time
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.throttle_decorator')
+
+# Default (rate, burst) per bucket name. Rate is calls per second.
+_DEFAULTS = {
+    'default': (1.0 / 5, 1),
+    'keystone': (1.0 / 5, 5)
+}
+
+_BUCKETS = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+class TokenBucket(object):
+
+    def __init__(self, name, rate, burst):
+        """Init a full bucket.
+
+        :param name: Bucket name, used for logging
+        :type name: String
+        :param rate: Sustained calls per second
+        :type rate: Float
+        :param burst: Maximum calls allowed back to back
+        :type burst: Integer
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1.")
+        self.name = name
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.time()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.blocked_seconds = 0.0
+
+    def _refill(self, now):
+        elapsed = max(now - self._updated, 0)
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Take a token, sleeping until one is available.
+
+        Callers are served in the order they reserve tokens; a caller that
+        finds the bucket empty reserves its token and sleeps outside the
+        lock until it is due.
+
+        :returns: Seconds spent blocked
+        :rtype: Float
+        """
+        with self._lock:
+            self._refill(time.time())
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.acquired += 1
+            self.blocked_seconds += wait
+        if wait:
+            logger.debug(
+                "Throttling {}: blocked {:.2f}s".format(self.name, wait)
+            )
+            time.sleep(wait)
+        return wait
+
+    def stats(self):
+        """Get usage statistics.
+
+        :returns: Dict with acquired calls and seconds spent blocked
+        """
+        with self._lock:
+            return {'acquired': self.acquired,
+                    'blocked_seconds': self.blocked_seconds}
+
+
+def configure(name, rate, burst):
+    """Set the rate and burst of a bucket, replacing any existing bucket.
+
+    :param name: Bucket name, usually a service or endpoint
+    :type name: String
+    :param rate: Sustained calls per second
+    :type rate: Float
+    :param burst: Maximum calls allowed back to back
+    :type burst: Integer
+    :returns: TokenBucket
+    """
+    bucket = TokenBucket(name, rate, burst)
+    with _BUCKETS_LOCK:
+        _BUCKETS[name] = bucket
+    return bucket
+
+
+def get_bucket(name='default'):
+    """Get a bucket by name, creating it from its defaults if needed.
+
+    :param name: Bucket name
+    :type name: String
+    :returns: TokenBucket
+    """
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(name)
+        if bucket is None:
+            rate, burst = _DEFAULTS.get(name, _DEFAULTS['default'])
+            setting = os.getenv('ROLETESTER_THROTTLE_{}'.format(name.upper()))
+            if setting:
+                rate, burst = setting.split(',')
+                rate, burst = float(rate), int(burst)
+            bucket = _BUCKETS[name] = TokenBucket(name, rate, burst)
+        return bucket
+
+
+def throttled(some_function=None, bucket='default'):
+    """Rate limit a function with a token bucket.
+
+    Use as @throttled or @throttled(bucket='keystone').
+
+    :param some_function: Function to wrap
+    :type some_function: Function
+    :param bucket: Name of the bucket to take tokens from
+    :type bucket: String
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            get_bucket(bucket).acquire()
+            return function(*args, **kwargs)
+        wrapper.__wrapped__ = function
+        return wrapper
 
-# Interval in seconds
-_LAST_RUN = 0
-_INTERVAL = 5
-_BETWEEN = 5
-
-def throttled(some_function):
-    def wrapper(*args, **kwargs):
-        global _LAST_RUN
-        while time.time() - _LAST_RUN < _BETWEEN:
-            time.sleep(_INTERVAL)
-        result = some_function(*args, **kwargs)
-        _LAST_RUN = time.time()
-        return result
-    return wrapper
+    if some_function is not None:
+        return decorator(some_function)
+    return decorator
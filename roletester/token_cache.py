@@ -0,0 +1,267 @@
+"""Keystone tokens shared between ClientManagers and between runs.
+
+Tokens are keyed by auth url, user, user domain and scope target, plus a
+digest of the password so a user recreated under the same name does not
+pick up a stale token. Cached tokens are kept in memory and, when
+ROLETESTER_TOKEN_CACHE names a file, on disk for later runs. A token is
+only reused while it has more than ROLETESTER_TOKEN_MARGIN seconds
+(default 300) left.
+
+A scope the user has no token for yet can be had by rescoping a token
+held for another scope (RescopedToken) instead of sending the password
+again. stats() counts the round trips made to keystone for tokens.
+
+The cache file holds bearer tokens and is created readable by its owner
+only.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from keystoneauth1 import access
+from keystoneauth1 import exceptions
+from keystoneauth1.identity import v3
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.token_cache')
+
+_MARGIN = int(os.getenv('ROLETESTER_TOKEN_MARGIN', 300))
+
+# v3.Password kwargs that pick the scope of a token.
+_SCOPE_KWARGS = ('project_id', 'project_name', 'project_domain_id',
+                 'project_domain_name', 'domain_id', 'domain_name')
+
+_cache = None
+_cache_lock = threading.Lock()
+
+_round_trips = [0]
+_round_trips_lock = threading.Lock()
+
+
+def cache_key(auth_kwargs):
+    """Builds the cache key of a set of password auth kwargs.
+
+    :param auth_kwargs: v3.Password kwargs
+    :type auth_kwargs: Dict
+    :returns: String
+    """
+    if auth_kwargs.get('project_name') or auth_kwargs.get('project_id'):
+        target = 'project:{}@{}'.format(
+            auth_kwargs.get('project_id') or auth_kwargs.get('project_name'),
+            auth_kwargs.get('project_domain_id') or
+            auth_kwargs.get('project_domain_name')
+        )
+    elif auth_kwargs.get('domain_id') or auth_kwargs.get('domain_name'):
+        target = 'domain:{}'.format(
+            auth_kwargs.get('domain_id') or auth_kwargs.get('domain_name')
+        )
+    else:
+        target = 'unscoped'
+    key = [
+        auth_kwargs.get('auth_url'),
+        auth_kwargs.get('user_id') or auth_kwargs.get('username'),
+        auth_kwargs.get('user_domain_id') or
+        auth_kwargs.get('user_domain_name'),
+        target,
+        hashlib.sha256(auth_kwargs.get('password') or '').hexdigest()
+    ]
+    return hashlib.sha256('|'.join(['%s' % x for x in key])).hexdigest()
+
+
+class TokenCache(object):
+
+    def __init__(self, path=None, margin=_MARGIN):
+        """Init the cache.
+
+        :param path: File to persist tokens in. Memory only when None.
+        :type path: String
+        :param margin: Seconds of life a token needs left to be reused
+        :type margin: Integer
+        """
+        self.path = path
+        self.margin = margin
+        self._states = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _read(self):
+        """Read the cached auth states from disk.
+
+        :returns: Dict of key to auth state
+        """
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            logger.warn("Ignoring unreadable token cache {}"
+                        .format(self.path))
+            return {}
+
+    def _write(self):
+        """Write the cached auth states to disk, merged with what is there.
+
+        Called with the lock held.
+        """
+        states = self._read()
+        states.update(self._states)
+        states = dict(
+            (k, v) for k, v in states.items() if self._valid(v)
+        )
+        tmp = '{}.{}'.format(self.path, os.getpid())
+        fd = os.open(tmp, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(states, f)
+        os.rename(tmp, self.path)
+
+    def _valid(self, state):
+        """Check that a token has more than the margin left.
+
+        :param state: Auth state from get_auth_state()
+        :type state: String
+        :returns: Boolean
+        """
+        try:
+            data = json.loads(state)
+            auth_ref = access.create(body=data['body'],
+                                     auth_token=data['auth_token'])
+            return not auth_ref.will_expire_soon(self.margin)
+        except Exception:
+            return False
+
+    def get(self, key):
+        """Get a usable auth state.
+
+        :param key: Key from cache_key()
+        :type key: String
+        :returns: String auth state or None
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._read().get(key)
+            if state is not None and not self._valid(state):
+                self._states.pop(key, None)
+                state = None
+            if state is None:
+                self.misses += 1
+            else:
+                self._states[key] = state
+                self.hits += 1
+            return state
+
+    def put(self, key, state):
+        """Store an auth state.
+
+        :param key: Key from cache_key()
+        :type key: String
+        :param state: Auth state from get_auth_state()
+        :type state: String
+        """
+        with self._lock:
+            self._states[key] = state
+            if self.path:
+                try:
+                    self._write()
+                except (IOError, OSError):
+                    logger.exception("Unable to write token cache {}"
+                                     .format(self.path))
+
+
+def get_cache():
+    """Get the process-wide token cache.
+
+    :returns: TokenCache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TokenCache(os.getenv('ROLETESTER_TOKEN_CACHE'))
+        return _cache
+
+
+def stats():
+    """Get token cache and authentication statistics for the process.
+
+    :returns: Dict with cache hits and misses and auth round trips
+    """
+    cache = get_cache()
+    with _round_trips_lock:
+        round_trips = _round_trips[0]
+    return {'hits': cache.hits,
+            'misses': cache.misses,
+            'round_trips': round_trips}
+
+
+class _CachedAuth(object):
+    """Reuses and shares the tokens of an identity plugin via the cache."""
+
+    def _init_cache(self, key):
+        """Load a cached token, if there is one.
+
+        :param key: Key from cache_key()
+        :type key: String
+        """
+        self._cache_key = key
+        self.round_trips = 0
+        state = get_cache().get(key)
+        if state is not None:
+            self.set_auth_state(state)
+
+    def _count(self):
+        """Count a round trip to keystone."""
+        self.round_trips += 1
+        with _round_trips_lock:
+            _round_trips[0] += 1
+
+    def get_auth_ref(self, session, **kwargs):
+        self._count()
+        return super(_CachedAuth, self).get_auth_ref(session, **kwargs)
+
+    def get_access(self, session, **kwargs):
+        previous = self.auth_ref
+        auth_ref = super(_CachedAuth, self).get_access(session, **kwargs)
+        if auth_ref is not previous:
+            get_cache().put(self._cache_key, self.get_auth_state())
+        return auth_ref
+
+
+class CachedPassword(_CachedAuth, v3.Password):
+    """Password auth that goes through the cache."""
+
+    def __init__(self, **kwargs):
+        v3.Password.__init__(self, **kwargs)
+        self._init_cache(cache_key(kwargs))
+
+
+class RescopedToken(_CachedAuth, v3.Token):
+    """Gets a scope by rescoping a token the user already has.
+
+    Falls back to the password once the original token is no longer
+    accepted.
+    """
+
+    def __init__(self, token, **kwargs):
+        """Init the plugin.
+
+        :param token: Token of the user in another scope
+        :type token: String
+        :param kwargs: v3.Password kwargs for the wanted scope
+        :type kwargs: Dict
+        """
+        scope = dict((k, v) for k, v in kwargs.items() if k in _SCOPE_KWARGS)
+        v3.Token.__init__(self, kwargs['auth_url'], token, **scope)
+        self._password_kwargs = kwargs
+        self._init_cache(cache_key(kwargs))
+
+    def get_auth_ref(self, session, **kwargs):
+        try:
+            return super(RescopedToken, self).get_auth_ref(session, **kwargs)
+        except (exceptions.Unauthorized, exceptions.NotFound):
+            logger.debug("Rescoping failed, authenticating with password.")
+            self._count()
+            password = v3.Password(**self._password_kwargs)
+            return password.get_auth_ref(session, **kwargs)
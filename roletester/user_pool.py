@@ -0,0 +1,206 @@
+"""Persistent pool of test users shared between runs.
+
+Users are keyed by the role assignment they were made for. A run leases a
+user instead of creating one and hands it back when it tears down, so the
+same role matrix is not rebuilt on every run. Leases are taken atomically
+in SQLite, so concurrent runs never share a user at the same time, and
+they expire so a run that crashed does not hold users forever.
+
+The database holds passwords and is created readable by its owner only.
+"""
+import contextlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.user_pool')
+
+# Seconds before a lease left behind by a dead run can be taken again.
+_LEASE_SECONDS = 2 * 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    assignment TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    password TEXT NOT NULL,
+    project_name TEXT NOT NULL,
+    user_domain_name TEXT NOT NULL,
+    project_domain_name TEXT NOT NULL,
+    domain_id TEXT NOT NULL,
+    auth_url TEXT NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL
+)
+"""
+
+_KWARGS = ('username', 'password', 'project_name', 'user_domain_name',
+           'project_domain_name', 'domain_id', 'auth_url')
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def assignment_key(domain, project, role, inherited):
+    """Builds the pool key of a role assignment.
+
+    :returns: String
+    """
+    return '|'.join(['%s' % x for x in (domain, project, role, inherited)])
+
+
+def get_pool(path):
+    """Get the process-wide pool for a database file.
+
+    :param path: SQLite database path
+    :type path: String
+    :returns: UserPool
+    """
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = UserPool(path)
+        return _pools[path]
+
+
+class UserPool(object):
+
+    def __init__(self, path, lease_seconds=_LEASE_SECONDS):
+        """Init the pool, creating the database if needed.
+
+        :param path: SQLite database path
+        :type path: String
+        :param lease_seconds: Lease lifetime in seconds
+        :type lease_seconds: Integer
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.owner = '{}:{}:{}'.format(
+            socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+        self.validated = False
+        if not os.path.exists(path):
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        with self._transaction() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        """Opens a connection. Connections are not shared between threads.
+
+        :returns: sqlite3.Connection
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Yields a connection that is committed and closed afterwards."""
+        conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lease(self, key):
+        """Lease a free user made for a role assignment.
+
+        :param key: Key from assignment_key()
+        :type key: String
+        :returns: Dict of ClientManager kwargs or None if none are free
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT * FROM users WHERE assignment = ? AND '
+                '(lease_owner IS NULL OR lease_expires < ?) LIMIT 1',
+                (key, now)).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            conn.execute(
+                'UPDATE users SET lease_owner = ?, lease_expires = ? '
+                'WHERE username = ?',
+                (self.owner, now + self.lease_seconds, row['username']))
+            conn.commit()
+        finally:
+            conn.close()
+        logger.debug("Leased pooled user {}".format(row['username']))
+        return dict((k, row[k]) for k in _KWARGS)
+
+    def add(self, key, user_id, user_kwargs):
+        """Add a user to the pool, leased to this run.
+
+        :param key: Key from assignment_key()
+        :type key: String
+        :param user_id: Keystone user id
+        :type user_id: String
+        :param user_kwargs: ClientManager kwargs of the user
+        :type user_kwargs: Dict
+        """
+        values = [user_kwargs[k] for k in _KWARGS]
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO users (assignment, user_id, {}, '
+                'lease_owner, lease_expires) VALUES (?, ?, {}, ?, ?)'
+                .format(', '.join(_KWARGS), ', '.join('?' * len(_KWARGS))),
+                [key, user_id] + values +
+                [self.owner, time.time() + self.lease_seconds])
+
+    def release(self, username):
+        """Return a leased user to the pool.
+
+        :param username: Name of the user
+        :type username: String
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE users SET lease_owner = NULL, lease_expires = NULL '
+                'WHERE username = ? AND lease_owner = ?',
+                (username, self.owner))
+
+    def remove(self, username):
+        """Drop a user from the pool.
+
+        :param username: Name of the user
+        :type username: String
+        """
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM users WHERE username = ?', (username,))
+
+    def validate(self, keystone):
+        """Drop pooled users whose role assignment no longer holds.
+
+        Uses a single role assignment listing for the whole pool.
+
+        :param keystone: Admin keystone client
+        :type keystone: keystoneclient.v3.client.Client
+        """
+        with self._transaction() as conn:
+            rows = conn.execute('SELECT * FROM users').fetchall()
+        if not rows:
+            self.validated = True
+            return
+
+        granted = set()
+        for assignment in keystone.role_assignments.list(include_names=True):
+            user = getattr(assignment, 'user', {}).get('id')
+            role = assignment.role.get('name')
+            scope = assignment.scope.get('project') or {}
+            granted.add((user, scope.get('name'), role))
+
+        stale = 0
+        for row in rows:
+            domain, project, role, _ = row['assignment'].split('|')
+            if (row['user_id'], project, role) not in granted:
+                self.remove(row['username'])
+                stale += 1
+        logger.debug(
+            "Validated {} pooled users, dropped {}."
+            .format(len(rows), stale))
+        self.validated = True
@@ -0,0 +1,163 @@
+"""Waiting for resources to reach a status.
+
+Polls start fast and back off exponentially with jitter up to the poll
+interval. How long a kind of transition (e.g. volumes going to available)
+took is remembered for the rest of the run, and later waits for it poll
+at the interval until the transition is nearly due.
+"""
+import random
+import threading
+import time
+from roletester import poller
+from roletester.log import logging
+
+logger = logging.getLogger('roletester.waiter')
+
+# Seconds before the second poll.
+_FIRST_DELAY = 0.5
+
+# Weight of the latest wait in the typical transition time.
+_ALPHA = 0.3
+
+# Fraction of the typical transition time slept before polling again.
+_HEAD_START = 0.75
+
+_HISTORY = {}
+_HISTORY_LOCK = threading.Lock()
+
+
+class Backoff(object):
+
+    def __init__(self, cap, expected=None):
+        """Init the backoff for one wait.
+
+        :param cap: Maximum seconds between polls
+        :type cap: Float
+        :param expected: Typical seconds the transition takes, if known
+        :type expected: Float
+        """
+        self.cap = max(cap, _FIRST_DELAY)
+        self.expected = expected
+        self.attempt = 0
+
+    def next_delay(self, elapsed):
+        """Seconds to sleep before the next poll.
+
+        :param elapsed: Seconds since the wait began
+        :type elapsed: Float
+        :returns: Float
+        """
+        delay = min(self.cap, _FIRST_DELAY * 2 ** self.attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        self.attempt += 1
+        if self.expected is not None:
+            head_start = min(self.expected * _HEAD_START - elapsed,
+                             self.cap)
+            if head_start > delay:
+                # Start over fast once the transition is due.
+                self.attempt = 0
+                delay = head_start
+        return delay
+
+
+def expected(kind):
+    """Get the typical seconds a kind of transition takes in this run.
+
+    :param kind: Transition, e.g. ('cinder', 'available')
+    :type kind: Tuple
+    :returns: Float|None
+    """
+    with _HISTORY_LOCK:
+        return _HISTORY.get(kind)
+
+
+def record(kind, seconds):
+    """Remember how long a transition took.
+
+    :param kind: Transition, e.g. ('cinder', 'available')
+    :type kind: Tuple
+    :param seconds: Seconds the transition took
+    :type seconds: Float
+    """
+    with _HISTORY_LOCK:
+        previous = _HISTORY.get(kind)
+        if previous is None:
+            _HISTORY[kind] = seconds
+        else:
+            _HISTORY[kind] = _ALPHA * seconds + (1 - _ALPHA) * previous
+
+
+def wait_for_status(clients,
+                    context,
+                    service,
+                    resource_id,
+                    status_key,
+                    target_status,
+                    done_statuses,
+                    not_found,
+                    deleted_status,
+                    timeout=60,
+                    interval=5,
+                    initial_wait=None):
+    """Waits for a resource to go to a requested status.
+
+    Returns once the status is reached or silently once the timeout has
+    passed. context[status_key] holds the last status seen and is removed
+    once the target is reached.
+
+    :param clients: Client manager the status is fetched with
+    :type clients: roletester.clients.ClientManager
+    :param context: Pass by reference context object.
+    :type context: Dict
+    :param service: nova, cinder or glance
+    :type service: String
+    :param resource_id: Id of the resource
+    :type resource_id: String
+    :param status_key: Context key to store the status under
+    :type status_key: String
+    :param target_status: Status to wait for
+    :type target_status: String
+    :param done_statuses: Statuses that will not change on their own. Any
+        of them other than the target is an error.
+    :type done_statuses: Set
+    :param not_found: Exception class the service raises for a missing
+        resource. Allowed when the target is deleted_status.
+    :type not_found: Exception
+    :param deleted_status: Status that means the resource is gone
+    :type deleted_status: String
+    :param timeout: Timeout in seconds.
+    :type timeout: Integer
+    :param interval: Maximum time in seconds to wait between polls.
+    :type interval: Integer
+    :param initial_wait: Time in seconds to wait before beginning to poll.
+    :type initial_wait: Integer
+    """
+    kind = (service, target_status)
+    began = time.time()
+    if initial_wait:
+        time.sleep(initial_wait)
+
+    start = time.time()
+    backoff = Backoff(interval, expected(kind))
+    try:
+        while (time.time() - start < timeout):
+            status = poller.poll(clients, service, resource_id)
+            context[status_key] = status
+            logger.debug("Found status {}".format(status))
+            if status == target_status:
+                context.pop(status_key)
+                record(kind, time.time() - began)
+                break
+            if status in done_statuses:
+                raise Exception(
+                    "Was looking for status {} but found {}"
+                    .format(target_status, status)
+                )
+            remaining = timeout - (time.time() - start)
+            if remaining > 0:
+                time.sleep(min(backoff.next_delay(time.time() - began),
+                               remaining))
+    except not_found:
+        if target_status != deleted_status:
+            raise
+        record(kind, time.time() - began)